@@ -0,0 +1,70 @@
+"""
+Sparse fieldsets (``?fields=``) and expansion (``?expand=``) for read endpoints.
+
+``?fields=id,title`` limits the output to the listed fields. Related
+collections (e.g. an exam's ``questions``) are only included when listed in
+``fields`` or ``expand``. Without either parameter an endpoint keeps its
+full, backwards-compatible output. Views use the resulting ``Fieldset`` to
+prune both the payload and the query behind it.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+class Fieldset:
+    def __init__(self, fields, expand):
+        self.fields = list(fields)
+        self.expand = set(expand)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def prune(self, data):
+        """Return ``data`` restricted to the selected fields, in fieldset order."""
+        return {name: data[name] for name in self.fields if name in data}
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def parse_fieldset(request, available, expandable=(), default_expand=None):
+    """
+    Build a ``Fieldset`` from the request's ``fields``/``expand`` query params.
+    ``available`` is the full field list in output order; ``expandable`` are the
+    fields backed by related collections; ``default_expand`` are the expansions
+    used when neither parameter is given (defaults to all of ``expandable``).
+    """
+    requested = _split(request.query_params.get('fields'))
+    expand = set(_split(request.query_params.get('expand')))
+
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}."})
+    unknown = sorted(expand - set(expandable))
+    if unknown:
+        raise ValidationError({'expand': f"Cannot expand: {', '.join(unknown)}."})
+
+    if not requested and not expand:
+        expand = set(expandable if default_expand is None else default_expand)
+        return Fieldset([name for name in available if name not in expandable or name in expand], expand)
+
+    if not requested:
+        requested = [name for name in available if name not in expandable]
+    expand |= set(requested) & set(expandable)
+    selected = set(requested) | expand
+    return Fieldset([name for name in available if name in selected], expand)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin dropping fields that are not in ``context['fieldset']``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get('fieldset')
+        if fieldset is not None:
+            for name in list(self.fields):
+                if name not in fieldset:
+                    self.fields.pop(name)
@@ -0,0 +1,203 @@
+"""
+On-demand request profiling.
+
+``RequestProfilingMiddleware`` profiles a request when an admin sends the
+``X-Profile: 1`` header, or when it is picked by ``REQUEST_PROFILING_SAMPLE_RATE``
+(0 by default). The view then runs under ``cProfile`` with every SQL query
+timed through ``connection.execute_wrapper``. The result (top functions, a
+pruned call tree and the SQL timeline) is tagged with the URL name and stored
+in a ring of the last ``REQUEST_PROFILING_RING_SIZE`` profiles in the default
+cache, which admins read through ``/api/profiling/``.
+
+Requests that are not profiled only pay for one header lookup (and one
+random draw when sampling is on).
+"""
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+SAMPLE_RATE = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0)
+RING_SIZE = getattr(settings, 'REQUEST_PROFILING_RING_SIZE', 50)
+HEADER = 'HTTP_X_PROFILE'
+TOP_FUNCTIONS = 30
+TREE_DEPTH = 8
+# Call tree branches below this share of the request time are dropped
+TREE_MIN_SHARE = 0.01
+SQL_MAX_LENGTH = 500
+CACHE_PREFIX = 'request-profile'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class IsAdminRole(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == 'admin'
+
+
+def _requested_by_admin(request):
+    """Authenticate the header's sender the way the API would; only admins may profile."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except Exception:
+        return False
+    return user.is_authenticated and getattr(user, 'role', None) == 'admin'
+
+
+class SQLTimeline:
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'start_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql[:SQL_MAX_LENGTH],
+            })
+
+
+def _function_name(func):
+    filename, line, name = func
+    return f'{name} ({filename}:{line})' if line else name
+
+
+def _top_functions(stats):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': _function_name(func),
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for func, (_primitive, calls, own, cumulative, _callers) in rows
+    ]
+
+
+def _call_tree(stats, total):
+    """Nested ``{function, cumulative_ms, children}`` from the profile's caller graph."""
+    children = {}
+    for func, (_primitive, _calls, _own, _cumulative, callers) in stats.stats.items():
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+    called = {func for calls in children.values() for func, _ in calls}
+    roots = [func for func in stats.stats if func not in called]
+    threshold = total * TREE_MIN_SHARE
+
+    def build(func, cumulative, depth, path):
+        node = {'function': _function_name(func), 'cumulative_ms': round(cumulative * 1000, 3)}
+        if depth < TREE_DEPTH:
+            below = sorted(children.get(func, ()), key=lambda item: item[1], reverse=True)
+            node['children'] = [
+                build(child, child_cumulative, depth + 1, path | {child})
+                for child, child_cumulative in below
+                if child_cumulative >= threshold and child not in path
+            ]
+        return node
+
+    return [build(func, stats.stats[func][3], 0, {func}) for func in roots if stats.stats[func][3] >= threshold]
+
+
+def store_profile(profile):
+    """Put ``profile`` in the next slot of the ring, overwriting the oldest one."""
+    cache.add(f'{CACHE_PREFIX}:next', 0, None)
+    slot = cache.incr(f'{CACHE_PREFIX}:next') % RING_SIZE
+    cache.set(f'{CACHE_PREFIX}:slot:{slot}', profile, CACHE_TIMEOUT)
+
+
+def recent_profiles():
+    slots = cache.get_many([f'{CACHE_PREFIX}:slot:{slot}' for slot in range(RING_SIZE)])
+    return sorted(slots.values(), key=lambda profile: profile['captured_at'], reverse=True)
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if HEADER in request.META:
+            if not _requested_by_admin(request):
+                return self.get_response(request)
+            trigger = 'header'
+        elif SAMPLE_RATE and random.random() < SAMPLE_RATE:
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+        return self.profile(request, trigger)
+
+    def profile(self, request, trigger):
+        # Only profiled requests need these; keep them off the worker's startup path
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        with connection.execute_wrapper(timeline):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        total = time.perf_counter() - started
+
+        stats = pstats.Stats(profiler)
+        match = request.resolver_match
+        profile_id = uuid.uuid4().hex
+        store_profile({
+            'id': profile_id,
+            'url_name': match.url_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'trigger': trigger,
+            'captured_at': timezone.now().isoformat(),
+            'duration_ms': round(total * 1000, 3),
+            'sql_count': len(timeline.queries),
+            'sql_ms': round(sum(query['duration_ms'] for query in timeline.queries), 3),
+            'top_functions': _top_functions(stats),
+            'call_tree': _call_tree(stats, total),
+            'sql': timeline.queries,
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+SUMMARY_FIELDS = ('id', 'url_name', 'method', 'path', 'status', 'trigger', 'captured_at',
+                  'duration_ms', 'sql_count', 'sql_ms')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def profile_list(request):
+    """The most recent request profiles, newest first; ``?url_name=`` filters by view."""
+    url_name = request.query_params.get('url_name')
+    return Response([
+        {field: profile[field] for field in SUMMARY_FIELDS}
+        for profile in recent_profiles()
+        if not url_name or profile['url_name'] == url_name
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def profile_detail(request, profile_id):
+    for profile in recent_profiles():
+        if profile['id'] == profile_id:
+            return Response(profile)
+    return Response({"error": "Profile not found."}, status=404)
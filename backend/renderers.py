@@ -0,0 +1,49 @@
+"""
+Faster renderers for large read-only payloads.
+
+``FastJSONRenderer`` encodes with orjson when it is installed and falls back to
+DRF's encoder otherwise. ``MessagePackRenderer`` is only offered when msgpack
+is installed and is picked by clients sending ``Accept: application/msgpack``.
+"""
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep indentation requests (e.g. ?indent / Accept: ...; indent=4) on the stdlib path
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_encoder.default)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+FAST_RENDERER_CLASSES = [FastJSONRenderer]
+if msgpack is not None:
+    FAST_RENDERER_CLASSES.append(MessagePackRenderer)
+FAST_RENDERER_CLASSES.append(BrowsableAPIRenderer)
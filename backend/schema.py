@@ -0,0 +1,143 @@
+"""
+Precomputed OpenAPI schema.
+
+Generating the schema introspects every view and serializer, which takes far
+longer than any API call. ``schema_view`` serves it instead from files under
+``OPENAPI_SCHEMA_DIR`` named after a hash of the code the schema describes:
+the Python sources of the project and its local apps plus the versions of
+DRF and drf-spectacular. ``manage.py build_openapi_schema`` writes them at
+build time; a process that finds them missing generates them once on the
+first request. Each process then keeps the bytes in memory and answers
+repeated hits with ``304 Not Modified`` through the ``ETag``.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import rest_framework
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+FORMATS = {
+    'yaml': 'application/vnd.oai.openapi',
+    'json': 'application/vnd.oai.openapi+json',
+}
+SKIPPED_DIRS = {'migrations', '__pycache__'}
+
+_lock = threading.Lock()
+_code_hash = None
+_loaded = {}
+
+
+def schema_dir():
+    return Path(getattr(settings, 'OPENAPI_SCHEMA_DIR', settings.BASE_DIR / '.openapi'))
+
+
+def _source_roots():
+    base = Path(settings.BASE_DIR).resolve()
+    roots = {Path(settings.BASE_DIR) / settings.ROOT_URLCONF.split('.')[0]}
+    for config in apps.get_app_configs():
+        if Path(config.path).resolve().is_relative_to(base):
+            roots.add(Path(config.path))
+    return sorted(roots)
+
+
+def code_hash():
+    """Hash of everything that shapes the schema; computed once per process."""
+    global _code_hash
+    if _code_hash is None:
+        import drf_spectacular
+
+        digest = hashlib.sha256(f'{rest_framework.VERSION} {drf_spectacular.__version__}'.encode())
+        for root in _source_roots():
+            for directory, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(name for name in dirnames if name not in SKIPPED_DIRS)
+                for filename in sorted(filenames):
+                    if filename.endswith('.py') and not filename.startswith('test'):
+                        path = Path(directory) / filename
+                        digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+                        digest.update(path.read_bytes())
+        _code_hash = digest.hexdigest()[:16]
+    return _code_hash
+
+
+def schema_path(fmt, version=None):
+    return schema_dir() / f'schema-{version or code_hash()}.{fmt}'
+
+
+def _write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def build_schema():
+    """Generate the schema and write it in every format. Returns the written paths."""
+    # Only the generating process pays for the generator and the renderers
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    schema = spectacular_settings.DEFAULT_GENERATOR_CLASS().get_schema(request=None, public=True)
+    renderers = {'yaml': OpenApiYamlRenderer(), 'json': OpenApiJsonRenderer()}
+    paths = []
+    for fmt, renderer in renderers.items():
+        path = schema_path(fmt)
+        _write_atomic(path, renderer.render(schema, renderer_context={}))
+        paths.append(path)
+    return paths
+
+
+def remove_stale_schemas():
+    """Delete schema files written for other versions of the code."""
+    current = {schema_path(fmt).name for fmt in FORMATS}
+    removed = 0
+    for path in schema_dir().glob('schema-*'):
+        if path.name not in current:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def get_schema_bytes(fmt):
+    version = code_hash()
+    content = _loaded.get((version, fmt))
+    if content is None:
+        with _lock:
+            path = schema_path(fmt, version)
+            if not path.exists():
+                build_schema()
+            content = _loaded[(version, fmt)] = path.read_bytes()
+    return content
+
+
+def _wants_json(request):
+    fmt = request.GET.get('format')
+    if fmt:
+        return fmt == 'json'
+    return 'json' in request.headers.get('Accept', '')
+
+
+@require_GET
+def schema_view(request):
+    """The OpenAPI schema as YAML, or JSON with ``?format=json`` or a JSON ``Accept`` header."""
+    fmt = 'json' if _wants_json(request) else 'yaml'
+    etag = f'"{code_hash()}-{fmt}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_schema_bytes(fmt), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'inline; filename="schema.{fmt}"'
+    response['ETag'] = etag
+    response['Vary'] = 'Accept'
+    return response
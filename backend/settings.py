@@ -61,6 +61,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.profiling.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'django.contrib.sessions.middleware.SessionMiddleware',
@@ -98,6 +99,26 @@ DATABASES = {
 }
 
 
+# Caches
+# Exam artifacts (question banks, answer-key rules) never change under a key.
+# Under gunicorn, keep one copy per host in shared memory instead:
+# 'exam_artifacts': {
+#     'BACKEND': 'backend.shm_cache.SharedMemoryCache',
+#     'LOCATION': '/dev/shm/online-exam-artifacts',
+#     'OPTIONS': {'MAX_SIZE': 256 * 1024 * 1024, 'SLOTS': 65536},
+# },
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'exam_artifacts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exam-artifacts',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
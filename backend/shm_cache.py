@@ -0,0 +1,308 @@
+"""
+Host-wide cache backend for immutable, versioned artifacts.
+
+Every worker process on a host maps the same file (put it on a tmpfs such as
+``/dev/shm``), so an exam's question bank is built once per host instead of
+once per worker and is read straight out of the shared pages: values are
+unpickled from a ``memoryview`` of the mapping without copying them out first.
+
+The file holds a header, an open-addressing table of ``SLOTS`` entries and a
+data ring of ``MAX_SIZE`` bytes. Records are appended to the ring; once it
+wraps, the oldest records are overwritten, so memory stays bounded and
+eviction is first-in, first-out. An entry whose record has been overwritten is
+simply treated as missing. Writers hold an exclusive ``flock`` on the file,
+readers a shared one.
+
+It is meant for values that never change under a key, e.g. keys carrying a
+content version. Configure it as its own alias::
+
+    CACHES['exam_artifacts'] = {
+        'BACKEND': 'backend.shm_cache.SharedMemoryCache',
+        'LOCATION': '/dev/shm/online-exam-artifacts',
+        'OPTIONS': {'MAX_SIZE': 256 * 1024 * 1024, 'SLOTS': 65536},
+    }
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b'SHMC'
+FORMAT_VERSION = 1
+# magic, format version, slot count, data size, write position
+HEADER = struct.Struct('<4sIIQQ')
+HEADER_SIZE = 64
+# key hash, record position, record length, expiry (0 = never)
+SLOT = struct.Struct('<16sQI4xd')
+RECORD_HEADER = struct.Struct('<I')
+EMPTY_HASH = bytes(16)
+PROBES = 16
+
+
+def _key_hash(key):
+    # Never all zeroes, which marks an empty slot
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()[:15] + b'\x01'
+
+
+class _Region:
+    """One process's mapping of the cache file."""
+
+    def __init__(self, path, slots, data_size):
+        self.path = path
+        self.slots = slots
+        self.data_size = data_size
+        self.table_offset = HEADER_SIZE
+        self.data_offset = HEADER_SIZE + slots * SLOT.size
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.data_offset + data_size
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size != size:
+                os.ftruncate(self.fd, size)
+            self.map = mmap.mmap(self.fd, size)
+            magic, version, file_slots, file_data_size, _ = HEADER.unpack_from(self.map, 0)
+            if (magic, version, file_slots, file_data_size) != (MAGIC, FORMAT_VERSION, slots, data_size):
+                self._reset(write_position=0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.view = memoryview(self.map)
+
+    def _reset(self, write_position):
+        self.map[self.table_offset:self.data_offset] = bytes(self.data_offset - self.table_offset)
+        HEADER.pack_into(self.map, 0, MAGIC, FORMAT_VERSION, self.slots, self.data_size, write_position)
+
+    def locked(self, exclusive):
+        return _FileLock(self, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    @property
+    def write_position(self):
+        return HEADER.unpack_from(self.map, 0)[4]
+
+    def _slot_offset(self, index):
+        return self.table_offset + index * SLOT.size
+
+    def _is_live(self, position, length, expires, write_position, now):
+        return (
+            length
+            and write_position <= position + self.data_size
+            and (not expires or expires > now)
+        )
+
+    def find(self, key, now):
+        """Return ``(slot index, record position, record length, expiry)`` of a live entry, or ``None``."""
+        key_hash = _key_hash(key)
+        write_position = self.write_position
+        start = int.from_bytes(key_hash[:8], 'little') % self.slots
+        for probe in range(PROBES):
+            index = (start + probe) % self.slots
+            slot_hash, position, length, expires = SLOT.unpack_from(self.map, self._slot_offset(index))
+            if slot_hash == key_hash:
+                if self._is_live(position, length, expires, write_position, now) and self._key_at(position) == key:
+                    return index, position, length, expires
+                return None
+        return None
+
+    def _key_at(self, position):
+        offset = self.data_offset + position % self.data_size
+        (key_length,) = RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + RECORD_HEADER.size
+        return bytes(self.view[start:start + key_length]).decode()
+
+    def value_view(self, position, length):
+        offset = self.data_offset + position % self.data_size
+        (key_length,) = RECORD_HEADER.unpack_from(self.map, offset)
+        return self.view[offset + RECORD_HEADER.size + key_length:offset + length]
+
+    def _free_slot(self, key_hash, now):
+        """The slot for ``key_hash``: its own, a dead one, or else the oldest in the probe window."""
+        write_position = self.write_position
+        start = int.from_bytes(key_hash[:8], 'little') % self.slots
+        dead = oldest = None
+        for probe in range(PROBES):
+            index = (start + probe) % self.slots
+            slot_hash, position, length, expires = SLOT.unpack_from(self.map, self._slot_offset(index))
+            if slot_hash == key_hash:
+                # One slot per key, or a delete could uncover an older value
+                return index
+            if not self._is_live(position, length, expires, write_position, now):
+                dead = index if dead is None else dead
+            elif oldest is None or position < oldest[1]:
+                oldest = (index, position)
+        return dead if dead is not None else oldest[0]
+
+    def store(self, key, value_bytes, expires, now):
+        """Append the record and point a slot at it. Returns ``False`` if it can never fit."""
+        key_bytes = key.encode()
+        length = RECORD_HEADER.size + len(key_bytes) + len(value_bytes)
+        if length > self.data_size // 4:
+            self.delete(key, now)
+            return False
+
+        position = self.write_position
+        if position % self.data_size + length > self.data_size:
+            # Records never wrap; skip to the start of the next lap
+            position += self.data_size - position % self.data_size
+        HEADER.pack_into(self.map, 0, MAGIC, FORMAT_VERSION, self.slots, self.data_size, position + length)
+
+        offset = self.data_offset + position % self.data_size
+        RECORD_HEADER.pack_into(self.map, offset, len(key_bytes))
+        start = offset + RECORD_HEADER.size
+        self.map[start:start + len(key_bytes)] = key_bytes
+        self.map[start + len(key_bytes):offset + length] = value_bytes
+
+        key_hash = _key_hash(key)
+        SLOT.pack_into(self.map, self._slot_offset(self._free_slot(key_hash, now)),
+                       key_hash, position, length, expires or 0.0)
+        return True
+
+    def set_expiry(self, index, expires):
+        key_hash, position, length, _ = SLOT.unpack_from(self.map, self._slot_offset(index))
+        SLOT.pack_into(self.map, self._slot_offset(index), key_hash, position, length, expires or 0.0)
+
+    def delete(self, key, now):
+        found = self.find(key, now)
+        if found is None:
+            return False
+        SLOT.pack_into(self.map, self._slot_offset(found[0]), EMPTY_HASH, 0, 0, 0.0)
+        return True
+
+    def clear(self):
+        self._reset(write_position=self.write_position)
+
+
+class _FileLock:
+    def __init__(self, region, operation):
+        self.region = region
+        self.operation = operation
+
+    def __enter__(self):
+        self.region.lock.acquire()
+        fcntl.flock(self.region.fd, self.operation)
+        return self.region
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.region.fd, fcntl.LOCK_UN)
+        self.region.lock.release()
+
+
+_regions = {}
+_regions_lock = threading.Lock()
+
+
+def _get_region(path, slots, data_size):
+    """The process's mapping of ``path``; reopened after a fork so ``flock`` works per process."""
+    with _regions_lock:
+        region = _regions.get(path)
+        if region is None or region.pid != os.getpid():
+            region = _regions[path] = _Region(path, slots, data_size)
+        return region
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        if fcntl is None:
+            raise ImproperlyConfigured('SharedMemoryCache needs fcntl.flock, which this platform lacks.')
+        if not location:
+            raise ImproperlyConfigured('SharedMemoryCache needs a LOCATION: the path of the shared file.')
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._slots = int(options.get('SLOTS', 65536))
+        self._data_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+
+    @property
+    def _region(self):
+        return _get_region(self._path, self._slots, self._data_size)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._region.locked(exclusive=False) as region:
+            found = region.find(key, time.time())
+            if found is None:
+                return default
+            return pickle.loads(region.value_view(found[1], found[2]))
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        values = {}
+        now = time.time()
+        with self._region.locked(exclusive=False) as region:
+            for key, original in keys.items():
+                found = region.find(key, now)
+                if found is not None:
+                    values[original] = pickle.loads(region.value_view(found[1], found[2]))
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value_bytes = pickle.dumps(value, self.pickle_protocol)
+        with self._region.locked(exclusive=True) as region:
+            region.store(key, value_bytes, self.get_backend_timeout(timeout), time.time())
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        records = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, self.pickle_protocol))
+            for key, value in data.items()
+        ]
+        expires = self.get_backend_timeout(timeout)
+        failed = []
+        with self._region.locked(exclusive=True) as region:
+            now = time.time()
+            for (key, value_bytes), original in zip(records, data):
+                if not region.store(key, value_bytes, expires, now):
+                    failed.append(original)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value_bytes = pickle.dumps(value, self.pickle_protocol)
+        with self._region.locked(exclusive=True) as region:
+            now = time.time()
+            if region.find(key, now) is not None:
+                return False
+            return region.store(key, value_bytes, self.get_backend_timeout(timeout), now)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._region.locked(exclusive=True) as region:
+            found = region.find(key, time.time())
+            if found is None:
+                return False
+            region.set_expiry(found[0], self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._region.locked(exclusive=True) as region:
+            now = time.time()
+            found = region.find(key, now)
+            if found is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(region.value_view(found[1], found[2])) + delta
+            region.store(key, pickle.dumps(value, self.pickle_protocol), found[3], now)
+            return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._region.locked(exclusive=True) as region:
+            return region.delete(key, time.time())
+
+    def clear(self):
+        with self._region.locked(exclusive=True) as region:
+            region.clear()
@@ -17,7 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+from backend.profiling import profile_detail, profile_list
+from backend.schema import schema_view
 
 admin.site.site_header = "Online Exam System Administration"
 admin.site.site_title = "Online Exam System Admin"
@@ -30,10 +32,12 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/exams/', include('exams.urls')),
     path('api/submissions/', include('submissions.urls')),
+    path('api/profiling/', profile_list, name='profile-list'),
+    path('api/profiling/<str:profile_id>/', profile_detail, name='profile-detail'),
     
     
     # drf-spectacular URLs
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', schema_view, name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 
@@ -0,0 +1,173 @@
+"""
+Exam activity log for disputes and proctoring.
+
+Events (paper fetched, answer changed, focus lost, submitted, ...) are not
+written as they happen. Once the transaction that produced them commits,
+each process appends them to an in-memory buffer, and the buffer is written
+with one ``bulk_create`` at the end of a request once it holds
+``ACTIVITY_BUFFER_SIZE`` events or its oldest one is
+``ACTIVITY_FLUSH_SECONDS`` old. That is a few inserts per thousand events
+instead of one per event, always outside the request's own transaction. The
+price is that a worker that dies loses what it had buffered, and events show
+up in the timeline up to a flush interval late (the process serving the
+timeline flushes its own buffer first). Code running outside requests, like
+management commands, calls ``flush`` itself.
+"""
+import atexit
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ExamActivityEvent
+
+BUFFER_SIZE = getattr(settings, 'ACTIVITY_BUFFER_SIZE', 500)
+FLUSH_INTERVAL = getattr(settings, 'ACTIVITY_FLUSH_SECONDS', 2)
+# Events kept while the database is unreachable; the oldest go first
+MAX_BUFFERED = BUFFER_SIZE * 20
+BATCH_LIMIT = 100
+MAX_DATA_BYTES = 2048
+CLOCK_SKEW = timedelta(seconds=getattr(settings, 'ACTIVITY_CLOCK_SKEW_SECONDS', 300))
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, events):
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.extend(events)
+
+    def is_due(self):
+        events, oldest = self._events, self._oldest
+        return bool(events) and (len(events) >= BUFFER_SIZE or time.monotonic() - oldest >= FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write everything buffered; returns how many events were written."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            ExamActivityEvent.objects.bulk_create(events, batch_size=BUFFER_SIZE)
+        except DatabaseError:
+            # Keep them for the next flush rather than failing a request over the log
+            with self._lock:
+                self._events[:0] = events
+                del self._events[:-MAX_BUFFERED]
+                self._oldest = time.monotonic()
+            return 0
+        return len(events)
+
+
+buffer = ActivityBuffer()
+atexit.register(buffer.flush)
+
+
+def flush_if_due():
+    """Called when a request finishes (see ``exams.signals``)."""
+    if buffer.is_due():
+        buffer.flush()
+
+
+def _event(exam_id, student_id, kind, occurred_at, data, now):
+    return ExamActivityEvent(
+        exam_id=exam_id, student_id=student_id, kind=kind, occurred_at=occurred_at,
+        recorded_at=now, day=now.date(), data=data,
+    )
+
+
+def _buffer_on_commit(events):
+    # Only log what the surrounding transaction actually did
+    transaction.on_commit(partial(buffer.add, events))
+
+
+def log_event(exam_id, student_id, kind, **data):
+    """Buffer an event the server observed itself, once the current transaction commits."""
+    now = timezone.now()
+    _buffer_on_commit([_event(exam_id, student_id, kind, now, data, now)])
+
+
+def _occurred_at(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch milliseconds, as browsers report them
+        try:
+            return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+
+def _client_event(exam_id, student_id, raw, now):
+    if not isinstance(raw, dict):
+        raise ValueError("Each event must be an object.")
+    kind = raw.get('kind')
+    if kind not in ExamActivityEvent.CLIENT_KINDS:
+        raise ValueError(f"Unknown event kind {kind!r}.")
+    occurred_at = _occurred_at(raw.get('occurred_at'))
+    if occurred_at is None:
+        raise ValueError("occurred_at must be an ISO 8601 time or epoch milliseconds.")
+    if occurred_at > now + CLOCK_SKEW:
+        raise ValueError("occurred_at is in the future.")
+    data = raw.get('data') or {}
+    if not isinstance(data, dict) or len(json.dumps(data)) > MAX_DATA_BYTES:
+        raise ValueError(f"data must be an object of at most {MAX_DATA_BYTES} bytes.")
+    return _event(exam_id, student_id, kind, occurred_at, data, now)
+
+
+def ingest_client_events(exam_id, student_id, events):
+    """
+    Buffer a batch from the exam client. Returns ``(accepted count,
+    [{'index', 'error'}, ...])``; bad events are dropped, not the batch.
+    """
+    now = timezone.now()
+    accepted, rejected = [], []
+    for index, raw in enumerate(events):
+        try:
+            accepted.append(_client_event(exam_id, student_id, raw, now))
+        except ValueError as exc:
+            rejected.append({'index': index, 'error': str(exc)})
+    if accepted:
+        _buffer_on_commit(accepted)
+    return len(accepted), rejected
+
+
+def timeline(exam_id, student_id, after=None, limit=500):
+    """
+    One student's events for an exam in ``(occurred_at, id)`` order, ``limit``
+    at a time after the event with id ``after``. Pages come off the timeline
+    index.
+    """
+    buffer.flush()
+    events = ExamActivityEvent.objects.filter(exam_id=exam_id, student_id=student_id)
+    if after is not None:
+        cursor = events.filter(id=after).values_list('occurred_at', flat=True).first()
+        if cursor is None:
+            return []
+        events = events.filter(Q(occurred_at__gt=cursor) | Q(occurred_at=cursor, id__gt=after))
+    return list(
+        events.order_by('occurred_at', 'id')
+        .values('id', 'kind', 'occurred_at', 'recorded_at', 'data')[:limit]
+    )
@@ -1,43 +1,105 @@
 from django.contrib import admin
-from .models import Exam, Question, Option, ExamRegistration
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import Exam, ExamSection, Question, Option, AcceptedAnswer, ExamRegistration, ArchivedExam
+
+class ExamListFilter(admin.SimpleListFilter):
+    """
+    Exam filter that only lists the most recent exams instead of every exam
+    in the table. Any other exam can still be selected through the changelist
+    querystring (e.g. the "View questions" links), and is shown when active.
+    """
+    title = 'exam'
+    parameter_name = 'exam'
+    field_path = 'exam'
+    max_choices = 20
+
+    def lookups(self, request, model_admin):
+        choices = list(Exam.objects.order_by('-created_at').values_list('id', 'title')[:self.max_choices])
+        value = self.value()
+        if value and value.isdigit() and int(value) not in dict(choices):
+            choices += list(Exam.objects.filter(id=value).values_list('id', 'title'))
+        return [(str(exam_id), title) for exam_id, title in choices]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{self.field_path: value})
+        return queryset
+
+class QuestionExamListFilter(ExamListFilter):
+    parameter_name = 'question__exam'
+    field_path = 'question__exam'
 
 class OptionInline(admin.TabularInline):
     model = Option
     extra = 1  # Number of empty option forms to display
 
-class QuestionInline(admin.TabularInline):
-    model = Question
-    extra = 1
-    show_change_link = True
+class AcceptedAnswerInline(admin.TabularInline):
+    model = AcceptedAnswer
+    extra = 0
+
+class ExamSectionInline(admin.TabularInline):
+    model = ExamSection
+    extra = 0
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
     list_display = ('title', 'creator', 'difficulty', 'duration_minutes', 'passing_score', 'is_active', 'created_at')
-    list_filter = ('difficulty', 'is_active', 'created_at')
+    list_filter = ('difficulty', 'is_active', 'paper_mode', 'created_at')
+    list_select_related = ('creator',)
     search_fields = ('title', 'description')
-    inlines = [QuestionInline]
-    readonly_fields = ('created_at', 'updated_at')
+    # Questions are reached through a link to their own paginated changelist
+    # rather than an inline, which would render every question of the exam
+    inlines = [ExamSectionInline]
+    readonly_fields = ('created_at', 'updated_at', 'questions_link')
+    raw_id_fields = ('creator',)
     
     # Prepopulate the slug field from the title
     # prepopulated_fields = {'slug': ('title',)}  # Optional: if you add a slug field
+    
+    @admin.display(description='Questions')
+    def questions_link(self, obj):
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:exams_question_changelist')
+        return format_html('<a href="{}?exam={}">View questions</a>', url, obj.pk)
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('exam', 'question_text', 'question_type', 'points', 'order')
-    list_filter = ('question_type', 'exam')
+    list_filter = ('question_type', ExamListFilter)
+    list_select_related = ('exam',)
     search_fields = ('question_text',)
-    inlines = [OptionInline]
+    inlines = [OptionInline, AcceptedAnswerInline]
     list_editable = ('order',)  # Allow editing order directly from list view
+    autocomplete_fields = ('exam',)
+    raw_id_fields = ('section',)
+    show_full_result_count = False
 
 @admin.register(Option)
 class OptionAdmin(admin.ModelAdmin):
     list_display = ('question', 'option_text', 'is_correct')
-    list_filter = ('is_correct', 'question__exam')
+    list_filter = ('is_correct', QuestionExamListFilter)
+    # Option.__str__ -> Question.__str__ -> exam.title, so join both
+    list_select_related = ('question__exam',)
     search_fields = ('option_text', 'question__question_text')
+    autocomplete_fields = ('question',)
+    show_full_result_count = False
 
 @admin.register(ExamRegistration)
 class ExamRegistrationAdmin(admin.ModelAdmin):
     list_display = ('exam', 'student', 'registered_at', 'completed_at', 'score', 'is_passed')
-    list_filter = ('is_passed', 'exam', 'registered_at')
+    list_filter = ('is_passed', ExamListFilter, 'registered_at')
+    list_select_related = ('exam', 'student')
     search_fields = ('student__username', 'exam__title')
-    readonly_fields = ('registered_at',)
\ No newline at end of file
+    readonly_fields = ('registered_at',)
+    raw_id_fields = ('exam', 'student')
+    show_full_result_count = False
+
+@admin.register(ArchivedExam)
+class ArchivedExamAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'archived_at', 'registration_count', 'attempt_count', 'answer_count')
+    list_select_related = ('exam',)
+    raw_id_fields = ('exam',)
+    readonly_fields = ('path', 'manifest_sha256', 'registration_count', 'attempt_count', 'answer_count', 'archived_at')
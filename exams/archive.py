@@ -0,0 +1,208 @@
+"""
+Cold-storage archive of finished exams.
+
+``archive_exam`` streams an exam's registrations, attempts and answers into
+one gzip-compressed JSON Lines file per table under ``EXAM_ARCHIVE_DIR``.
+Each line is a plain array of values; the column names, row counts and a
+SHA-256 of every file are written to ``manifest.json``. Only once the files
+are complete and renamed into place are the rows deleted from the hot tables,
+in batches of ``DELETE_BATCH_SIZE``. Rows hanging off answers and attempts
+(manual reviews, similarity data) are removed with them by cascade; the exam,
+its questions and its result summaries stay.
+
+``iter_archived_rows`` reads a table back straight from the archive file for
+the read-only API, and ``restore_exam`` verifies the checksums and bulk-loads
+the rows again with their original primary keys.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from submissions.models import Answer, ExamAttempt
+from .models import ArchivedExam, ExamRegistration
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 2000
+DELETE_BATCH_SIZE = 1000
+
+ARCHIVE_TABLES = {
+    'registrations': (ExamRegistration, lambda exam: ExamRegistration.objects.filter(exam=exam)),
+    'attempts': (ExamAttempt, lambda exam: ExamAttempt.objects.filter(exam=exam)),
+    'answers': (Answer, lambda exam: Answer.objects.filter(attempt__exam=exam)),
+}
+# Restore parents before children, delete children before parents
+RESTORE_ORDER = ('registrations', 'attempts', 'answers')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_root():
+    return Path(getattr(settings, 'EXAM_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_value(value):
+    # Full isoformat: DjangoJSONEncoder would drop the microseconds
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _write_table(path, queryset, columns):
+    """Write the rows in primary key order; returns ``(row_count, last_pk)``."""
+    encoder = json.JSONEncoder(separators=(',', ':'), default=_encode_value)
+    count = 0
+    last_pk = None
+    with gzip.open(path, 'wt', encoding='utf-8') as handle:
+        for row in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=CHUNK_SIZE):
+            handle.write(encoder.encode(row))
+            handle.write('\n')
+            count += 1
+            last_pk = row[0]
+        handle.flush()
+        os.fsync(handle.fileno())
+    return count, last_pk
+
+
+def _delete_in_batches(queryset):
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def archive_exam(exam):
+    """Archive and delete the exam's result rows. Returns the ``ArchivedExam``."""
+    if ArchivedExam.objects.filter(exam=exam).exists():
+        raise ArchiveError(f"Exam {exam.id} is already archived.")
+
+    root = archive_root()
+    final = root / f'exam-{exam.id}'
+    staging = root / f'.exam-{exam.id}.tmp'
+    if final.exists():
+        raise ArchiveError(f"{final} already exists.")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'exam_id': exam.id,
+        'exam_title': exam.title,
+        'tables': {},
+    }
+    last_pks = {}
+    for table, (model, queryset_for) in ARCHIVE_TABLES.items():
+        columns = _columns(model)
+        filename = f'{table}.jsonl.gz'
+        count, last_pks[table] = _write_table(staging / filename, queryset_for(exam), columns)
+        manifest['tables'][table] = {
+            'file': filename,
+            'columns': columns,
+            'rows': count,
+            'sha256': _sha256(staging / filename),
+        }
+    manifest_bytes = json.dumps(manifest, indent=2).encode()
+    (staging / 'manifest.json').write_bytes(manifest_bytes)
+    os.replace(staging, final)
+
+    tables = manifest['tables']
+    archived = ArchivedExam.objects.create(
+        exam=exam,
+        path=final.name,
+        manifest_sha256=hashlib.sha256(manifest_bytes).hexdigest(),
+        registration_count=tables['registrations']['rows'],
+        attempt_count=tables['attempts']['rows'],
+        answer_count=tables['answers']['rows'],
+    )
+    # Only delete what was written: rows that showed up meanwhile have higher keys
+    for table in reversed(RESTORE_ORDER):
+        if last_pks[table] is not None:
+            _delete_in_batches(ARCHIVE_TABLES[table][1](exam).filter(pk__lte=last_pks[table]))
+    return archived
+
+
+def load_manifest(archived, verify=False):
+    """Read the archive's manifest, optionally checking every checksum."""
+    directory = archive_root() / archived.path
+    manifest_bytes = (directory / 'manifest.json').read_bytes()
+    if hashlib.sha256(manifest_bytes).hexdigest() != archived.manifest_sha256:
+        raise ArchiveError(f"Manifest checksum mismatch for exam {archived.exam_id}.")
+    manifest = json.loads(manifest_bytes)
+    if verify:
+        for table, info in manifest['tables'].items():
+            if _sha256(directory / info['file']) != info['sha256']:
+                raise ArchiveError(f"Checksum mismatch in {table} of exam {archived.exam_id}.")
+    return manifest
+
+
+def iter_archived_rows(archived, table, manifest=None, filters=None):
+    """Yield the table's rows as dicts, read straight from the archive file."""
+    manifest = manifest or load_manifest(archived)
+    info = manifest['tables'][table]
+    columns = info['columns']
+    filters = filters or {}
+    with gzip.open(archive_root() / archived.path / info['file'], 'rt', encoding='utf-8') as handle:
+        for line in handle:
+            row = dict(zip(columns, json.loads(line)))
+            if all(row.get(column) == value for column, value in filters.items()):
+                yield row
+
+
+def _bulk_restore(model, rows):
+    fields = [field for field in model._meta.concrete_fields if field.attname in rows[0]] if rows else []
+    for row in rows:
+        for field in fields:
+            row[field.attname] = field.to_python(row[field.attname])
+    objects = model.objects.bulk_create([model(**row) for row in rows])
+    # bulk_create stamps auto_now_add fields with the current time; put the archived values back
+    stamped = [field.name for field in fields if getattr(field, 'auto_now_add', False)]
+    if stamped:
+        for obj, row in zip(objects, rows):
+            for name in stamped:
+                setattr(obj, name, row[name])
+        model.objects.bulk_update(objects, stamped)
+    return len(rows)
+
+
+def restore_exam(archived, delete_files=False):
+    """Load the archived rows back into the hot tables and drop the archive record."""
+    manifest = load_manifest(archived, verify=True)
+    restored = {}
+    with transaction.atomic():
+        for table in RESTORE_ORDER:
+            model = ARCHIVE_TABLES[table][0]
+            batch = []
+            count = 0
+            for row in iter_archived_rows(archived, table, manifest):
+                batch.append(row)
+                if len(batch) == CHUNK_SIZE:
+                    count += _bulk_restore(model, batch)
+                    batch = []
+            restored[table] = count + _bulk_restore(model, batch)
+        archived.delete()
+    if delete_files:
+        shutil.rmtree(archive_root() / archived.path)
+    return restored
@@ -0,0 +1,147 @@
+"""
+Seat-limited exams.
+
+An exam with a ``capacity`` keeps its seat count in ``ExamSeatCounter`` rows
+instead of counting registrations. A seat is taken with one conditional
+``UPDATE ... SET taken = taken + 1 WHERE taken < seats`` in the same
+transaction that creates the registration, so the database itself refuses
+the seat past capacity however many requests race for it, and nothing ever
+has to ``COUNT(*)`` the registrations.
+
+With ``EXAM_SEAT_STRIPES`` above 1 the seats are split across that many
+rows and each registration tries a random one first, so a popular exam's
+opening rush is spread over several row locks. The stripes' seats always sum
+to the capacity: when it changes, ``sync_seat_counters`` hands the seats
+still free out again on top of what each stripe has taken.
+
+Students who find no free seat join the waitlist and are registered in turn
+by ``promote_waitlist`` as seats free up or the capacity grows.
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import ExamRegistration, ExamSeatCounter, ExamWaitlistEntry
+
+STRIPES = max(getattr(settings, 'EXAM_SEAT_STRIPES', 1), 1)
+
+
+def _allot(capacity, counters):
+    free = max(capacity - sum(counter.taken for counter in counters), 0)
+    share, extra = divmod(free, len(counters))
+    for index, counter in enumerate(counters):
+        counter.seats = counter.taken + share + (index < extra)
+
+
+def sync_seat_counters(exam):
+    """Create or rebalance the exam's counter stripes after its capacity is set or changed."""
+    with transaction.atomic():
+        counters = list(ExamSeatCounter.objects.select_for_update().filter(exam=exam).order_by('stripe'))
+        if exam.capacity is None:
+            ExamSeatCounter.objects.filter(exam=exam).delete()
+        elif counters:
+            _allot(exam.capacity, counters)
+            ExamSeatCounter.objects.bulk_update(counters, ['seats'])
+        else:
+            # The only time registrations are counted
+            taken = ExamRegistration.objects.filter(exam=exam).count()
+            counters = [ExamSeatCounter(exam=exam, stripe=stripe) for stripe in range(STRIPES)]
+            counters[0].taken = taken
+            _allot(exam.capacity, counters)
+            ExamSeatCounter.objects.bulk_create(counters, ignore_conflicts=True)
+
+
+def _take(exam, stripe):
+    return ExamSeatCounter.objects.filter(exam=exam, stripe=stripe, taken__lt=F('seats')).update(
+        taken=F('taken') + 1
+    )
+
+
+def reserve_seat(exam):
+    """
+    Take a seat; returns whether one was free. Call it in the transaction
+    that creates the registration so a rollback gives the seat back.
+    """
+    if exam.capacity is None:
+        return True
+    if _take(exam, random.randrange(STRIPES)):
+        return True
+    # That stripe is full (or missing): try the ones with seats left
+    free = list(ExamSeatCounter.objects.filter(exam=exam, taken__lt=F('seats')).values_list('stripe', flat=True))
+    if not free and not ExamSeatCounter.objects.filter(exam=exam).exists():
+        # Capacity was set outside the API
+        sync_seat_counters(exam)
+        free = list(range(STRIPES))
+    random.shuffle(free)
+    return any(_take(exam, stripe) for stripe in free)
+
+
+def release_seat(exam):
+    taken = list(ExamSeatCounter.objects.filter(exam=exam, taken__gt=0).values_list('stripe', flat=True))
+    random.shuffle(taken)
+    for stripe in taken:
+        if ExamSeatCounter.objects.filter(exam=exam, stripe=stripe, taken__gt=0).update(taken=F('taken') - 1):
+            return
+
+
+def register_student(exam, student):
+    """
+    Register ``student`` if a seat is free, otherwise put them on the
+    waitlist. Returns ``(registration, None)`` or ``(None, waitlist entry)``;
+    raises ``IntegrityError`` if they are already registered.
+    """
+    with transaction.atomic():
+        if reserve_seat(exam):
+            registration = ExamRegistration.objects.create(exam=exam, student=student)
+            if exam.capacity is not None:
+                ExamWaitlistEntry.objects.filter(exam=exam, student=student).delete()
+            return registration, None
+    entry, _ = ExamWaitlistEntry.objects.get_or_create(exam=exam, student=student)
+    return None, entry
+
+
+def waitlist_position(entry):
+    return ExamWaitlistEntry.objects.filter(exam_id=entry.exam_id, id__lte=entry.id).count()
+
+
+def promote_waitlist(exam):
+    """Register waitlisted students in order while seats are free. Returns their ids."""
+    promoted = []
+    while True:
+        entry = ExamWaitlistEntry.objects.filter(exam=exam).order_by('id').first()
+        if entry is None:
+            break
+        with transaction.atomic():
+            if not ExamWaitlistEntry.objects.filter(pk=entry.pk).delete()[0]:
+                continue  # promoted by a concurrent request
+            if not reserve_seat(exam):
+                transaction.set_rollback(True)
+                break
+            _, created = ExamRegistration.objects.get_or_create(exam=exam, student_id=entry.student_id)
+            if not created:
+                release_seat(exam)
+                continue
+        promoted.append(entry.student_id)
+    return promoted
+
+
+def cancel_registration(exam, student):
+    """
+    Give up a registration that has not started, or leave the waitlist.
+    A freed seat goes to the next student waiting. Returns whether there was
+    anything to cancel.
+    """
+    with transaction.atomic():
+        left_waitlist = ExamWaitlistEntry.objects.filter(exam=exam, student=student).delete()[0]
+        registration = ExamRegistration.objects.filter(
+            exam=exam, student=student, started_at__isnull=True
+        ).first()
+        if registration is not None:
+            registration.delete()
+            if exam.capacity is not None:
+                release_seat(exam)
+    if registration is not None:
+        promote_waitlist(exam)
+    return bool(left_waitlist or registration)
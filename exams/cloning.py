@@ -0,0 +1,109 @@
+"""
+Set-based exam cloning.
+
+Sections, questions, options and accepted-answer rules are copied with one
+``values()`` read and one ``bulk_create`` each, and the new foreign keys are
+remapped in memory, so the number of queries does not depend on the size of
+the exam.
+"""
+from django.db import transaction
+
+from .capacity import sync_seat_counters
+from .models import AcceptedAnswer, Exam, ExamSection, Question, Option
+
+BATCH_SIZE = 1000
+
+EXAM_COPY_FIELDS = [
+    'title', 'description', 'duration_minutes', 'passing_score', 'difficulty',
+    'paper_mode', 'shuffle_options', 'start_time', 'end_time', 'is_active', 'capacity',
+]
+
+
+@transaction.atomic
+def clone_exam(exam, creator=None, title=None, start_time=None, end_time=None, question_ids=None):
+    """
+    Copy ``exam`` with its sections, questions, options and accepted answers
+    and return the new exam. ``question_ids`` restricts the copy to a subset
+    of questions; the schedule defaults to none, since the original one has
+    usually passed.
+    """
+    new_exam = Exam.objects.create(**{
+        **{field: getattr(exam, field) for field in EXAM_COPY_FIELDS},
+        'creator': creator or exam.creator,
+        'title': title or f"{exam.title} (copy)",
+        'start_time': start_time,
+        'end_time': end_time,
+    })
+
+    old_sections = list(
+        ExamSection.objects.filter(exam=exam).values('id', 'title', 'order', 'draw_count')
+    )
+    new_sections = ExamSection.objects.bulk_create(
+        [
+            ExamSection(exam=new_exam, title=s['title'], order=s['order'], draw_count=s['draw_count'])
+            for s in old_sections
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    section_map = {old['id']: new.id for old, new in zip(old_sections, new_sections)}
+
+    questions = Question.objects.filter(exam=exam)
+    if question_ids is not None:
+        questions = questions.filter(id__in=question_ids)
+    old_questions = list(questions.order_by('order', 'id').values(
+        'id', 'section_id', 'question_text', 'question_type', 'points', 'order', 'explanation'
+    ))
+    new_questions = Question.objects.bulk_create(
+        [
+            Question(
+                exam=new_exam,
+                section_id=section_map.get(q['section_id']),
+                question_text=q['question_text'],
+                question_type=q['question_type'],
+                points=q['points'],
+                order=q['order'],
+                explanation=q['explanation'],
+            )
+            for q in old_questions
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    question_map = {old['id']: new.id for old, new in zip(old_questions, new_questions)}
+
+    old_options = Option.objects.filter(question_id__in=questions.values('id')).values(
+        'question_id', 'option_text', 'is_correct', 'order'
+    )
+    Option.objects.bulk_create(
+        (
+            Option(
+                question_id=question_map[o['question_id']],
+                option_text=o['option_text'],
+                is_correct=o['is_correct'],
+                order=o['order'],
+            )
+            for o in old_options.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    old_rules = AcceptedAnswer.objects.filter(question_id__in=questions.values('id')).values(
+        'question_id', 'rule_type', 'value', 'tolerance', 'max_distance'
+    )
+    AcceptedAnswer.objects.bulk_create(
+        (
+            AcceptedAnswer(
+                question_id=question_map[r['question_id']],
+                rule_type=r['rule_type'],
+                value=r['value'],
+                tolerance=r['tolerance'],
+                max_distance=r['max_distance'],
+            )
+            for r in old_rules.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    if new_exam.capacity is not None:
+        sync_seat_counters(new_exam)
+
+    return new_exam
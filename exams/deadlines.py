@@ -0,0 +1,60 @@
+"""
+Server-side time limits.
+
+A registration's clock starts the first time its paper is served: ``started_at``
+and the computed ``deadline`` are stamped together with a conditional UPDATE,
+so concurrent first loads agree on one start time. Submissions are checked
+against the stored deadline of the row they already load, and the
+``sweep_expired_attempts`` command closes whatever is left open past it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from submissions.dashboard import invalidate_dashboard
+from .models import ExamRegistration
+
+# Slack for requests that were sent before the deadline but arrive after it
+SUBMISSION_GRACE = timedelta(seconds=getattr(settings, 'EXAM_SUBMISSION_GRACE_SECONDS', 30))
+# How long a test center has to upload offline sheets once their deadline passed
+OFFLINE_UPLOAD_WINDOW = timedelta(hours=getattr(settings, 'OFFLINE_UPLOAD_WINDOW_HOURS', 72))
+
+
+def start_registration(registration, exam, now=None):
+    """Stamp ``started_at`` and ``deadline`` unless the registration already started."""
+    if registration.started_at is not None:
+        return registration
+    now = now or timezone.now()
+    deadline = exam.deadline_for(now)
+    started = ExamRegistration.objects.filter(pk=registration.pk, started_at__isnull=True).update(
+        started_at=now, deadline=deadline
+    )
+    if started:
+        registration.started_at, registration.deadline = now, deadline
+        invalidate_dashboard(registration.student_id)
+    else:
+        registration.refresh_from_db(fields=['started_at', 'deadline'])
+    return registration
+
+
+def start_registrations(exam, registrations, now=None):
+    """
+    ``start_registration`` for many registrations at once, with one UPDATE,
+    e.g. when a test center is issued its offline bundles.
+    """
+    now = now or timezone.now()
+    pending = [registration for registration in registrations if registration.started_at is None]
+    if not pending:
+        return
+    deadline = exam.deadline_for(now)
+    ExamRegistration.objects.filter(pk__in=[registration.pk for registration in pending], started_at__isnull=True).update(
+        started_at=now, deadline=deadline
+    )
+    for registration in pending:
+        registration.started_at, registration.deadline = now, deadline
+        invalidate_dashboard(registration.student_id)
+
+
+def is_late(deadline, now=None):
+    return deadline is not None and (now or timezone.now()) > deadline + SUBMISSION_GRACE
@@ -0,0 +1,161 @@
+"""
+Streaming gradebook export for an exam.
+
+Registrations, attempts and (optionally) answers are read with server-side
+cursors (``.iterator(chunk_size=...)``) ordered by student and merge-joined in
+Python, so memory stays constant however many candidates sat the exam and the
+first rows are sent before the last ones are read.
+"""
+import csv
+import json
+import zlib
+from heapq import merge
+from itertools import groupby
+
+from exams.models import ExamRegistration
+from submissions.models import ExamAttempt, Answer
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+# Rows between gzip sync flushes, so compressed output keeps trickling out
+FLUSH_EVERY = 500
+
+BASE_COLUMNS = [
+    'student_id', 'username', 'email',
+    'registered_at', 'started_at', 'completed_at', 'registration_score', 'is_passed',
+    'attempt_id', 'attempt_start_time', 'attempt_end_time', 'is_submitted', 'attempt_score', 'attempt_passed',
+]
+
+
+class Echo:
+    """File-like object whose ``write`` just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _registration_rows(exam):
+    queryset = (
+        ExamRegistration.objects
+        .filter(exam=exam)
+        .select_related('student')
+        .order_by('student_id')
+    )
+    for registration in queryset.iterator(chunk_size=CHUNK_SIZE):
+        student = registration.student
+        yield student.id, 'registration', {
+            'username': student.username,
+            'email': student.email,
+            'registered_at': registration.registered_at,
+            'started_at': registration.started_at,
+            'completed_at': registration.completed_at,
+            'registration_score': registration.score,
+            'is_passed': registration.is_passed,
+        }
+
+
+def _attempt_rows(exam):
+    queryset = (
+        ExamAttempt.objects
+        .filter(exam=exam)
+        .select_related('student')
+        .order_by('student_id')
+    )
+    for attempt in queryset.iterator(chunk_size=CHUNK_SIZE):
+        student = attempt.student
+        yield student.id, 'attempt', {
+            'username': student.username,
+            'email': student.email,
+            'attempt_id': attempt.id,
+            'attempt_start_time': attempt.start_time,
+            'attempt_end_time': attempt.end_time,
+            'is_submitted': attempt.is_submitted,
+            'attempt_score': attempt.score,
+            'attempt_passed': attempt.passed,
+        }
+
+
+def _answer_rows(exam):
+    queryset = (
+        Answer.objects
+        .filter(attempt__exam=exam)
+        .order_by('attempt__student_id', 'question_id')
+        .values_list('attempt__student_id', 'question_id', 'answer_text', 'is_correct')
+    )
+    for student_id, question_id, answer_text, is_correct in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield student_id, 'answer', (question_id, answer_text, is_correct)
+
+
+def answer_columns(exam):
+    """Return ``[(question_id, answer_column, correct_column), ...]`` in paper order."""
+    question_ids = exam.questions.order_by('order', 'id').values_list('id', flat=True)
+    return [(qid, f'q{qid}_answer', f'q{qid}_correct') for qid in question_ids]
+
+
+def iter_result_rows(exam, include_answers=False):
+    """
+    Yield the column list first, then one dict per student combining their
+    registration, attempt and, optionally, pivoted answers.
+    """
+    pivot = answer_columns(exam) if include_answers else []
+    columns = list(BASE_COLUMNS)
+    for _qid, answer_column, correct_column in pivot:
+        columns.extend([answer_column, correct_column])
+    yield columns
+
+    streams = [_registration_rows(exam), _attempt_rows(exam)]
+    if include_answers:
+        streams.append(_answer_rows(exam))
+    merged = merge(*streams, key=lambda item: item[0])
+
+    for student_id, items in groupby(merged, key=lambda item: item[0]):
+        row = dict.fromkeys(columns)
+        row['student_id'] = student_id
+        for _student_id, kind, data in items:
+            if kind == 'answer':
+                question_id, answer_text, is_correct = data
+                row[f'q{question_id}_answer'] = answer_text
+                row[f'q{question_id}_correct'] = is_correct
+            else:
+                row.update(data)
+        yield row
+
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(exam, include_answers=False):
+    rows = iter_result_rows(exam, include_answers)
+    columns = next(rows)
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(['' if row[c] is None else _format_value(row[c]) for c in columns])
+
+
+def iter_jsonl(exam, include_answers=False):
+    rows = iter_result_rows(exam, include_answers)
+    next(rows)
+    for row in rows:
+        yield json.dumps({key: _format_value(value) for key, value in row.items()}) + '\n'
+
+
+def iter_export(exam, export_format='csv', include_answers=False, compress=False):
+    """Yield encoded export chunks, gzip-compressed on the fly if ``compress``."""
+    lines = iter_csv if export_format == 'csv' else iter_jsonl
+    chunks = (line.encode('utf-8') for line in lines(exam, include_answers))
+    if not compress:
+        yield from chunks
+        return
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for count, chunk in enumerate(chunks, start=1):
+        data = compressor.compress(chunk)
+        if count % FLUSH_EVERY == 0:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
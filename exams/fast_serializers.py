@@ -0,0 +1,163 @@
+"""
+Read-only fast path for large exam payloads.
+
+These functions build the same dicts as ``ExamSerializer``,
+``QuestionSerializer`` and ``ExamRegistrationSerializer`` directly from
+``.values()`` rows, skipping model instantiation and DRF field machinery.
+They are covered by parity tests against the serializers, so keep the two in
+sync when fields change.
+"""
+from rest_framework import serializers
+
+from .models import Exam, Question, Option, ExamRegistration
+
+_datetime_field = serializers.DateTimeField()
+
+# Output field -> (lookups it needs, formatter over the .values() row).
+# Keys are in the serializers' field order.
+EXAM_COLUMNS = {
+    'id': (['id'], lambda row: row['id']),
+    'title': (['title'], lambda row: row['title']),
+    'description': (['description'], lambda row: row['description']),
+    'creator': (['creator'], lambda row: row['creator']),
+    'creator_name': (
+        ['creator__first_name', 'creator__last_name'],
+        lambda row: full_name(row['creator__first_name'], row['creator__last_name']),
+    ),
+    'duration_minutes': (['duration_minutes'], lambda row: row['duration_minutes']),
+    'passing_score': (['passing_score'], lambda row: row['passing_score']),
+    'difficulty': (['difficulty'], lambda row: row['difficulty']),
+    'is_active': (['is_active'], lambda row: row['is_active']),
+    'paper_mode': (['paper_mode'], lambda row: row['paper_mode']),
+    'shuffle_options': (['shuffle_options'], lambda row: row['shuffle_options']),
+    'capacity': (['capacity'], lambda row: row['capacity']),
+    'start_time': (['start_time'], lambda row: format_datetime(row['start_time'])),
+    'end_time': (['end_time'], lambda row: format_datetime(row['end_time'])),
+    'created_at': (['created_at'], lambda row: format_datetime(row['created_at'])),
+    'updated_at': (['updated_at'], lambda row: format_datetime(row['updated_at'])),
+    'questions': (['id'], None),
+}
+EXAM_FIELDS = list(EXAM_COLUMNS)
+EXAM_EXPANDABLE = ('questions',)
+
+REGISTRATION_COLUMNS = {
+    'id': (['id'], lambda row: row['id']),
+    'exam': (['exam'], lambda row: row['exam']),
+    'exam_title': (['exam__title'], lambda row: row['exam__title']),
+    'student': (['student'], lambda row: row['student']),
+    'student_name': (
+        ['student__first_name', 'student__last_name'],
+        lambda row: full_name(row['student__first_name'], row['student__last_name']),
+    ),
+    'registered_at': (['registered_at'], lambda row: format_datetime(row['registered_at'])),
+    'started_at': (['started_at'], lambda row: format_datetime(row['started_at'])),
+    'deadline': (['deadline'], lambda row: format_datetime(row['deadline'])),
+    'completed_at': (['completed_at'], lambda row: format_datetime(row['completed_at'])),
+    'score': (['score'], lambda row: row['score']),
+    'is_passed': (['is_passed'], lambda row: row['is_passed']),
+}
+REGISTRATION_FIELDS = list(REGISTRATION_COLUMNS)
+
+QUESTION_FIELDS = ('id', 'exam', 'section', 'question_text', 'question_type', 'points', 'order', 'explanation')
+OPTION_FIELDS = ('id', 'question', 'option_text', 'is_correct', 'order')
+
+
+def lookups_for(columns, fields):
+    """The ``.values()`` lookups needed to produce ``fields``."""
+    lookups = []
+    for name in fields:
+        for lookup in columns[name][0]:
+            if lookup not in lookups:
+                lookups.append(lookup)
+    return lookups
+
+
+def format_datetime(value):
+    return None if value is None else _datetime_field.to_representation(value)
+
+
+def full_name(first_name, last_name):
+    # Same as AbstractUser.get_full_name()
+    return f"{first_name} {last_name}".strip()
+
+
+def option_payloads(question_ids):
+    """Return ``{question_id: [option dict, ...]}`` in option order."""
+    options = {}
+    rows = (
+        Option.objects
+        .filter(question_id__in=question_ids)
+        .order_by('order', 'id')
+        .values_list(*OPTION_FIELDS)
+    )
+    for row in rows:
+        option = dict(zip(OPTION_FIELDS, row))
+        options.setdefault(option['question'], []).append(option)
+    return options
+
+
+def question_payloads(exam_ids):
+    """Return ``{exam_id: [question dict with options, ...]}`` in question order."""
+    rows = [
+        dict(zip(QUESTION_FIELDS, row))
+        for row in Question.objects
+        .filter(exam_id__in=exam_ids)
+        .order_by('order', 'id')
+        .values_list(*QUESTION_FIELDS)
+    ]
+    options = option_payloads([question['id'] for question in rows])
+
+    questions = {}
+    for question in rows:
+        # Same key order as QuestionSerializer
+        questions.setdefault(question['exam'], []).append({
+            'id': question['id'],
+            'exam': question['exam'],
+            'section': question['section'],
+            'question_text': question['question_text'],
+            'question_type': question['question_type'],
+            'points': question['points'],
+            'order': question['order'],
+            'options': options.get(question['id'], []),
+            'explanation': question['explanation'],
+        })
+    return questions
+
+
+def exam_payloads(queryset, fieldset=None):
+    """
+    ``ExamSerializer(queryset, many=True).data``: one query for the exams plus
+    two for questions and options when ``questions`` is selected.
+    """
+    fields = list(fieldset) if fieldset is not None else EXAM_FIELDS
+    rows = list(queryset.values(*lookups_for(EXAM_COLUMNS, fields)))
+    questions = question_payloads([row['id'] for row in rows]) if 'questions' in fields else {}
+
+    exams = []
+    for row in rows:
+        exam = {}
+        for name in fields:
+            if name == 'questions':
+                exam[name] = questions.get(row['id'], [])
+            else:
+                exam[name] = EXAM_COLUMNS[name][1](row)
+        exams.append(exam)
+    return exams
+
+
+def exam_payload(exam_id, fieldset=None):
+    """``ExamSerializer(exam).data`` for a single exam."""
+    payloads = exam_payloads(Exam.objects.filter(pk=exam_id), fieldset)
+    return payloads[0] if payloads else None
+
+
+def registration_rows(queryset, fieldset=None):
+    """A ``.values()`` queryset that ``registration_payload`` can format (paginates lazily)."""
+    fields = list(fieldset) if fieldset is not None else REGISTRATION_FIELDS
+    return queryset.values(*lookups_for(REGISTRATION_COLUMNS, fields))
+
+
+def registration_payload(row, fieldset=None):
+    """``ExamRegistrationSerializer(registration).data`` from a ``registration_rows`` row."""
+    fields = list(fieldset) if fieldset is not None else REGISTRATION_FIELDS
+    return {name: REGISTRATION_COLUMNS[name][1](row) for name in fields}
@@ -0,0 +1,134 @@
+"""
+Auto-grading of free-text (short answer and essay) responses.
+
+Each question's ``AcceptedAnswer`` rules are compiled once per exam version
+into a ``QuestionMatcher``: exact and token-set rules become hash-set lookups,
+regexes are precompiled and edit-distance checks use a banded Levenshtein that
+gives up as soon as the threshold is exceeded. The raw rules are shared
+through the ``exam_artifacts`` cache and compiled keys are kept per process,
+both keyed by the exam's paper version, so any edit to the exam's questions or
+rules recompiles them on next use.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from .models import AcceptedAnswer
+from .papers import FREE_TEXT_TYPES, FRAGMENT_CACHE_TIMEOUT, artifact_cache, get_paper_version  # noqa: F401
+
+_whitespace = re.compile(r'\s+')
+_punctuation = re.compile(r'[^\w\s.\-]')
+_token = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Unicode-normalize, casefold, drop punctuation and collapse whitespace."""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    text = _punctuation.sub(' ', text)
+    return _whitespace.sub(' ', text).strip(' .')
+
+
+def tokens(text):
+    return frozenset(_token.findall(normalize(text)))
+
+
+def parse_number(text):
+    try:
+        return float(str(text).strip().replace(',', ''))
+    except ValueError:
+        return None
+
+
+def within_edit_distance(a, b, max_distance):
+    """Levenshtein distance <= ``max_distance``, computed only inside the diagonal band."""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [max_distance + 1] * (len(b) + 1)
+        current[0] = i if i <= max_distance else max_distance + 1
+        for j in range(low, high + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        if min(current[low - 1:high + 1]) > max_distance:
+            return False
+        previous = current
+    return previous[len(b)] <= max_distance
+
+
+class QuestionMatcher:
+    """All accepted-answer rules of one question, compiled."""
+
+    def __init__(self, rules):
+        self.exact = set()
+        self.token_sets = set()
+        self.numbers = []
+        self.patterns = []
+        self.fuzzy = []
+        for rule in rules:
+            if rule['rule_type'] == 'exact':
+                self.exact.add(normalize(rule['value']))
+            elif rule['rule_type'] == 'token_set':
+                self.token_sets.add(tokens(rule['value']))
+            elif rule['rule_type'] == 'numeric':
+                number = parse_number(rule['value'])
+                if number is not None:
+                    self.numbers.append((number, rule['tolerance']))
+            elif rule['rule_type'] == 'regex':
+                self.patterns.append(re.compile(rule['value'], re.IGNORECASE))
+            elif rule['rule_type'] == 'edit_distance':
+                self.fuzzy.append((normalize(rule['value']), rule['max_distance']))
+
+    def __bool__(self):
+        return bool(self.exact or self.token_sets or self.numbers or self.patterns or self.fuzzy)
+
+    def match(self, answer):
+        if answer is None:
+            return False
+        raw = str(answer).strip()
+        normalized = normalize(raw)
+        if normalized in self.exact:
+            return True
+        if self.token_sets and tokens(raw) in self.token_sets:
+            return True
+        if self.numbers:
+            number = parse_number(raw)
+            if number is not None and any(abs(number - value) <= tolerance for value, tolerance in self.numbers):
+                return True
+        if any(pattern.fullmatch(raw) for pattern in self.patterns):
+            return True
+        return any(within_edit_distance(normalized, target, distance) for target, distance in self.fuzzy)
+
+
+@lru_cache(maxsize=256)
+def _compile_answer_key(exam_id, version):
+    cache_key = f"exam_answer_rules:{exam_id}:{version}"
+    rules = artifact_cache().get(cache_key)
+    if rules is None:
+        rules = {}
+        for rule in AcceptedAnswer.objects.filter(question__exam_id=exam_id).values(
+            'question_id', 'rule_type', 'value', 'tolerance', 'max_distance'
+        ):
+            rules.setdefault(rule['question_id'], []).append(rule)
+        artifact_cache().set(cache_key, rules, FRAGMENT_CACHE_TIMEOUT)
+    return {question_id: QuestionMatcher(question_rules) for question_id, question_rules in rules.items()}
+
+
+def get_answer_key(exam_id):
+    """Return ``{question_id: QuestionMatcher}`` for the exam's current version."""
+    return _compile_answer_key(exam_id, get_paper_version(exam_id))
+
+
+def grade_free_text(answer_key, question_id, answer):
+    """
+    Returns ``True`` when an accepted-answer rule matches, otherwise ``None``:
+    unmatched free text is never marked wrong automatically, it needs a human.
+    """
+    matcher = answer_key.get(question_id)
+    if not matcher:
+        return None
+    return True if matcher.match(answer) else None
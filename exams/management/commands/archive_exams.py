@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from exams.archive import ArchiveError, archive_exam
+from exams.models import Exam
+
+class Command(BaseCommand):
+    help = 'Move registrations, attempts and answers of finished exams into compressed archive files'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365,
+                            help='Archive exams that ended (or were deactivated) this many days ago')
+        parser.add_argument('--exam', type=int, action='append', dest='exams', help='Archive this exam (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the exams that would be archived')
+    
+    def handle(self, *args, **options):
+        exams = Exam.objects.filter(archive__isnull=True)
+        if options['exams']:
+            exams = exams.filter(id__in=options['exams'])
+        else:
+            cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+            exams = exams.filter(
+                Q(end_time__lt=cutoff) | Q(end_time__isnull=True, is_active=False, updated_at__lt=cutoff)
+            )
+        
+        for exam in exams.order_by('id').iterator():
+            if options['dry_run']:
+                self.stdout.write(f"Would archive exam {exam.id}: {exam.title}")
+                continue
+            try:
+                archived = archive_exam(exam)
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived exam {exam.id} to {archived.path}: {archived.registration_count} registration(s), "
+                f"{archived.attempt_count} attempt(s), {archived.answer_count} answer(s)"
+            ))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from backend.renderers import FastJSONRenderer
+from exams.fast_serializers import exam_payload
+from exams.models import Exam, Question
+from exams.serializers import ExamSerializer
+
+class Command(BaseCommand):
+    help = 'Compare ExamSerializer with the .values() fast path for one exam'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam to serialize')
+        parser.add_argument('--iterations', type=int, default=20, help='Number of runs per path')
+    
+    def handle(self, *args, **options):
+        exam_id = options['exam_id']
+        if not Exam.objects.filter(id=exam_id).exists():
+            raise CommandError(f"Exam {exam_id} not found")
+        
+        def serializer_path():
+            exam = Exam.objects.select_related('creator').prefetch_related(
+                Prefetch('questions', queryset=Question.objects.prefetch_related('options'))
+            ).get(id=exam_id)
+            return JSONRenderer().render(ExamSerializer(exam).data)
+        
+        def fast_path():
+            return FastJSONRenderer().render(exam_payload(exam_id))
+        
+        results = {}
+        for name, func in (('serializer', serializer_path), ('fast path', fast_path)):
+            func()  # warm up
+            start = time.perf_counter()
+            for _ in range(options['iterations']):
+                size = len(func())
+            results[name] = (time.perf_counter() - start) * 1000 / options['iterations']
+            self.stdout.write(f"{name:>10}: {results[name]:8.2f} ms/run ({size} bytes)")
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Fast path is {results['serializer'] / results['fast path']:.1f}x faster"
+        ))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from exams.cloning import clone_exam
+from exams.models import Exam
+from users.models import User
+
+class Command(BaseCommand):
+    help = 'Clone an exam with its sections, questions and options'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam to clone')
+        parser.add_argument('--title', help='Title of the new exam')
+        parser.add_argument('--creator', help='Username that will own the new exam (defaults to the original creator)')
+        parser.add_argument('--start-time', help='ISO 8601 start time of the new exam')
+        parser.add_argument('--end-time', help='ISO 8601 end time of the new exam')
+        parser.add_argument('--questions', help='Comma-separated question IDs to copy (defaults to all)')
+    
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} not found")
+        
+        creator = None
+        if options['creator']:
+            try:
+                creator = User.objects.get(username=options['creator'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['creator']}' not found")
+        
+        schedule = {}
+        for option in ('start_time', 'end_time'):
+            if options[option]:
+                value = parse_datetime(options[option])
+                if value is None:
+                    raise CommandError(f"Invalid datetime for --{option.replace('_', '-')}: {options[option]}")
+                schedule[option] = value
+        
+        question_ids = None
+        if options['questions']:
+            question_ids = [int(qid) for qid in options['questions'].split(',') if qid.strip()]
+        
+        new_exam = clone_exam(
+            exam,
+            creator=creator,
+            title=options['title'],
+            question_ids=question_ids,
+            **schedule,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Cloned '{exam.title}' as exam {new_exam.id} ('{new_exam.title}')")
+        )
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from exams.exports import EXPORT_FORMATS, iter_export
+from exams.models import Exam
+
+class Command(BaseCommand):
+    help = 'Stream an exam\'s registrations and attempts to a CSV or JSONL file'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam to export')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format')
+        parser.add_argument('--answers', action='store_true', help='Pivot per-question answers into columns')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+    
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} not found")
+        
+        chunks = iter_export(
+            exam,
+            options['format'],
+            include_answers=options['answers'],
+            compress=options['gzip'],
+        )
+        
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported results for '{exam.title}' to {options['output']}"))
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
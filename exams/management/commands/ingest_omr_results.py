@@ -0,0 +1,46 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from exams.models import Exam
+from exams.omr import OMRError, ingest_omr_csv
+
+class Command(BaseCommand):
+    help = 'Grade a scanned OMR CSV export for a paper exam and print the reconciliation report'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam the sheets belong to')
+        parser.add_argument('path', help='CSV export (student,question,marked); .gz files are read compressed')
+        parser.add_argument('--register-missing', action='store_true',
+                            help='Register students without a registration instead of rejecting their sheets')
+        parser.add_argument('--report', help='Write the full report as JSON to this file')
+    
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} not found")
+        
+        path = options['path']
+        opener = gzip.open if path.endswith('.gz') else open
+        started = time.perf_counter()
+        try:
+            with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+                report = ingest_omr_csv(exam, f, register_missing=options['register_missing'])
+        except (OSError, OMRError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+        for rejected in report['rejected'][:20]:
+            self.stdout.write(f"Line {rejected['line']} ({rejected['student']}): {rejected['error']}")
+        if len(report['rejected']) > 20:
+            self.stdout.write(f"... and {len(report['rejected']) - 20} more rejected sheet(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {report['sheets']} sheet(s) in {report['rows']} row(s) in {elapsed:.1f}s: "
+            f"{report['graded']} graded, {len(report['rejected'])} rejected, "
+            f"{report['registered']} newly registered, {len(report['absent'])} registered student(s) absent"
+        ))
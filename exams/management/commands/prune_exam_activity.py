@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from exams import activity
+from exams.models import ExamActivityEvent
+
+class Command(BaseCommand):
+    help = 'Drop exam activity log partitions (one exam, one day) older than the retention period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=getattr(settings, 'ACTIVITY_RETENTION_DAYS', 365),
+                            help='Drop events recorded this many days ago or earlier')
+        parser.add_argument('--exam', type=int, action='append', dest='exams', help='Only prune this exam (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the partitions that would be dropped')
+    
+    def handle(self, *args, **options):
+        activity.buffer.flush()
+        cutoff = timezone.now().date() - timedelta(days=options['older_than_days'])
+        events = ExamActivityEvent.objects.filter(day__lte=cutoff)
+        if options['exams']:
+            events = events.filter(exam_id__in=options['exams'])
+        partitions = list(events.values_list('exam_id', 'day').distinct().order_by('exam_id', 'day'))
+        
+        dropped = 0
+        for exam_id, day in partitions:
+            if options['dry_run']:
+                self.stdout.write(f"Would drop exam {exam_id} on {day}")
+                continue
+            # One short DELETE per partition, served by the (exam, day) index
+            deleted, _ = ExamActivityEvent.objects.filter(exam_id=exam_id, day=day).delete()
+            dropped += deleted
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Dropped {dropped} event(s) recorded on or before {cutoff}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from exams.archive import ArchiveError, restore_exam
+from exams.models import ArchivedExam
+
+class Command(BaseCommand):
+    help = 'Load an archived exam\'s registrations, attempts and answers back into the database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the archived exam')
+        parser.add_argument('--delete-files', action='store_true', help='Remove the archive files after restoring')
+    
+    def handle(self, *args, **options):
+        try:
+            archived = ArchivedExam.objects.get(exam_id=options['exam_id'])
+        except ArchivedExam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} is not archived")
+        
+        try:
+            restored = restore_exam(archived, delete_files=options['delete_files'])
+        except (ArchiveError, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored exam {options['exam_id']}: " + ', '.join(f"{count} {table}" for table, count in restored.items())
+        ))
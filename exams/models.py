@@ -1,7 +1,16 @@
+import time
+
 from django.db import models
+from datetime import timedelta
+
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+def new_paper_version():
+    # From the clock, so a version never repeats, even for a reused exam id
+    return time.time_ns()
+
+
 class Exam(models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Easy'),
@@ -23,11 +32,26 @@ class Exam(models.Model):
         default=60,
         validators=[MinValueValidator(1), MaxValueValidator(100)]
     )
+    PAPER_MODE_CHOICES = [
+        ('fixed', 'Fixed paper'),
+        ('pooled', 'Randomized from question pool'),
+    ]
+    
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
+    paper_mode = models.CharField(
+        max_length=10, choices=PAPER_MODE_CHOICES, default='fixed',
+        help_text="Pooled exams draw each student's questions from the sections' pools"
+    )
+    shuffle_options = models.BooleanField(default=False, help_text="Shuffle option order per student")
+    capacity = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Seats available; students beyond it join the waitlist. Empty for no limit"
+    )
     # Add these missing fields
     start_time = models.DateTimeField(null=True, blank=True, help_text="When the exam becomes available")
     end_time = models.DateTimeField(null=True, blank=True, help_text="When the exam is no longer available")
     is_active = models.BooleanField(default=True)
+    # Version of the question bank; cached papers and answer keys are keyed by it
+    paper_version = models.PositiveBigIntegerField(default=new_paper_version, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -36,6 +60,33 @@ class Exam(models.Model):
     
     def __str__(self):
         return self.title
+    
+    @property
+    def is_randomized(self):
+        return self.paper_mode == 'pooled' or self.shuffle_options
+    
+    def deadline_for(self, started_at):
+        """When an attempt started at ``started_at`` runs out of time."""
+        deadline = started_at + timedelta(minutes=self.duration_minutes)
+        if self.end_time and self.end_time < deadline:
+            return self.end_time
+        return deadline
+
+
+class ExamSection(models.Model):
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='sections')
+    title = models.CharField(max_length=200)
+    order = models.PositiveIntegerField(default=0)
+    draw_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Questions drawn per student in pooled mode (0 = all questions in the section)"
+    )
+    
+    class Meta:
+        ordering = ['order']
+    
+    def __str__(self):
+        return f"{self.exam.title} - {self.title}"
 
 
 class Question(models.Model):
@@ -49,6 +100,9 @@ class Question(models.Model):
     ]
     
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='questions')
+    section = models.ForeignKey(
+        ExamSection, on_delete=models.SET_NULL, null=True, blank=True, related_name='questions'
+    )
     question_text = models.TextField()
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPES)
     points = models.PositiveIntegerField(default=1)
@@ -76,6 +130,26 @@ class Option(models.Model):
         return f"{self.question} - {self.option_text}"
 
 
+class AcceptedAnswer(models.Model):
+    """A rule that auto-grades short answer and essay responses."""
+    RULE_TYPES = [
+        ('exact', 'Normalized exact match'),
+        ('token_set', 'Same set of words'),
+        ('numeric', 'Number within tolerance'),
+        ('regex', 'Regular expression'),
+        ('edit_distance', 'Within edit distance'),
+    ]
+    
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='accepted_answers')
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPES, default='exact')
+    value = models.TextField(help_text="Expected answer, number or regular expression")
+    tolerance = models.FloatField(default=0, help_text="Allowed absolute difference for numeric rules")
+    max_distance = models.PositiveIntegerField(default=1, help_text="Allowed typos for edit distance rules")
+    
+    def __str__(self):
+        return f"{self.question} - {self.rule_type}: {self.value}"
+
+
 class ExamRegistration(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='registrations')
     student = models.ForeignKey(
@@ -86,6 +160,10 @@ class ExamRegistration(models.Model):
     registered_at = models.DateTimeField(auto_now_add=True)
     # Add this missing field
     started_at = models.DateTimeField(null=True, blank=True)
+    # started_at + duration, capped by the exam's end_time; set with started_at
+    deadline = models.DateTimeField(null=True, blank=True)
+    # First offline bundle issued; the sheet is uploaded later, see exams.offline
+    offline_issued_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     score = models.FloatField(null=True, blank=True)
     is_passed = models.BooleanField(default=False)
@@ -94,6 +172,101 @@ class ExamRegistration(models.Model):
         unique_together = ['exam', 'student']
         # Add ordering
         ordering = ['-registered_at']
+        indexes = [
+            # Only open registrations are swept, keep the index to those
+            models.Index(fields=['deadline'], condition=models.Q(completed_at__isnull=True),
+                         name='open_registration_deadline'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.exam.title}"
+
+class ExamSeatCounter(models.Model):
+    """
+    One stripe of an exam's seat counter: ``taken`` of its ``seats``. Seats
+    are taken with a conditional UPDATE on a random stripe (see
+    ``exams.capacity``), so concurrent registrations spread over several rows
+    instead of queueing on one.
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='seat_counters')
+    stripe = models.PositiveSmallIntegerField()
+    seats = models.PositiveIntegerField(default=0)
+    taken = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['exam', 'stripe']
+    
+    def __str__(self):
+        return f"{self.exam_id} stripe {self.stripe}: {self.taken}/{self.seats}"
+
+
+class ExamWaitlistEntry(models.Model):
+    """A student waiting for a seat on a full exam, first come first served."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='exam_waitlist_entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['exam', 'student']
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.student_id} waiting for {self.exam_id}"
+
+class ExamActivityEvent(models.Model):
+    """
+    Append-only trail of what happened while a student sat an exam. Rows are
+    written in batches by ``exams.activity`` and never updated. ``day`` is
+    the server-side date the event was recorded: (exam, day) is the unit
+    ``prune_exam_activity`` drops, and the timeline index serves one
+    student's sitting in order.
+    """
+    PAPER_FETCHED = 'paper_fetched'
+    ANSWER_CHANGED = 'answer_changed'
+    FOCUS_LOST = 'focus_lost'
+    FOCUS_REGAINED = 'focus_regained'
+    SUBMITTED = 'submitted'
+    KIND_CHOICES = [
+        (PAPER_FETCHED, 'Paper fetched'),
+        (ANSWER_CHANGED, 'Answer changed'),
+        (FOCUS_LOST, 'Focus lost'),
+        (FOCUS_REGAINED, 'Focus regained'),
+        (SUBMITTED, 'Submitted'),
+    ]
+    # Kinds the exam client reports; the others are only logged by the server
+    CLIENT_KINDS = (ANSWER_CHANGED, FOCUS_LOST, FOCUS_REGAINED)
+    
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='+')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField(help_text="When it happened, by the reporting clock")
+    recorded_at = models.DateTimeField()
+    day = models.DateField()
+    data = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'student', 'occurred_at', 'id'], name='exam_activity_timeline'),
+            models.Index(fields=['exam', 'day'], name='exam_activity_partition'),
+        ]
+    
+    def __str__(self):
+        return f"{self.exam_id}/{self.student_id} {self.kind} at {self.occurred_at}"
+
+
+class ArchivedExam(models.Model):
+    """An exam whose registrations, attempts and answers were moved to cold storage."""
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='archive')
+    path = models.CharField(max_length=500, help_text="Archive directory, relative to EXAM_ARCHIVE_DIR")
+    manifest_sha256 = models.CharField(max_length=64)
+    registration_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    answer_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.student.username} - {self.exam.title}"
\ No newline at end of file
+        return f"Archive of {self.exam}"
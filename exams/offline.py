@@ -0,0 +1,269 @@
+"""
+Offline exam bundles for low-connectivity test centers.
+
+A bundle is everything ``TakeExamView`` would serve to one registered student,
+signed and zlib-compressed with ``django.core.signing``, plus a per-bundle
+sheet key. Issuing the first bundle starts the registration's clock (see
+``exams.deadlines``), so fetching another one later buys no extra time. The
+exam client works offline and signs the finished answer sheet with that key::
+
+    payload = base64url(json.dumps({'registration': ..., 'issued_at': ...,
+                                    'started_at': ..., 'submitted_at': ...,
+                                    'answers': [...]}))
+    sheet = payload + ':' + hex(HMAC-SHA256(sheet_key, payload))
+
+The key is derived from ``SECRET_KEY``, the registration and the bundle's
+issue time, so the server can check a sheet without storing anything per
+bundle. ``ingest_sheets`` verifies signatures and the timing window (times
+are epoch seconds from the client, allowed ``OFFLINE_CLOCK_SKEW_SECONDS`` of
+drift), then grades and saves the sheets in chunks: one locking read, one
+bulk update and a fixed number of summary updates per chunk, however many
+students a center uploads at once.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from submissions.models import record_graded_results
+from .deadlines import SUBMISSION_GRACE, is_late
+from .fast_serializers import exam_payload
+from .grading import get_answer_key
+from .models import ExamRegistration
+from .papers import build_paper, get_question_fragments, grade_fixed_paper, grade_paper, render_paper
+
+BUNDLE_FORMAT = 1
+BUNDLE_SALT = 'exams.offline.bundle'
+SHEET_KEY_SALT = b'exams.offline.sheet'
+CLOCK_SKEW = timedelta(seconds=getattr(settings, 'OFFLINE_CLOCK_SKEW_SECONDS', 300))
+MAX_SHEET_BYTES = 1024 * 1024
+MAX_ARCHIVE_BYTES = getattr(settings, 'OFFLINE_ARCHIVE_MAX_BYTES', 200 * 1024 * 1024)
+INGEST_CHUNK_SIZE = 500
+
+
+class SheetError(Exception):
+    pass
+
+
+def mark_issued(registrations, now):
+    """
+    Record that ``registrations`` were handed offline bundles, so the sweeper
+    waits ``OFFLINE_UPLOAD_WINDOW`` past their deadline for the sheets.
+    """
+    ExamRegistration.objects.filter(
+        pk__in=[registration.pk for registration in registrations], offline_issued_at__isnull=True
+    ).update(offline_issued_at=now)
+
+
+def sheet_key(registration_id, issued_at):
+    message = SHEET_KEY_SALT + f':{registration_id}:{issued_at}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _offline_paper(exam, student_id):
+    if exam.is_randomized:
+        return render_paper(exam, build_paper(exam, student_id))
+    paper = exam_payload(exam.id)
+    # The student keeps the bundle for the whole exam: leave out the answers
+    for question in paper['questions']:
+        question.pop('explanation', None)
+        for option in question['options']:
+            option.pop('is_correct', None)
+    return paper
+
+
+def build_bundle(exam, registration, now=None):
+    """The signed, compressed bundle for one registration."""
+    issued_at = int((now or timezone.now()).timestamp())
+    return signing.dumps({
+        'format': BUNDLE_FORMAT,
+        'registration': registration.id,
+        'exam': exam.id,
+        'student': registration.student_id,
+        'issued_at': issued_at,
+        'sheet_key': sheet_key(registration.id, issued_at),
+        'paper': _offline_paper(exam, registration.student_id),
+    }, salt=BUNDLE_SALT, compress=True)
+
+
+def load_bundle(bundle):
+    """Decode a bundle issued by this server (clients and tests use it to read one)."""
+    return signing.loads(bundle, salt=BUNDLE_SALT)
+
+
+def bundle_archive(exam, registrations, now=None):
+    """A zip of ``registration-<id>.bundle`` files for handing out at a center."""
+    buffer = io.BytesIO()
+    now = now or timezone.now()
+    # Bundles are compressed already
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for registration in registrations:
+            archive.writestr(f'registration-{registration.id}.bundle', build_bundle(exam, registration, now))
+    return buffer.getvalue()
+
+
+def sign_sheet(key, sheet):
+    """Encode and sign an answer sheet the way exam clients do."""
+    payload = base64.urlsafe_b64encode(json.dumps(sheet).encode()).decode().rstrip('=')
+    signature = hmac.new(key.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f'{payload}:{signature}'
+
+
+def decode_sheet(token):
+    """Return the sheet's payload dict once its signature checks out; raises ``SheetError``."""
+    if isinstance(token, bytes):
+        token = token.decode('ascii', 'replace')
+    payload, _, signature = token.strip().rpartition(':')
+    try:
+        sheet = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        registration_id, issued_at = int(sheet['registration']), int(sheet['issued_at'])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise SheetError("Malformed answer sheet.")
+    expected = hmac.new(sheet_key(registration_id, issued_at).encode(), payload.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        raise SheetError("Invalid answer sheet signature.")
+    answers = sheet.get('answers')
+    if not isinstance(answers, list) or not all(isinstance(answer, dict) for answer in answers):
+        raise SheetError("Malformed answer sheet.")
+    sheet['registration'] = registration_id
+    return sheet
+
+
+def _timestamp(sheet, name):
+    try:
+        return datetime.fromtimestamp(int(sheet[name]), tz=dt_timezone.utc)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        raise SheetError(f"Missing or invalid {name}.")
+
+
+def check_timing(exam, sheet, now):
+    """Raise ``SheetError`` unless the sheet was taken within the exam's window and time limit."""
+    issued_at = _timestamp(sheet, 'issued_at')
+    started_at = _timestamp(sheet, 'started_at')
+    submitted_at = _timestamp(sheet, 'submitted_at')
+    if started_at < issued_at - CLOCK_SKEW or submitted_at < started_at:
+        raise SheetError("Answer sheet times are inconsistent.")
+    if submitted_at > now + CLOCK_SKEW:
+        raise SheetError("Answer sheet is dated in the future.")
+    if exam.start_time and started_at < exam.start_time - CLOCK_SKEW:
+        raise SheetError("Exam was started before it opened.")
+    if exam.end_time and submitted_at > exam.end_time + SUBMISSION_GRACE + CLOCK_SKEW:
+        raise SheetError("Exam was submitted after it closed.")
+    if submitted_at > exam.deadline_for(started_at) + SUBMISSION_GRACE:
+        raise SheetError("Time limit for this exam was exceeded.")
+    return started_at, submitted_at
+
+
+def _grade(exam, student_id, answers, fragments, answer_key):
+    if exam.is_randomized:
+        correct, total = grade_paper(build_paper(exam, student_id), answers, answer_key)
+    else:
+        correct, total = grade_fixed_paper(fragments, answers, answer_key)
+    score = (correct / total) * 100 if total > 0 else 0
+    return score, score >= exam.passing_score
+
+
+def _ingest_chunk(exam, sheets, report, fragments, answer_key):
+    with transaction.atomic():
+        registrations = {
+            registration.id: registration
+            for registration in ExamRegistration.objects.select_for_update().filter(
+                exam=exam, pk__in=[sheet['registration'] for _, sheet, _ in sheets]
+            )
+        }
+        graded = []
+        for name, sheet, (started_at, submitted_at) in sheets:
+            registration = registrations.get(sheet['registration'])
+            if registration is None:
+                report['rejected'].append({'sheet': name, 'error': "No registration for this exam."})
+                continue
+            if registration.completed_at is not None:
+                report['rejected'].append({'sheet': name, 'error': "This exam has already been submitted."})
+                continue
+            # Hold the sheet to the clock the first bundle started, not the one it came in
+            if registration.started_at is not None and started_at < registration.started_at - CLOCK_SKEW:
+                report['rejected'].append({'sheet': name, 'error': "Exam was started before its bundle was issued."})
+                continue
+            if is_late(registration.deadline, submitted_at):
+                report['rejected'].append({'sheet': name, 'error': "Time limit for this exam was exceeded."})
+                continue
+            score, is_passed = _grade(exam, registration.student_id, sheet['answers'], fragments, answer_key)
+            registration.score, registration.is_passed, registration.completed_at = score, is_passed, submitted_at
+            if registration.started_at is None:
+                registration.started_at, registration.deadline = started_at, exam.deadline_for(started_at)
+            graded.append(registration)
+            report['graded'].append({
+                'sheet': name, 'registration': registration.id, 'student': registration.student_id,
+                'score': score, 'is_passed': is_passed,
+            })
+        ExamRegistration.objects.bulk_update(
+            graded, ['score', 'is_passed', 'completed_at', 'started_at', 'deadline'], batch_size=INGEST_CHUNK_SIZE
+        )
+        record_graded_results(exam, [
+            (registration.student_id, registration.score, registration.is_passed) for registration in graded
+        ])
+
+
+def ingest_sheets(exam, sheets, student=None, now=None):
+    """
+    Verify, grade and save ``[(name, token), ...]`` answer sheets for ``exam``.
+    With ``student``, only that student's own registration is accepted.
+    Returns ``{'graded': [...], 'rejected': [{'sheet', 'error'}, ...]}``.
+    """
+    now = now or timezone.now()
+    report = {'graded': [], 'rejected': []}
+    fragments = get_question_fragments(exam.id)
+    answer_key = get_answer_key(exam.id)
+
+    pending = []
+    seen = set()
+    for name, token in sheets:
+        try:
+            sheet = decode_sheet(token)
+            if sheet['registration'] in seen:
+                raise SheetError("Another sheet in this upload is for the same registration.")
+            timing = check_timing(exam, sheet, now)
+        except SheetError as exc:
+            report['rejected'].append({'sheet': name, 'error': str(exc)})
+            continue
+        seen.add(sheet['registration'])
+        pending.append((name, sheet, timing))
+
+    if student is not None and pending:
+        own = set(ExamRegistration.objects.filter(
+            student=student, pk__in=[sheet['registration'] for _, sheet, _ in pending]
+        ).values_list('pk', flat=True))
+        for name, sheet, _ in pending:
+            if sheet['registration'] not in own:
+                report['rejected'].append({'sheet': name, 'error': "This answer sheet is not yours."})
+        pending = [item for item in pending if item[1]['registration'] in own]
+
+    for start in range(0, len(pending), INGEST_CHUNK_SIZE):
+        _ingest_chunk(exam, pending[start:start + INGEST_CHUNK_SIZE], report, fragments, answer_key)
+    return report
+
+
+def read_sheet_archive(uploaded):
+    """Yield ``(name, token)`` for every ``.sheet`` file in a center's zip upload."""
+    try:
+        archive = zipfile.ZipFile(uploaded)
+    except zipfile.BadZipFile:
+        raise SheetError("Upload is not a zip archive.")
+    with archive:
+        entries = [info for info in archive.infolist() if info.filename.endswith('.sheet') and not info.is_dir()]
+        if sum(info.file_size for info in entries) > MAX_ARCHIVE_BYTES:
+            raise SheetError("Archive is too large.")
+        for info in entries:
+            if info.file_size > MAX_SHEET_BYTES:
+                yield info.filename, b''
+                continue
+            yield info.filename, archive.read(info)
@@ -0,0 +1,230 @@
+"""
+Bulk ingestion of scanned OMR answer sheets for exams taken on paper.
+
+Scanners export one CSV row per question on a sheet::
+
+    student,question,marked
+    s1024,1,B
+    s1024,2,AC
+    s1024,3,
+
+``student`` is the username, ``question`` the 1-based position on the
+student's printed paper (``build_paper``, so shuffled and pooled papers line
+up with what was printed) and ``marked`` the filled bubbles as letters, ``A``
+being the first option printed; blank means unanswered. A student's rows must
+be consecutive, which is how scanners write them.
+
+``ingest_omr_csv`` streams the file and works through ``OMR_INGEST_CHUNK_SIZE``
+sheets at a time: one query resolves the students, one locking read fetches
+their registrations, and the attempts, answers and graded registrations are
+written with bulk operations, graded against the cached question bank and
+answer key. Memory stays flat however large the file is. Each chunk commits
+on its own; sheets already graded are rejected, so a file can be run again
+after an interruption.
+"""
+import csv
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from submissions.models import Answer, ExamAttempt, record_graded_results
+from users.models import User
+from .capacity import reserve_seat
+from .grading import get_answer_key
+from .models import ExamRegistration, ExamWaitlistEntry
+from .papers import build_paper, is_correct_choice
+
+REQUIRED_COLUMNS = ('student', 'question', 'marked')
+CHUNK_SIZE = getattr(settings, 'OMR_INGEST_CHUNK_SIZE', 500)
+ANSWER_BATCH_SIZE = 2000
+MARK_SEPARATORS = str.maketrans('', '', ' ,;|')
+
+
+class OMRError(Exception):
+    pass
+
+
+def _read_sheets(lines):
+    """Yield ``(username, first line number, [(line, question, marked), ...])`` per sheet."""
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or not set(REQUIRED_COLUMNS) <= {name.strip() for name in reader.fieldnames}:
+        raise OMRError(f"The CSV needs the columns {', '.join(REQUIRED_COLUMNS)}.")
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+    rows = (
+        (line, (row['student'] or '').strip(), row['question'], row['marked'])
+        for line, row in enumerate(reader, start=2)
+    )
+    for username, group in groupby(rows, key=lambda row: row[1]):
+        group = [(line, question, marked) for line, _, question, marked in group]
+        yield username, group[0][0], group
+
+
+def _parse_marks(marked, question, position):
+    choices = set()
+    for letter in (marked or '').upper().translate(MARK_SEPARATORS):
+        choice = ord(letter) - ord('A')
+        if not 0 <= choice < len(question['options']):
+            raise OMRError(f"Question {position} has no option {letter}.")
+        choices.add(choice)
+    return sorted(choices)
+
+
+def _sheet_answers(paper, rows):
+    """Map a sheet's rows onto the paper: ``[(question, [choice, ...]), ...]`` for marked questions."""
+    answers = {}
+    for _line, position, marked in rows:
+        try:
+            position = int(position)
+        except (TypeError, ValueError):
+            raise OMRError(f"Invalid question number {position!r}.")
+        if not 1 <= position <= len(paper):
+            raise OMRError(f"Question {position} is not on this student's paper.")
+        if position in answers:
+            raise OMRError(f"Question {position} appears more than once.")
+        answers[position] = _parse_marks(marked, paper[position - 1], position)
+    return [(paper[position - 1], choices) for position, choices in sorted(answers.items()) if choices]
+
+
+def _lock_registrations(exam, student_ids):
+    return {
+        registration.student_id: registration
+        for registration in ExamRegistration.objects.select_for_update().filter(exam=exam, student_id__in=student_ids)
+    }
+
+
+def _save_registrations(registrations, now):
+    """
+    Mark graded registrations completed with one update per distinct result.
+    There are only as many as the paper has questions plus one, where
+    ``bulk_update`` would build a ``CASE`` over every row.
+    """
+    by_result = {}
+    for registration in registrations:
+        by_result.setdefault((registration.score, registration.is_passed), []).append(registration.pk)
+    for (score, is_passed), ids in by_result.items():
+        ExamRegistration.objects.filter(pk__in=ids).update(
+            score=score, is_passed=is_passed, completed_at=now, started_at=Coalesce('started_at', Value(now)),
+        )
+
+
+def _ingest_chunk(exam, sheets, report, context):
+    users = dict(User.objects.filter(username__in=[username for username, _, _ in sheets]).values_list('username', 'id'))
+    now = timezone.now()
+    with transaction.atomic():
+        registrations = _lock_registrations(exam, users.values())
+        missing = [student_id for student_id in users.values() if student_id not in registrations]
+        unseated = set()
+        if context['register_missing'] and missing:
+            # Paper sittings take seats too; whoever is past capacity is rejected
+            seated = []
+            for student_id in missing:
+                if not reserve_seat(exam):
+                    break
+                seated.append(student_id)
+            unseated = set(missing[len(seated):])
+            ExamRegistration.objects.bulk_create(
+                [ExamRegistration(exam=exam, student_id=student_id) for student_id in seated], ignore_conflicts=True
+            )
+            if exam.capacity is not None:
+                ExamWaitlistEntry.objects.filter(exam=exam, student_id__in=seated).delete()
+            registered = _lock_registrations(exam, seated)
+            registrations.update(registered)
+            report['registered'] += len(registered)
+        attempted = set(
+            ExamAttempt.objects.filter(exam=exam, student_id__in=users.values()).values_list('student_id', flat=True)
+        )
+
+        graded, attempts, answers = [], [], []
+        for username, line, rows in sheets:
+            student_id = users.get(username)
+            registration = registrations.get(student_id)
+            try:
+                if student_id is None:
+                    raise OMRError("Unknown student.")
+                if student_id in unseated:
+                    raise OMRError("Exam is full.")
+                if registration is None:
+                    raise OMRError("Student is not registered for this exam.")
+                if registration.completed_at is not None or student_id in attempted:
+                    raise OMRError("This student's exam has already been graded.")
+                paper = context['paper'] or build_paper(exam, student_id)
+                marked = _sheet_answers(paper, rows)
+            except OMRError as exc:
+                report['rejected'].append({'student': username, 'line': line, 'error': str(exc)})
+                continue
+
+            attempt = ExamAttempt(exam=exam, student_id=student_id, end_time=now, is_submitted=True)
+            correct = 0
+            for question, choices in marked:
+                is_correct = is_correct_choice(question, choices, context['answer_key'])
+                correct += is_correct
+                answers.append(Answer(
+                    attempt=attempt, question_id=question['id'], is_correct=is_correct,
+                    answer_text=','.join(question['options'][choice]['option_text'] for choice in choices),
+                ))
+            score = (correct / len(paper)) * 100 if paper else 0
+            attempt.score, attempt.passed = score, score >= exam.passing_score
+            registration.score, registration.is_passed = score, attempt.passed
+            attempts.append(attempt)
+            graded.append(registration)
+            report['graded'] += 1
+            report['total_score'] += score
+
+        ExamAttempt.objects.bulk_create(attempts, batch_size=CHUNK_SIZE)
+        # The attempts have their primary keys now
+        Answer.objects.bulk_create(answers, batch_size=ANSWER_BATCH_SIZE)
+        _save_registrations(graded, now)
+        record_graded_results(exam, [
+            (registration.student_id, registration.score, registration.is_passed) for registration in graded
+        ])
+
+
+def ingest_omr_csv(exam, lines, register_missing=False):
+    """
+    Grade and save the sheets in an OMR export (any iterable of text lines).
+    With ``register_missing``, students without a registration are registered
+    instead of rejected, as long as the exam has seats left. Returns the reconciliation report::
+
+        {'rows', 'sheets', 'graded', 'registered', 'mean_score',
+         'rejected': [{'student', 'line', 'error'}, ...],
+         'absent': [usernames registered but missing from the file]}
+
+    Raises ``OMRError`` if the file is not an OMR export at all.
+    """
+    report = {
+        'rows': 0, 'sheets': 0, 'graded': 0, 'registered': 0, 'total_score': 0.0,
+        'rejected': [], 'absent': [],
+    }
+    context = {
+        'register_missing': register_missing,
+        'answer_key': get_answer_key(exam.id),
+        # Everyone sits the same paper unless it is randomized
+        'paper': None if exam.is_randomized else build_paper(exam, None),
+    }
+    seen = set()
+    chunk = []
+    for username, line, rows in _read_sheets(lines):
+        report['rows'] += len(rows)
+        report['sheets'] += 1
+        if username in seen:
+            report['rejected'].append({
+                'student': username, 'line': line, 'error': "Rows for this student are not consecutive.",
+            })
+            continue
+        seen.add(username)
+        chunk.append((username, line, rows))
+        if len(chunk) >= CHUNK_SIZE:
+            _ingest_chunk(exam, chunk, report, context)
+            chunk = []
+    if chunk:
+        _ingest_chunk(exam, chunk, report, context)
+
+    pending = ExamRegistration.objects.filter(exam=exam, completed_at__isnull=True)
+    report['absent'] = sorted(set(pending.values_list('student__username', flat=True)) - seen)
+    total_score = report.pop('total_score')
+    report['mean_score'] = total_score / report['graded'] if report['graded'] else None
+    return report
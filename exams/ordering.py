@@ -0,0 +1,93 @@
+"""
+Sparse question ordering.
+
+Question ``order`` values are kept with gaps between them. To apply a new
+sequence we keep the longest run of questions that are already in the right
+relative order (the longest increasing subsequence of their current
+positions) and only give new positions to the rest, picked inside the gaps
+around them. Only when a gap is exhausted is the whole exam respaced.
+"""
+from bisect import bisect_left
+
+POSITION_GAP = 1024
+
+
+def _longest_increasing_subsequence(values):
+    """Return the indexes of one longest strictly increasing subsequence of ``values``."""
+    tails = []        # tails[k] = smallest tail value of an increasing run of length k + 1
+    tail_indexes = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[k] = value
+            tail_indexes[k] = index
+        previous[index] = tail_indexes[k - 1] if k else None
+
+    result = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        result.append(index)
+        index = previous[index]
+    return result[::-1]
+
+
+def plan_positions(sequence, positions):
+    """
+    ``sequence`` is the desired order of ids and ``positions`` maps each id to
+    its current position. Returns ``{id: new_position}`` for the ids that have
+    to move.
+    """
+    current = [positions[item] for item in sequence]
+    keep = set(_longest_increasing_subsequence(current))
+
+    changes = {}
+    run = []
+    lower = -1
+    for index, item in enumerate(sequence + [None]):
+        if item is not None and index not in keep:
+            run.append(item)
+            continue
+        upper = current[index] if item is not None else None
+        if run:
+            if upper is None:
+                step = POSITION_GAP
+            else:
+                step = (upper - lower) // (len(run) + 1)
+            if step < 1:
+                return respace(sequence, positions)
+            for offset, moved in enumerate(run, start=1):
+                changes[moved] = lower + step * offset
+            run = []
+        if item is not None:
+            lower = current[index]
+    return changes
+
+
+def respace(sequence, positions):
+    """Evenly respace the whole sequence, returning only the ids whose position changed."""
+    changes = {}
+    for index, item in enumerate(sequence, start=1):
+        position = index * POSITION_GAP
+        if positions[item] != position:
+            changes[item] = position
+    return changes
+
+
+def apply_moves(sequence, moves):
+    """
+    Apply ``[{'id': ..., 'after': id or None}, ...]`` to ``sequence`` in
+    turn; ``after=None`` moves the question to the top. Every id must be in
+    ``sequence`` and no question can follow itself (``QuestionBatchSerializer``
+    checks both).
+    """
+    sequence = list(sequence)
+    for move in moves:
+        sequence.remove(move['id'])
+        after = move.get('after')
+        index = 0 if after is None else sequence.index(after) + 1
+        sequence.insert(index, move['id'])
+    return sequence
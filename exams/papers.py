@@ -0,0 +1,236 @@
+"""
+Per-student exam papers.
+
+The question bank of an exam is cached as plain-dict fragments (one query per
+cache miss) in the ``exam_artifacts`` cache under the exam's ``paper_version``,
+so an entry never changes and can live in a host-wide cache shared by all
+workers (see ``backend.shm_cache``). A student's paper is a deterministic
+function of the fragments and a seed derived from (exam, student), so it can
+be rebuilt on demand for serving and for grading without storing a copy per
+student.
+"""
+import hashlib
+import hmac
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Exam, ExamSection, Question, Option, new_paper_version
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+ARTIFACT_CACHE = getattr(settings, 'EXAM_ARTIFACT_CACHE', 'exam_artifacts')
+SINGLE_CHOICE_TYPES = ('multiple_choice', 'true_false')
+FREE_TEXT_TYPES = ('short_answer', 'essay')
+
+
+def artifact_cache():
+    return caches[ARTIFACT_CACHE]
+
+
+def get_paper_version(exam_id):
+    """
+    The exam's current question-bank version. It lives on the exam row, so
+    every worker on every host agrees on it and shares one cached copy.
+    """
+    return Exam.objects.filter(pk=exam_id).values_list('paper_version', flat=True).first() or 0
+
+
+def invalidate_paper_cache(exam_id):
+    """Move the exam to a new version; entries for the old one simply expire."""
+    Exam.objects.filter(pk=exam_id).update(paper_version=new_paper_version())
+
+
+def get_question_fragments(exam_id):
+    """
+    Return the exam's question bank as cached dicts::
+
+        {'sections': {section_id: draw_count},
+         'questions': [{..., 'options': [{...}, ...]}, ...]}
+    """
+    cache_key = f"exam_paper_fragments:{exam_id}:{get_paper_version(exam_id)}"
+    fragments = artifact_cache().get(cache_key)
+    if fragments is not None:
+        return fragments
+
+    sections = dict(
+        ExamSection.objects.filter(exam_id=exam_id).values_list('id', 'draw_count')
+    )
+    questions = {}
+    for question in Question.objects.filter(exam_id=exam_id).order_by('order', 'id').values(
+        'id', 'section_id', 'question_text', 'question_type', 'points', 'order'
+    ):
+        question['options'] = []
+        questions[question['id']] = question
+    for option in Option.objects.filter(question__exam_id=exam_id).order_by('order', 'id').values(
+        'id', 'question_id', 'option_text', 'is_correct', 'order'
+    ):
+        questions[option.pop('question_id')]['options'].append(option)
+
+    fragments = {'sections': sections, 'questions': list(questions.values())}
+    artifact_cache().set(cache_key, fragments, FRAGMENT_CACHE_TIMEOUT)
+    return fragments
+
+
+def paper_seed(exam_id, student_id):
+    """Seed for a student's paper; keyed with SECRET_KEY so it can't be predicted."""
+    message = f"{exam_id}:{student_id}".encode()
+    digest = hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def build_paper(exam, student_id):
+    """
+    Return the student's paper as a list of question fragments, each with its
+    options in the order the student sees them.
+    """
+    fragments = get_question_fragments(exam.id)
+    rng = random.Random(paper_seed(exam.id, student_id))
+
+    questions = fragments['questions']
+    if exam.paper_mode == 'pooled':
+        pools = {}
+        for question in questions:
+            pools.setdefault(question['section_id'], []).append(question)
+        questions = []
+        for section_id, pool in pools.items():
+            draw_count = fragments['sections'].get(section_id, 0)
+            if draw_count and draw_count < len(pool):
+                # Keep the drawn questions in their authored order
+                drawn = set(q['id'] for q in rng.sample(pool, draw_count))
+                pool = [q for q in pool if q['id'] in drawn]
+            questions.extend(pool)
+
+    paper = []
+    for question in questions:
+        options = list(question['options'])
+        if exam.shuffle_options:
+            rng.shuffle(options)
+        paper.append(dict(question, options=options))
+    return paper
+
+
+def render_paper(exam, paper):
+    """Student-facing payload. Options are identified by position only."""
+    return {
+        'id': exam.id,
+        'title': exam.title,
+        'description': exam.description,
+        'duration_minutes': exam.duration_minutes,
+        'start_time': exam.start_time,
+        'end_time': exam.end_time,
+        'questions': [
+            {
+                'id': question['id'],
+                'question_text': question['question_text'],
+                'question_type': question['question_type'],
+                'points': question['points'],
+                'order': position,
+                'options': [
+                    {'choice': choice, 'option_text': option['option_text']}
+                    for choice, option in enumerate(question['options'])
+                ],
+            }
+            for position, question in enumerate(paper, start=1)
+        ],
+    }
+
+
+def _chosen_options(question, user_answer):
+    values = user_answer if isinstance(user_answer, list) else [user_answer]
+    chosen = set()
+    for value in values:
+        try:
+            choice = int(value)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= choice < len(question['options']):
+            chosen.add(question['options'][choice]['id'])
+    return chosen
+
+
+def grade_paper(paper, answers, answer_key=None):
+    """
+    Grade ``[{'question_id': ..., 'answer': choice or [choices]}, ...]``
+    against the student's paper, mapping choice positions back to options.
+    Free-text answers are checked against ``answer_key`` (see
+    ``exams.grading``). Returns ``(correct_answers, total_questions)``.
+    """
+    marked = mark_answers(paper, answers, answer_key)
+    return sum(is_correct for _, _, is_correct in marked), len(paper)
+
+
+def is_correct_choice(question, user_answer, answer_key):
+    """Whether ``user_answer`` (choice positions, or text) is right for one paper question."""
+    if question['question_type'] in FREE_TEXT_TYPES:
+        matcher = answer_key.get(question['id'])
+        return bool(matcher and matcher.match(user_answer))
+
+    correct = {o['id'] for o in question['options'] if o['is_correct']}
+    chosen = _chosen_options(question, user_answer)
+    if question['question_type'] in SINGLE_CHOICE_TYPES:
+        return len(chosen) == 1 and chosen <= correct
+    if question['question_type'] == 'multiple_select':
+        return bool(correct) and chosen == correct
+    return False
+
+
+def _is_correct_fixed(question, user_answer, answer_key):
+    correct = [str(option['id']) for option in question['options'] if option['is_correct']]
+    if question['question_type'] == 'multiple_choice':
+        return bool(correct) and correct[0] == str(user_answer)
+    if question['question_type'] == 'multiple_select':
+        return set(correct) == set(map(str, user_answer if isinstance(user_answer, list) else [user_answer]))
+    if question['question_type'] in FREE_TEXT_TYPES:
+        matcher = answer_key.get(question['id'])
+        return bool(matcher and matcher.match(user_answer))
+    return False
+
+
+def grade_fixed_paper(fragments, answers, answer_key=None):
+    """
+    Grade answers to a non-randomized exam, which name options by id, against
+    the cached question bank. Same rules and return value as ``grade_paper``.
+    """
+    marked = mark_answers(fragments['questions'], answers, answer_key, by_position=False)
+    return sum(is_correct for _, _, is_correct in marked), len(fragments['questions'])
+
+
+def _answer_text(question, user_answer, by_position):
+    if question['question_type'] in FREE_TEXT_TYPES:
+        return str(user_answer)
+    if by_position:
+        chosen = _chosen_options(question, user_answer)
+    else:
+        chosen = set(map(str, user_answer if isinstance(user_answer, list) else [user_answer]))
+    # Option texts, as ``Answer.check_answer`` and OMR ingestion store them
+    return ','.join(
+        option['option_text'] for option in question['options']
+        if (option['id'] if by_position else str(option['id'])) in chosen
+    )
+
+
+def mark_answers(questions, answers, answer_key=None, by_position=True):
+    """
+    ``[(question, answer_text, is_correct), ...]`` for every question in
+    ``questions``, in paper order: unanswered ones have empty text and are
+    wrong, and the last answer to a question counts. Choices are positions on
+    the student's paper, or option ids ``by_position=False`` for a
+    non-randomized exam.
+    """
+    answer_key = answer_key or {}
+    given = {}
+    for answer in answers:
+        given[answer.get('question_id')] = answer.get('answer')
+    is_correct = is_correct_choice if by_position else _is_correct_fixed
+    marked = []
+    for question in questions:
+        if question['id'] not in given:
+            marked.append((question, '', False))
+            continue
+        user_answer = given[question['id']]
+        marked.append((
+            question, _answer_text(question, user_answer, by_position),
+            is_correct(question, user_answer, answer_key),
+        ))
+    return marked
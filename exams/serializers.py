@@ -1,6 +1,9 @@
+import re
+
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
-from .models import Exam, Question, Option, ExamRegistration
+from .models import Exam, ExamSection, Question, Option, AcceptedAnswer, ExamRegistration
+from backend.fieldsets import SparseFieldsMixin
 from users.models import User
 
 class OptionSerializer(serializers.ModelSerializer):
@@ -14,7 +17,34 @@ class QuestionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Question
-        fields = ['id', 'exam', 'question_text', 'question_type', 'points', 'order', 'options', 'explanation']
+        fields = ['id', 'exam', 'section', 'question_text', 'question_type', 'points', 'order', 'options', 'explanation']
+        read_only_fields = ['exam']
+
+class AcceptedAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AcceptedAnswer
+        fields = ['id', 'question', 'rule_type', 'value', 'tolerance', 'max_distance']
+        read_only_fields = ['question']
+    
+    def validate(self, data):
+        rule_type = data.get('rule_type', getattr(self.instance, 'rule_type', 'exact'))
+        value = data.get('value', getattr(self.instance, 'value', ''))
+        if rule_type == 'regex':
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise serializers.ValidationError({'value': f"Invalid regular expression: {e}"})
+        elif rule_type == 'numeric':
+            try:
+                float(value.strip().replace(',', ''))
+            except ValueError:
+                raise serializers.ValidationError({'value': "Numeric rules need a number."})
+        return data
+
+class ExamSectionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExamSection
+        fields = ['id', 'exam', 'title', 'order', 'draw_count']
         read_only_fields = ['exam']
 
 class ExamSerializer(serializers.ModelSerializer):
@@ -26,11 +56,12 @@ class ExamSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'creator', 'creator_name', 
             'duration_minutes', 'passing_score', 'difficulty', 'is_active',
+            'paper_mode', 'shuffle_options', 'capacity',
             'start_time', 'end_time', 'created_at', 'updated_at', 'questions'
         ]
         read_only_fields = ['creator', 'created_at', 'updated_at']
 
-class ExamListSerializer(serializers.ModelSerializer):
+class ExamListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     creator_name = serializers.CharField(source='creator.get_full_name', read_only=True)
     question_count = serializers.SerializerMethodField()
     
@@ -44,6 +75,9 @@ class ExamListSerializer(serializers.ModelSerializer):
     
     @extend_schema_field(serializers.IntegerField())
     def get_question_count(self, obj):
+        # Annotated by ExamListView to avoid a COUNT query per exam
+        if hasattr(obj, 'num_questions'):
+            return obj.num_questions
         return obj.questions.count()
 
 class ExamRegistrationSerializer(serializers.ModelSerializer):
@@ -54,9 +88,48 @@ class ExamRegistrationSerializer(serializers.ModelSerializer):
         model = ExamRegistration
         fields = [
             'id', 'exam', 'exam_title', 'student', 'student_name',
-            'registered_at', 'started_at', 'completed_at', 'score', 'is_passed'
+            'registered_at', 'started_at', 'deadline', 'completed_at', 'score', 'is_passed'
         ]
-        read_only_fields = ['student', 'registered_at', 'started_at', 'completed_at', 'score', 'is_passed']
+        read_only_fields = ['student', 'registered_at', 'started_at', 'deadline', 'completed_at', 'score', 'is_passed']
+
+class ExamCloneSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200, required=False)
+    start_time = serializers.DateTimeField(required=False, allow_null=True)
+    end_time = serializers.DateTimeField(required=False, allow_null=True)
+    question_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+class QuestionMoveSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    after = serializers.IntegerField(allow_null=True, required=False, default=None)
+
+class QuestionBatchSerializer(serializers.Serializer):
+    order = serializers.ListField(child=serializers.IntegerField(), required=False)
+    moves = QuestionMoveSerializer(many=True, required=False)
+    questions = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    options = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if 'order' in attrs and 'moves' in attrs:
+            raise serializers.ValidationError("Send either 'order' or 'moves', not both.")
+        if len(set(attrs.get('order', []))) != len(attrs.get('order', [])):
+            raise serializers.ValidationError({'order': "Question IDs must be unique."})
+        if any(move['id'] == move['after'] for move in attrs.get('moves', [])):
+            raise serializers.ValidationError({'moves': "A question cannot be moved after itself."})
+        # The exam's question IDs, passed in by the view
+        question_ids = self.context.get('question_ids')
+        if question_ids is not None:
+            requested = set(attrs.get('order', []))
+            for move in attrs.get('moves', []):
+                requested.update(qid for qid in (move['id'], move['after']) if qid is not None)
+            unknown = sorted(requested - question_ids)
+            if unknown:
+                field = 'moves' if 'moves' in attrs else 'order'
+                raise serializers.ValidationError({field: f"Questions {unknown} are not part of this exam."})
+        for field in ('questions', 'options'):
+            for item in attrs[field]:
+                if not isinstance(item.get('id'), int):
+                    raise serializers.ValidationError({field: "Every item needs an integer 'id'."})
+        return attrs
 
 class AnswerSerializer(serializers.Serializer):
     question_id = serializers.IntegerField()
@@ -0,0 +1,31 @@
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import activity
+from .models import Exam, ExamSection, Question, Option, AcceptedAnswer
+from .papers import invalidate_paper_cache
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    invalidate_paper_cache(instance.id)
+
+
+@receiver([post_save, post_delete], sender=ExamSection)
+@receiver([post_save, post_delete], sender=Question)
+def exam_content_changed(sender, instance, **kwargs):
+    invalidate_paper_cache(instance.exam_id)
+
+
+@receiver([post_save, post_delete], sender=Option)
+@receiver([post_save, post_delete], sender=AcceptedAnswer)
+def question_content_changed(sender, instance, **kwargs):
+    exam_id = Question.objects.filter(id=instance.question_id).values_list('exam_id', flat=True).first()
+    if exam_id:
+        invalidate_paper_cache(exam_id)
+
+
+@receiver(request_finished)
+def flush_activity_log(sender, **kwargs):
+    activity.flush_if_due()
@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend import schema
+from backend.renderers import FastJSONRenderer
+from backend.shm_cache import SharedMemoryCache
+from .fast_serializers import EXAM_FIELDS, exam_payload, registration_rows, registration_payload
+from . import activity
+from .capacity import sync_seat_counters
+from .cloning import clone_exam
+from .exports import iter_export
+from .models import Exam, ExamSection, Question, Option, AcceptedAnswer, ExamRegistration, ArchivedExam, ExamActivityEvent, ExamSeatCounter, ExamWaitlistEntry
+from .serializers import ExamSerializer, ExamRegistrationSerializer
+from submissions.models import Answer, ExamAttempt, ExamResultSummary, ManualReview
+from submissions.sweeper import close_expired_registrations
+from .archive import archive_exam, restore_exam
+from .deadlines import OFFLINE_UPLOAD_WINDOW
+from .offline import build_bundle, ingest_sheets, load_bundle, sign_sheet
+from .ordering import POSITION_GAP, apply_moves, plan_positions
+from .papers import get_question_fragments, invalidate_paper_cache
+
+
+class AdminChangelistQueryBudgetTests(TestCase):
+    """Admin changelists must cost the same number of queries however much data there is."""
+
+    CHANGELISTS = [
+        ('admin:exams_exam_changelist', 6),
+        ('admin:exams_question_changelist', 6),
+        ('admin:exams_option_changelist', 6),
+        ('admin:exams_examregistration_changelist', 6),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass', role='admin')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass', role='teacher')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_data(self, exams):
+        for _ in range(exams):
+            exam = Exam.objects.create(
+                title='Exam', description='', creator=self.teacher, duration_minutes=30
+            )
+            questions = Question.objects.bulk_create([
+                Question(exam=exam, question_text=f'Q{i}', question_type='multiple_choice', order=i)
+                for i in range(5)
+            ])
+            Option.objects.bulk_create([
+                Option(question=question, option_text=f'O{j}', order=j)
+                for question in questions for j in range(4)
+            ])
+            student = User.objects.create_user(f'student{exam.id}', role='student')
+            ExamRegistration.objects.create(exam=exam, student=student)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelist_query_counts_are_constant(self):
+        self.add_data(2)
+        self.count_queries(reverse('admin:index'))
+        small = {name: self.count_queries(reverse(name)) for name, _ in self.CHANGELISTS}
+        self.add_data(30)
+        for name, budget in self.CHANGELISTS:
+            with self.subTest(changelist=name):
+                queries = self.count_queries(reverse(name))
+                self.assertEqual(queries, small[name])
+                self.assertLessEqual(queries, budget)
+
+    def test_exam_filter_does_not_list_every_exam(self):
+        self.add_data(30)
+        response = self.client.get(reverse('admin:exams_option_changelist'))
+        choices = [
+            choice for spec in response.context['cl'].filter_specs
+            if getattr(spec, 'parameter_name', None) == 'question__exam'
+            for choice in spec.lookup_choices
+        ]
+        self.assertEqual(len(choices), 20)
+
+    def test_exam_change_form_does_not_inline_questions(self):
+        self.add_data(1)
+        exam = Exam.objects.get()
+        self.count_queries(reverse('admin:exams_exam_change', args=[exam.id]))
+        queries = self.count_queries(reverse('admin:exams_exam_change', args=[exam.id]))
+        Question.objects.bulk_create([
+            Question(exam=exam, question_text='Extra', question_type='essay') for _ in range(50)
+        ])
+        self.assertEqual(self.count_queries(reverse('admin:exams_exam_change', args=[exam.id])), queries)
+
+
+class FastSerializerParityTests(TestCase):
+    """The .values() fast path must produce exactly what the DRF serializers produce."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'pass', role='teacher', first_name='Ada', last_name='Lovelace'
+        )
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pass', first_name='Alan')
+        cls.exam = Exam.objects.create(
+            title='Algebra', description='Term 1', creator=cls.teacher, duration_minutes=45
+        )
+        for i in range(3):
+            question = Question.objects.create(
+                exam=cls.exam, question_text=f'Q{i}', question_type='multiple_choice', order=3 - i
+            )
+            for j in range(3):
+                Option.objects.create(question=question, option_text=f'O{j}', is_correct=j == 0, order=3 - j)
+        cls.registration = ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def assertSameJSON(self, fast, slow):
+        fast_json = json.dumps(fast)
+        slow_json = json.dumps(slow)
+        self.assertEqual(fast_json, slow_json)
+
+    def test_exam_payload_matches_exam_serializer(self):
+        self.assertSameJSON(exam_payload(self.exam.id), ExamSerializer(self.exam).data)
+
+    def test_exam_payload_for_exam_without_questions(self):
+        exam = Exam.objects.create(title='Empty', description='', creator=self.teacher, duration_minutes=5)
+        self.assertSameJSON(exam_payload(exam.id), ExamSerializer(exam).data)
+
+    def test_registration_payload_matches_registration_serializer(self):
+        row = registration_rows(ExamRegistration.objects.filter(pk=self.registration.pk)).get()
+        self.assertSameJSON(registration_payload(row), ExamRegistrationSerializer(self.registration).data)
+
+    def test_exam_payload_query_count_is_constant(self):
+        with self.assertNumQueries(3):
+            exam_payload(self.exam.id)
+
+    def test_fast_renderer_output_matches_json_renderer(self):
+        data = exam_payload(self.exam.id)
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher', first_name='Ada')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Algebra', description='', creator=cls.teacher, duration_minutes=45)
+        question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        Option.objects.create(question=question, option_text='O', is_correct=True)
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_exam_detail_summary_skips_questions(self):
+        data, sql = self.get(f'/api/exams/{self.exam.id}/?fields=id,title,creator_name')
+        self.assertEqual(data, {'id': self.exam.id, 'title': 'Algebra', 'creator_name': 'Ada'})
+        self.assertNotIn('exams_question', sql)
+        self.assertNotIn('exams_option', sql)
+
+    def test_exam_detail_expand_questions(self):
+        data, _ = self.get(f'/api/exams/{self.exam.id}/?fields=id&expand=questions')
+        self.assertEqual(list(data), ['id', 'questions'])
+        self.assertEqual(data['questions'][0]['options'][0]['option_text'], 'O')
+
+    def test_exam_detail_default_is_unchanged(self):
+        data, _ = self.get(f'/api/exams/{self.exam.id}/')
+        self.assertEqual(list(data), EXAM_FIELDS)
+
+    def test_exam_list_without_question_count_skips_questions(self):
+        data, sql = self.get('/api/exams/?fields=id,title')
+        self.assertEqual(data['results'], [{'id': self.exam.id, 'title': 'Algebra'}])
+        self.assertNotIn('exams_question', sql)
+
+    def test_registration_fields(self):
+        data, sql = self.get('/api/exams/my-registrations/?fields=exam,score')
+        self.assertEqual(data['results'], [{'exam': self.exam.id, 'score': None}])
+        self.assertNotIn('users_user', sql.split('FROM "exams_examregistration"')[-1])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(f'/api/exams/{self.exam.id}/?fields=secret')
+        self.assertEqual(response.status_code, 400)
+
+
+class DeadlineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Timed', description='', creator=teacher, duration_minutes=20)
+        question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        Option.objects.create(question=question, option_text='O', is_correct=True)
+        cls.registration = ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_first_load_starts_the_clock_once(self):
+        self.client.get(f'/api/exams/{self.exam.id}/take/')
+        self.registration.refresh_from_db()
+        started_at = self.registration.started_at
+        self.assertEqual(self.registration.deadline, started_at + timedelta(minutes=20))
+
+        self.client.get(f'/api/exams/{self.exam.id}/take/')
+        self.registration.refresh_from_db()
+        self.assertEqual(self.registration.started_at, started_at)
+
+    def test_late_submission_is_rejected(self):
+        started_at = timezone.now() - timedelta(minutes=30)
+        ExamRegistration.objects.filter(pk=self.registration.pk).update(
+            started_at=started_at, deadline=self.exam.deadline_for(started_at)
+        )
+        response = self.client.post(f'/api/exams/{self.exam.id}/submit/', {'answers': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.registration.refresh_from_db()
+        self.assertIsNone(self.registration.completed_at)
+
+
+class IdempotentSubmitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Quiz', description='', creator=teacher, duration_minutes=20)
+        question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        cls.option = Option.objects.create(question=question, option_text='O', is_correct=True)
+        cls.question = question
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = f'/api/exams/{self.exam.id}/submit/'
+        self.body = {'answers': [{'question_id': self.question.id, 'answer': str(self.option.id)}]}
+
+    def test_retry_replays_first_result_without_regrading(self):
+        first = self.client.post(self.url, self.body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.json()['score'], 100.0)
+        with self.assertNumQueries(1):
+            retry = self.client.post(self.url, self.body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ExamResultSummary.objects.get(exam=self.exam).attempt_count, 1)
+
+    def test_key_reused_for_other_body_is_rejected(self):
+        self.client.post(self.url, self.body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(self.url, {'answers': []}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 422)
+
+
+class SubmitFreeTextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Geography', description='', creator=cls.teacher, duration_minutes=20)
+        cls.capital = Question.objects.create(exam=cls.exam, question_text='Capital of France?', question_type='short_answer')
+        cls.river = Question.objects.create(exam=cls.exam, question_text='Longest river?', question_type='short_answer', order=1)
+        AcceptedAnswer.objects.create(question=cls.capital, value='Paris')
+        cls.registration = ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def test_unmatched_answers_are_kept_for_review_and_regrade_the_registration(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.post(f'/api/exams/{self.exam.id}/submit/', {'answers': [
+            {'question_id': self.capital.id, 'answer': 'paris'},
+            {'question_id': self.river.id, 'answer': 'The Nile'},
+        ]}, format='json')
+        self.assertEqual(response.json()['score'], 50.0)
+        review = ManualReview.objects.get()
+        self.assertEqual((review.answer.question, review.answer.answer_text), (self.river, 'The Nile'))
+
+        client.force_authenticate(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/submissions/reviews/{review.id}/resolve/', {'is_correct': True}, format='json')
+        self.registration.refresh_from_db()
+        self.assertEqual((self.registration.score, self.registration.is_passed), (100.0, True))
+        self.assertEqual(ExamResultSummary.objects.get(exam=self.exam).total_score, 100.0)
+
+    def test_score_is_weighted_by_points_so_a_rejected_review_keeps_it(self):
+        Question.objects.filter(pk=self.river.pk).update(points=9)
+        invalidate_paper_cache(self.exam.id)
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.post(f'/api/exams/{self.exam.id}/submit/', {'answers': [
+            {'question_id': self.capital.id, 'answer': 'Paris'},
+            {'question_id': self.river.id, 'answer': 'The Amazon'},
+        ]}, format='json')
+        self.assertEqual(response.json()['score'], 10.0)
+
+        client.force_authenticate(self.teacher)
+        review = ManualReview.objects.get()
+        client.post(f'/api/submissions/reviews/{review.id}/resolve/', {'is_correct': False}, format='json')
+        self.registration.refresh_from_db()
+        self.assertEqual((self.registration.score, self.registration.is_passed), (10.0, False))
+        self.assertEqual(ExamAttempt.objects.get(exam=self.exam).score, 10.0)
+
+
+class QuestionOrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Ordered', description='', creator=cls.teacher, duration_minutes=30)
+        cls.questions = [
+            Question.objects.create(exam=cls.exam, question_text=f'Q{i}', question_type='short_answer', order=i * POSITION_GAP)
+            for i in range(1, 6)
+        ]
+        cls.ids = [question.id for question in cls.questions]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = f'/api/exams/{self.exam.id}/questions/batch/'
+
+    def current_order(self):
+        return list(Question.objects.filter(exam=self.exam).order_by('order', 'id').values_list('id', flat=True))
+
+    def test_apply_moves(self):
+        a, b, c, d, e = self.ids
+        self.assertEqual(apply_moves(self.ids, [{'id': e, 'after': None}]), [e, a, b, c, d])
+        self.assertEqual(apply_moves(self.ids, [{'id': a, 'after': c}, {'id': d, 'after': a}]), [b, c, a, d, e])
+
+    def test_plan_positions_only_moves_what_it_has_to(self):
+        positions = {qid: i * POSITION_GAP for i, qid in enumerate(self.ids, start=1)}
+        changes = plan_positions(apply_moves(self.ids, [{'id': self.ids[0], 'after': self.ids[2]}]), positions)
+        self.assertEqual(list(changes), [self.ids[0]])
+        self.assertTrue(positions[self.ids[2]] < changes[self.ids[0]] < positions[self.ids[3]])
+
+    def test_moves_and_partial_order_through_the_endpoint(self):
+        a, b, c, d, e = self.ids
+        response = self.client.post(self.url, {'moves': [{'id': e, 'after': a}]}, format='json')
+        self.assertEqual(response.json()['reordered'], 1)
+        self.assertEqual(self.current_order(), [a, e, b, c, d])
+        self.client.post(self.url, {'order': [d, a]}, format='json')
+        self.assertEqual(self.current_order(), [d, e, b, c, a])
+
+    def test_invalid_reorders_are_rejected(self):
+        other = Exam.objects.create(title='Other', description='', creator=self.teacher, duration_minutes=30)
+        stranger = Question.objects.create(exam=other, question_text='X', question_type='short_answer')
+        a = self.ids[0]
+        for body, field in [
+            ({'moves': [{'id': a, 'after': a}]}, 'moves'),
+            ({'moves': [{'id': a, 'after': stranger.id}]}, 'moves'),
+            ({'order': [a, stranger.id]}, 'order'),
+            ({'order': [a, a]}, 'order'),
+        ]:
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn(field, response.json())
+        self.assertEqual(self.current_order(), self.ids)
+
+    def test_empty_order_changes_nothing(self):
+        response = self.client.post(self.url, {'order': []}, format='json')
+        self.assertEqual(response.json()['reordered'], 0)
+        self.assertEqual(self.current_order(), self.ids)
+
+
+class ExamCloneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+
+    def make_exam(self, questions):
+        exam = Exam.objects.create(
+            title='Original', description='', creator=self.teacher, duration_minutes=30, capacity=40,
+        )
+        for i in range(questions):
+            question = Question.objects.create(exam=exam, question_text=f'Q{i}', question_type='short_answer', order=i)
+            AcceptedAnswer.objects.create(question=question, rule_type='numeric', value=str(i), tolerance=0.5)
+            choice = Question.objects.create(exam=exam, question_text=f'C{i}', question_type='multiple_choice', order=i)
+            Option.objects.create(question=choice, option_text='Yes', is_correct=True)
+            Option.objects.create(question=choice, option_text='No', order=1)
+        return exam
+
+    def test_clone_copies_content_in_constant_queries(self):
+        queries = []
+        for size in (1, 10):
+            exam = self.make_exam(size)
+            with CaptureQueriesContext(connection) as captured:
+                copy = clone_exam(exam)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+        self.assertEqual((copy.title, copy.capacity), ('Original (copy)', 40))
+        self.assertEqual(copy.questions.count(), 20)
+        self.assertEqual(Option.objects.filter(question__exam=copy, is_correct=True).count(), 10)
+        self.assertEqual(
+            sorted(AcceptedAnswer.objects.filter(question__exam=copy).values_list('question__question_text', 'value')),
+            sorted((f'Q{i}', str(i)) for i in range(10)),
+        )
+        self.assertEqual(sum(ExamSeatCounter.objects.filter(exam=copy).values_list('seats', flat=True)), 40)
+
+
+class ResultExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Export', description='', creator=cls.teacher, duration_minutes=30)
+        cls.question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='short_answer')
+        cls.registered = User.objects.create_user('registered', 'registered@example.com', role='student')
+        cls.attempted = User.objects.create_user('attempted', 'attempted@example.com', role='student')
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.registered, score=75, is_passed=True)
+        attempt = ExamAttempt.objects.create(exam=cls.exam, student=cls.attempted, score=40, is_submitted=True)
+        Answer.objects.create(attempt=attempt, question=cls.question, answer_text='Paris, France', is_correct=True)
+
+    def export(self, export_format, **params):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.get(f'/api/exams/{self.exam.id}/export/{export_format}/', params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_rows_merge_registrations_attempts_and_answers(self):
+        response, content = self.export('csv', answers='1')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = {row['username']: row for row in csv.DictReader(io.StringIO(content.decode()))}
+        self.assertEqual(set(rows), {'registered', 'attempted'})
+        self.assertEqual((rows['registered']['registration_score'], rows['registered']['attempt_id']), ('75.0', ''))
+        answer = f'q{self.question.id}_answer'
+        self.assertEqual((rows['attempted']['attempt_score'], rows['attempted'][answer]), ('40.0', 'Paris, France'))
+        self.assertEqual(rows['attempted'][f'q{self.question.id}_correct'], 'True')
+
+    def test_jsonl_and_gzip(self):
+        _, content = self.export('jsonl')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['registered', 'attempted'])
+        _, compressed = self.export('jsonl', gzip='1')
+        self.assertEqual(gzip.decompress(compressed), content)
+
+    def test_header_is_sent_before_any_row_is_read(self):
+        chunks = iter_export(self.exam, 'csv', include_answers=True)
+        with self.assertNumQueries(1):
+            header = next(chunks)
+        self.assertTrue(header.startswith(b'student_id,username,email'))
+        self.assertEqual(len(list(chunks)), 2)
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Old', description='', creator=cls.teacher, duration_minutes=20)
+        question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='short_answer')
+        registration = ExamRegistration.objects.create(exam=cls.exam, student=cls.student, score=75.0)
+        cls.registered_at = timezone.now() - timedelta(days=400)
+        ExamRegistration.objects.filter(pk=registration.pk).update(registered_at=cls.registered_at)
+        attempt = ExamAttempt.objects.create(student=cls.student, exam=cls.exam, is_submitted=True, score=75.0)
+        Answer.objects.create(attempt=attempt, question=question, answer_text='forty two')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(EXAM_ARCHIVE_DIR=directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_archive_serve_and_restore(self):
+        archived = archive_exam(self.exam)
+        self.assertEqual((archived.registration_count, archived.attempt_count, archived.answer_count), (1, 1, 1))
+        self.assertFalse(Answer.objects.exists())
+        self.assertFalse(ExamRegistration.objects.filter(exam=self.exam).exists())
+
+        client = APIClient()
+        client.force_authenticate(self.student)
+        data = client.get(f'/api/exams/{self.exam.id}/archive/registrations/').json()
+        self.assertEqual(data['results'][0]['score'], 75.0)
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/archive/answers/').status_code, 403)
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/archive/').status_code, 403)
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/archive/').json()['answers'], 1)
+        data = client.get(f'/api/exams/{self.exam.id}/archive/answers/').json()
+        self.assertEqual(data['results'][0]['answer_text'], 'forty two')
+
+        restore_exam(ArchivedExam.objects.get(exam=self.exam))
+        self.assertEqual(Answer.objects.get().answer_text, 'forty two')
+        self.assertEqual(ExamRegistration.objects.get(exam=self.exam).registered_at, self.registered_at)
+
+
+class RequestProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', role='admin')
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_admin_header_stores_profile(self):
+        self.authenticate(self.admin)
+        response = self.client.get('/api/exams/', HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+
+        profiles = self.client.get('/api/profiling/', {'url_name': 'exam-list'}).json()
+        self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+        profile = self.client.get(f'/api/profiling/{profile_id}/').json()
+        self.assertEqual(profile['trigger'], 'header')
+        self.assertGreater(profile['sql_count'], 0)
+        self.assertTrue(profile['top_functions'])
+
+    def test_header_from_non_admin_is_ignored(self):
+        self.authenticate(self.teacher)
+        response = self.client.get('/api/exams/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/api/profiling/').status_code, 403)
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        self.settings_override = override_settings(OPENAPI_SCHEMA_DIR=tempfile.mkdtemp())
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        schema._loaded.clear()
+
+    def test_schema_is_generated_once_and_served_from_disk(self):
+        response = self.client.get('/api/schema/', {'format': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertIn('/api/exams/', json.loads(response.content)['paths'])
+        self.assertTrue(schema.schema_path('json').exists())
+
+        with mock.patch.object(schema, 'build_schema') as build:
+            schema._loaded.clear()
+            self.assertTrue(self.client.get('/api/schema/').content.startswith(b'openapi:'))
+            build.assert_not_called()
+
+        response = self.client.get('/api/schema/', HTTP_IF_NONE_MATCH=response['ETag'], HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 304)
+
+
+class SharedMemoryCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.location = os.path.join(directory, 'artifacts')
+        self.cache = SharedMemoryCache(self.location, {'OPTIONS': {'MAX_SIZE': 64 * 1024, 'SLOTS': 256}})
+
+    def test_basic_operations(self):
+        self.cache.set('paper', {'questions': [1, 2]})
+        self.assertEqual(self.cache.get('paper'), {'questions': [1, 2]})
+        self.assertFalse(self.cache.add('paper', 'other'))
+        self.cache.set('count', 1)
+        self.assertEqual(self.cache.incr('count', 2), 3)
+        self.assertTrue(self.cache.delete('paper'))
+        self.assertIsNone(self.cache.get('paper'))
+        self.cache.set('gone', 1, 0)
+        self.assertIsNone(self.cache.get('gone'))
+
+    def test_oldest_entries_are_evicted_when_full(self):
+        for i in range(100):
+            self.cache.set(f'artifact:{i}', bytes(1024))
+        self.assertIsNone(self.cache.get('artifact:0'))
+        self.assertEqual(self.cache.get('artifact:99'), bytes(1024))
+        self.assertEqual(self.cache.set_many({'too-big': bytes(32 * 1024)}), ['too-big'])
+
+    @skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_entries_are_shared_with_other_processes(self):
+        self.cache.set('counter', 0)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                other = SharedMemoryCache(self.location, {'OPTIONS': {'MAX_SIZE': 64 * 1024, 'SLOTS': 256}})
+                other.incr('counter')
+                other.set('from-child', 'hello')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.cache.get('counter'), 1)
+        self.assertEqual(self.cache.get('from-child'), 'hello')
+
+
+def worker_caches(name):
+    """Settings for one worker: a private default cache, the artifact cache shared by all."""
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name},
+        'exam_artifacts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-artifacts'},
+    }
+
+
+class ExamSectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', role='teacher')
+        cls.other = User.objects.create_user('other', role='teacher')
+        cls.exam = Exam.objects.create(title='Sections', description='', creator=cls.owner, duration_minutes=30)
+
+    def test_only_the_owner_manages_sections(self):
+        client = APIClient()
+        url = f'/api/exams/{self.exam.id}/sections/'
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get(url).status_code, 403)
+        self.assertEqual(client.post(url, {'title': 'Part A'}, format='json').status_code, 403)
+        client.force_authenticate(self.owner)
+        self.assertEqual(client.post(url, {'title': 'Part A'}, format='json').status_code, 201)
+        self.assertEqual(client.get(url).status_code, 200)
+
+
+class PersonalPaperTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(
+            title='Pooled', description='', creator=cls.teacher, duration_minutes=30,
+            paper_mode='pooled', shuffle_options=True,
+        )
+        section = ExamSection.objects.create(exam=cls.exam, title='Pool', draw_count=3)
+        for i in range(8):
+            question = Question.objects.create(
+                exam=cls.exam, section=section, question_text=f'Q{i}', question_type='multiple_choice', order=i
+            )
+            for j in range(4):
+                Option.objects.create(question=question, option_text=f'Q{i} option {j}', is_correct=j == 0, order=j)
+        cls.students = [User.objects.create_user(f'student{i}', role='student') for i in range(5)]
+        for student in cls.students:
+            ExamRegistration.objects.create(exam=cls.exam, student=student)
+
+    def paper(self, student):
+        client = APIClient()
+        client.force_authenticate(student)
+        return client.get(f'/api/exams/{self.exam.id}/take/').json()
+
+    def test_each_student_always_gets_the_same_paper(self):
+        first = self.paper(self.students[0])
+        self.assertEqual(len(first['questions']), 3)
+        caches['exam_artifacts'].clear()
+        self.assertEqual(self.paper(self.students[0]), first)
+        papers = {
+            tuple(option['option_text'] for question in self.paper(student)['questions'] for option in question['options'])
+            for student in self.students
+        }
+        self.assertGreater(len(papers), 1)
+
+    def test_submitted_choices_are_positions_on_the_served_paper(self):
+        right, wrong, skipped = self.paper(self.students[1])['questions']
+        texts = [[option['option_text'] for option in question['options']] for question in (right, wrong)]
+        right_choice = next(i for i, text in enumerate(texts[0]) if text.endswith('option 0'))
+        wrong_choice = next(i for i, text in enumerate(texts[1]) if not text.endswith('option 0'))
+        client = APIClient()
+        client.force_authenticate(self.students[1])
+        response = client.post(f'/api/exams/{self.exam.id}/submit/', {'answers': [
+            {'question_id': right['id'], 'answer': right_choice},
+            {'question_id': wrong['id'], 'answer': wrong_choice},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['score'], 100 / 3)
+        stored = dict(Answer.objects.filter(attempt__student=self.students[1]).values_list('question_id', 'answer_text'))
+        self.assertEqual(stored, {
+            right['id']: texts[0][right_choice], wrong['id']: texts[1][wrong_choice], skipped['id']: '',
+        })
+
+    def test_editing_the_question_bank_changes_the_paper(self):
+        served = self.paper(self.students[0])['questions'][0]
+        question = Question.objects.get(pk=served['id'])
+        question.question_text = 'Reworded'
+        question.save()
+        self.assertEqual(self.paper(self.students[0])['questions'][0]['question_text'], 'Reworded')
+        Option.objects.create(question=question, option_text='Added', order=4)
+        options = self.paper(self.students[0])['questions'][0]['options']
+        self.assertIn('Added', [option['option_text'] for option in options])
+
+
+class PaperVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Versioned', description='', creator=cls.teacher, duration_minutes=30)
+        cls.question = Question.objects.create(exam=cls.exam, question_text='Old', question_type='short_answer')
+
+    def fragment_texts(self):
+        return [question['question_text'] for question in get_question_fragments(self.exam.id)['questions']]
+
+    def test_workers_share_fragments_and_see_each_others_invalidation(self):
+        with override_settings(CACHES=worker_caches('worker-a')):
+            self.assertEqual(self.fragment_texts(), ['Old'])
+        with override_settings(CACHES=worker_caches('worker-b')):
+            # Same version, so worker B reuses worker A's copy
+            with self.assertNumQueries(1):
+                self.assertEqual(self.fragment_texts(), ['Old'])
+            self.question.question_text = 'New'
+            self.question.save()
+        with override_settings(CACHES=worker_caches('worker-a')):
+            self.assertEqual(self.fragment_texts(), ['New'])
+
+
+class OfflineExamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Offline', description='', creator=cls.teacher, duration_minutes=30)
+        cls.question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        cls.right = Option.objects.create(question=cls.question, option_text='Right', is_correct=True, order=1)
+        cls.wrong = Option.objects.create(question=cls.question, option_text='Wrong', order=2)
+        cls.students = [User.objects.create_user(f'student{i}', role='student') for i in range(3)]
+        cls.registrations = [ExamRegistration.objects.create(exam=cls.exam, student=s) for s in cls.students]
+
+    def sheet_for(self, student, option, minutes=20):
+        client = APIClient()
+        client.force_authenticate(student)
+        bundle = load_bundle(client.get(f'/api/exams/{self.exam.id}/offline-bundle/').json()['bundle'])
+        self.assertNotIn('is_correct', bundle['paper']['questions'][0]['options'][0])
+        started_at = bundle['issued_at']
+        return sign_sheet(bundle['sheet_key'], {
+            'registration': bundle['registration'], 'issued_at': bundle['issued_at'],
+            'started_at': started_at, 'submitted_at': started_at + minutes * 60,
+            'answers': [{'question_id': self.question.id, 'answer': str(option.id)}],
+        })
+
+    def test_student_uploads_signed_sheet_once(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        sheet = self.sheet_for(self.students[0], self.right, minutes=0)
+        url = f'/api/exams/{self.exam.id}/offline-answers/'
+        response = client.post(url, {'sheet': sheet}, format='json')
+        self.assertEqual(response.json()['graded'][0]['score'], 100.0)
+        self.assertEqual(client.post(url, {'sheet': sheet}, format='json').status_code, 400)
+        self.assertEqual(ExamResultSummary.objects.get(exam=self.exam).attempt_count, 1)
+
+    def test_center_archive_is_graded_in_bulk(self):
+        tampered = self.sheet_for(self.students[1], self.wrong, minutes=0)
+        payload, signature = tampered.split(':')
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as bundle:
+            bundle.writestr('a.sheet', self.sheet_for(self.students[0], self.wrong, minutes=0))
+            bundle.writestr('b.sheet', f'{payload}:{"0" * len(signature)}')
+        archive.seek(0)
+        archive.name = 'center.zip'
+
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        report = client.post(f'/api/exams/{self.exam.id}/offline-answers/archive/', {'file': archive}).json()
+        self.assertEqual([row['sheet'] for row in report['graded']], ['a.sheet'])
+        self.assertEqual(
+            {row['sheet']: row['error'] for row in report['rejected']},
+            {'b.sheet': 'Invalid answer sheet signature.'},
+        )
+        self.registrations[0].refresh_from_db()
+        self.assertEqual((self.registrations[0].score, self.registrations[0].is_passed), (0.0, False))
+
+    def test_sheet_over_time_limit_is_rejected(self):
+        late = self.sheet_for(self.students[2], self.right, minutes=45)
+        report = ingest_sheets(self.exam, [('late.sheet', late)], now=timezone.now() + timedelta(hours=1))
+        self.assertEqual(report['rejected'], [{'sheet': 'late.sheet', 'error': 'Time limit for this exam was exceeded.'}])
+        self.assertIsNone(ExamRegistration.objects.get(pk=self.registrations[2].pk).completed_at)
+
+    def test_refetching_a_bundle_does_not_restart_the_clock(self):
+        self.sheet_for(self.students[1], self.right)
+        registration = ExamRegistration.objects.get(pk=self.registrations[1].pk)
+        self.assertIsNotNone(registration.started_at)
+        later = timezone.now() + timedelta(minutes=25)
+        bundle = load_bundle(build_bundle(self.exam, registration, later))
+        sheet = sign_sheet(bundle['sheet_key'], {
+            'registration': registration.id, 'issued_at': bundle['issued_at'],
+            'started_at': bundle['issued_at'], 'submitted_at': bundle['issued_at'] + 20 * 60,
+            'answers': [{'question_id': self.question.id, 'answer': str(self.right.id)}],
+        })
+        report = ingest_sheets(self.exam, [('again.sheet', sheet)], now=later + timedelta(minutes=20))
+        self.assertEqual(report['rejected'], [{'sheet': 'again.sheet', 'error': 'Time limit for this exam was exceeded.'}])
+
+    def test_sweeper_waits_for_sheets_of_issued_bundles(self):
+        sheet = self.sheet_for(self.students[0], self.right)
+        self.sheet_for(self.students[1], self.right)
+        after_deadline = timezone.now() + timedelta(hours=1)
+        self.assertEqual(close_expired_registrations(now=after_deadline), 0)
+
+        report = ingest_sheets(self.exam, [('late-upload.sheet', sheet)], now=after_deadline)
+        self.assertEqual(report['graded'][0]['score'], 100.0)
+        self.assertEqual(close_expired_registrations(now=after_deadline + OFFLINE_UPLOAD_WINDOW), 1)
+        self.assertEqual(ExamRegistration.objects.get(pk=self.registrations[1].pk).score, 0)
+
+    def test_center_archive_starts_every_pending_clock(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/offline-bundles/').status_code, 200)
+        self.assertFalse(ExamRegistration.objects.filter(exam=self.exam, started_at__isnull=True).exists())
+
+
+class OMRIngestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Paper', description='', creator=cls.teacher, duration_minutes=30)
+        cls.single = Question.objects.create(exam=cls.exam, question_text='One', question_type='multiple_choice', order=1)
+        Option.objects.create(question=cls.single, option_text='Right', is_correct=True, order=1)
+        Option.objects.create(question=cls.single, option_text='Wrong', order=2)
+        cls.select = Question.objects.create(exam=cls.exam, question_text='Two', question_type='multiple_select', order=2)
+        Option.objects.create(question=cls.select, option_text='Red', is_correct=True, order=1)
+        Option.objects.create(question=cls.select, option_text='Blue', order=2)
+        Option.objects.create(question=cls.select, option_text='Green', is_correct=True, order=3)
+        for name in ('ann', 'bob', 'cat', 'dan', 'eve'):
+            student = User.objects.create_user(name, role='student')
+            if name != 'eve':
+                ExamRegistration.objects.create(exam=cls.exam, student=student)
+
+    def upload(self, content, **data):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        upload = io.BytesIO(content.encode())
+        upload.name = 'scan.csv'
+        return client.post(f'/api/exams/{self.exam.id}/omr-results/', {'file': upload, **data})
+
+    def test_sheets_are_graded_and_reconciled(self):
+        response = self.upload(
+            'student,question,marked\n'
+            'ann,1,A\nann,2,A C\n'
+            'bob,1,B\nbob,2,\n'
+            'cat,1,D\n'
+            'eve,1,A\n'
+            'nobody,1,A\n'
+            'ann,1,A\n'
+        )
+        report = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((report['rows'], report['sheets'], report['graded']), (8, 6, 2))
+        self.assertEqual(report['absent'], ['dan'])
+        self.assertEqual(report['mean_score'], 50.0)
+        self.assertEqual(sorted((row['line'], row['student'], row['error']) for row in report['rejected']), [
+            (6, 'cat', 'Question 1 has no option D.'),
+            (7, 'eve', 'Student is not registered for this exam.'),
+            (8, 'nobody', 'Unknown student.'),
+            (9, 'ann', 'Rows for this student are not consecutive.'),
+        ])
+
+        ann = ExamRegistration.objects.get(exam=self.exam, student__username='ann')
+        self.assertEqual((ann.score, ann.is_passed), (100.0, True))
+        self.assertIsNotNone(ann.completed_at)
+        attempt = ExamAttempt.objects.get(exam=self.exam, student__username='ann')
+        self.assertEqual(
+            sorted(attempt.answers.values_list('answer_text', 'is_correct')), [('Red,Green', True), ('Right', True)]
+        )
+        bob = ExamAttempt.objects.get(exam=self.exam, student__username='bob')
+        self.assertEqual((bob.score, bob.passed, bob.answers.count()), (0.0, False, 1))
+        self.assertEqual(ExamResultSummary.objects.get(exam=self.exam).attempt_count, 2)
+
+        report = self.upload('student,question,marked\nann,1,A\neve,1,A\n', register_missing='true').json()
+        self.assertEqual((report['graded'], report['registered']), (1, 1))
+        self.assertEqual(report['rejected'][0]['error'], "This student's exam has already been graded.")
+
+    def test_registering_missing_students_takes_seats(self):
+        Exam.objects.filter(pk=self.exam.pk).update(capacity=4)
+        self.exam.refresh_from_db()
+        sync_seat_counters(self.exam)
+        report = self.upload('student,question,marked\neve,1,A\n', register_missing='true').json()
+        self.assertEqual(report['rejected'], [{'student': 'eve', 'line': 2, 'error': 'Exam is full.'}])
+        self.assertFalse(ExamRegistration.objects.filter(exam=self.exam, student__username='eve').exists())
+
+        Exam.objects.filter(pk=self.exam.pk).update(capacity=5)
+        self.exam.refresh_from_db()
+        sync_seat_counters(self.exam)
+        report = self.upload('student,question,marked\neve,1,A\n', register_missing='true').json()
+        self.assertEqual((report['graded'], report['registered']), (1, 1))
+        self.assertEqual(sum(ExamSeatCounter.objects.filter(exam=self.exam).values_list('taken', flat=True)), 5)
+
+    def test_rejects_files_without_the_columns(self):
+        self.assertEqual(self.upload('name,score\nann,10\n').status_code, 400)
+
+
+@mock.patch('exams.capacity.STRIPES', 3)
+class ExamCapacityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Seats', description='', creator=cls.teacher, duration_minutes=30)
+        cls.students = [User.objects.create_user(f'student{i}', role='student') for i in range(5)]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def register(self, student):
+        return self.client_for(student).post(f'/api/exams/{self.exam.id}/register/')
+
+    def test_full_exam_waitlists_and_promotes_in_order(self):
+        ExamRegistration.objects.create(exam=self.exam, student=self.students[0])
+        response = self.client_for(self.teacher).patch(f'/api/exams/{self.exam.id}/', {'capacity': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(ExamSeatCounter.objects.filter(exam=self.exam).values_list('seats', flat=True)), 2)
+
+        self.assertEqual(self.register(self.students[1]).status_code, 201)
+        self.assertEqual(self.register(self.students[2]).json(), {'waitlisted': True, 'position': 1})
+        self.assertEqual(self.register(self.students[3]).json(), {'waitlisted': True, 'position': 2})
+        self.assertEqual(self.register(self.students[1]).status_code, 400)
+
+        # A freed seat goes to the head of the waitlist
+        self.assertEqual(self.client_for(self.students[1]).delete(f'/api/exams/{self.exam.id}/register/').status_code, 204)
+        registered = set(ExamRegistration.objects.filter(exam=self.exam).values_list('student_id', flat=True))
+        self.assertEqual(registered, {self.students[0].id, self.students[2].id})
+
+        # Raising the capacity promotes the rest
+        self.client_for(self.teacher).patch(f'/api/exams/{self.exam.id}/', {'capacity': 4}, format='json')
+        self.assertEqual(ExamRegistration.objects.filter(exam=self.exam).count(), 3)
+        self.assertFalse(ExamWaitlistEntry.objects.filter(exam=self.exam).exists())
+        self.assertEqual(self.register(self.students[4]).status_code, 201)
+        self.assertEqual(self.register(self.teacher).status_code, 202)
+        counters = ExamSeatCounter.objects.filter(exam=self.exam)
+        self.assertEqual(sum(counter.taken for counter in counters), 4)
+        self.assertTrue(all(counter.taken <= counter.seats for counter in counters))
+
+
+class ExamCapacityLoadTests(TransactionTestCase):
+    """Many students register at once for a handful of seats; no seat may be sold twice."""
+    STUDENTS = 60
+    CAPACITY = 7
+
+    def test_concurrent_registrations_never_overbook(self):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        exam = Exam.objects.create(
+            title='Rush', description='', creator=teacher, duration_minutes=30, capacity=self.CAPACITY
+        )
+        students = User.objects.bulk_create([User(username=f'rush{i}', role='student') for i in range(self.STUDENTS)])
+        sync_seat_counters(exam)
+        url = f'/api/exams/{exam.id}/register/'
+        start = threading.Barrier(8)
+
+        def register(student):
+            client = APIClient()
+            client.force_authenticate(student)
+            try:
+                start.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+            try:
+                while True:
+                    try:
+                        return client.post(url).status_code
+                    except OperationalError:
+                        # sqlite's shared-cache table lock: roll back and retry, as a client would
+                        connections.close_all()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = list(pool.map(register, students))
+
+        # A retry after a lock error may find the first try already went through
+        self.assertTrue(set(codes) <= {201, 202, 400})
+        registered = set(ExamRegistration.objects.filter(exam=exam).values_list('student_id', flat=True))
+        waiting = set(ExamWaitlistEntry.objects.filter(exam=exam).values_list('student_id', flat=True))
+        self.assertEqual(len(registered), self.CAPACITY)
+        self.assertEqual(registered | waiting, {student.id for student in students})
+        self.assertFalse(registered & waiting)
+        self.assertEqual(sum(ExamSeatCounter.objects.filter(exam=exam).values_list('taken', flat=True)), self.CAPACITY)
+
+
+class ExamActivityLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Watched', description='', creator=cls.teacher, duration_minutes=30)
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def setUp(self):
+        # A buffer of its own, so events other tests left buffered stay out
+        patcher = mock.patch.object(activity, 'buffer', activity.ActivityBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_events_are_buffered_then_served_in_order(self):
+        student = self.client_for(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(student.get(f'/api/exams/{self.exam.id}/take/').status_code, 200)
+        started = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = student.post(f'/api/exams/{self.exam.id}/activity/', {'events': [
+                {'kind': 'focus_regained', 'occurred_at': (started + timedelta(seconds=20)).isoformat()},
+                {'kind': 'focus_lost', 'occurred_at': int((started + timedelta(seconds=10)).timestamp() * 1000)},
+                {'kind': 'submitted', 'occurred_at': started.isoformat()},
+                {'kind': 'answer_changed', 'occurred_at': (started + timedelta(hours=1)).isoformat()},
+                {'kind': 'answer_changed', 'occurred_at': started.isoformat(), 'data': {'question': 3}},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 3)
+        self.assertEqual([row['index'] for row in response.json()['rejected']], [2, 3])
+        self.assertFalse(ExamActivityEvent.objects.exists())
+
+        url = f'/api/exams/{self.exam.id}/activity/{self.student.id}/'
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client_for(self.teacher).get(url, {'limit': 3}).json()
+        self.assertEqual(sum('INSERT' in query['sql'] for query in queries), 1)
+        self.assertEqual(
+            [event['kind'] for event in page['events']], ['paper_fetched', 'answer_changed', 'focus_lost']
+        )
+        self.assertEqual(page['events'][1]['data'], {'question': 3})
+        rest = self.client_for(self.student).get(url, {'after': page['next']}).json()
+        self.assertEqual([event['kind'] for event in rest['events']], ['focus_regained'])
+        self.assertIsNone(rest['next'])
+
+    def test_only_registered_students_record_and_only_staff_read_others(self):
+        other = User.objects.create_user('other', role='student')
+        events = {'events': [{'kind': 'focus_lost', 'occurred_at': timezone.now().isoformat()}]}
+        response = self.client_for(other).post(f'/api/exams/{self.exam.id}/activity/', events, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client_for(other).get(f'/api/exams/{self.exam.id}/activity/{self.student.id}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_prune_drops_old_partitions(self):
+        now = timezone.now()
+        ExamActivityEvent.objects.bulk_create([
+            ExamActivityEvent(exam=self.exam, student=self.student, kind='focus_lost', occurred_at=when,
+                              recorded_at=when, day=when.date())
+            for when in (now - timedelta(days=400), now - timedelta(days=399), now)
+        ])
+        call_command('prune_exam_activity', '--older-than-days', '365', stdout=io.StringIO())
+        self.assertEqual(list(ExamActivityEvent.objects.values_list('day', flat=True)), [now.date()])
@@ -8,12 +8,29 @@ urlpatterns = [
     path('my-registrations/', views.UserExamRegistrationsView.as_view(), name='my-exam-registrations'),
     path('<int:exam_id>/take/', views.TakeExamView.as_view(), name='take-exam'),
     path('<int:exam_id>/submit/', views.submit_exam, name='submit-exam'),
+    path('<int:exam_id>/offline-bundle/', views.offline_bundle, name='offline-bundle'),
+    path('<int:exam_id>/offline-bundles/', views.offline_bundle_archive, name='offline-bundle-archive'),
+    path('<int:exam_id>/offline-answers/', views.upload_offline_answers, name='offline-answers'),
+    path('<int:exam_id>/offline-answers/archive/', views.upload_offline_answer_archive, name='offline-answer-archive'),
+    path('<int:exam_id>/omr-results/', views.upload_omr_results, name='omr-results'),
+    path('<int:exam_id>/activity/', views.record_activity, name='exam-activity'),
+    path('<int:exam_id>/activity/<int:student_id>/', views.activity_timeline, name='exam-activity-timeline'),
     
     
+    # Section management URLs
+    path('<int:exam_id>/sections/', views.ExamSectionListView.as_view(), name='section-list'),
+
     # Question management URLs
     path('<int:exam_id>/questions/', views.QuestionListView.as_view(), name='question-list'),
+    path('<int:exam_id>/questions/batch/', views.batch_update_questions, name='question-batch-update'),
     path('<int:exam_id>/questions/<int:question_id>/', views.QuestionDetailView.as_view(), name='question-detail'),
     path('<int:exam_id>/questions/<int:question_id>/options/', views.OptionListView.as_view(), name='option-list'),
     path('<int:exam_id>/questions/<int:question_id>/options/<int:option_id>/', views.OptionDetailView.as_view(), name='option-detail'),
+    path('<int:exam_id>/questions/<int:question_id>/accepted-answers/', views.AcceptedAnswerListView.as_view(), name='accepted-answer-list'),
+    path('<int:exam_id>/questions/<int:question_id>/accepted-answers/<int:answer_id>/', views.AcceptedAnswerDetailView.as_view(), name='accepted-answer-detail'),
     path('<int:exam_id>/bulk-import-questions/', views.bulk_import_questions, name='bulk-import-questions'),
+    path('<int:exam_id>/clone/', views.clone_exam_view, name='clone-exam'),
+    path('<int:exam_id>/archive/', views.archived_exam_summary, name='archived-exam-summary'),
+    path('<int:exam_id>/archive/<str:table>/', views.archived_exam_rows, name='archived-exam-rows'),
+    path('<int:exam_id>/export/<str:export_format>/', views.export_exam_results, name='export-exam-results'),
 ]
\ No newline at end of file
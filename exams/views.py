@@ -1,17 +1,44 @@
-from rest_framework import generics, permissions, status
+import io
+
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from .models import Exam, Question, Option, ExamRegistration
-from django.db import transaction
+from .models import Exam, ExamSection, Question, Option, AcceptedAnswer, ExamRegistration, ArchivedExam, ExamActivityEvent
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.http import HttpResponse, StreamingHttpResponse
 from .serializers import (
     ExamSerializer, ExamListSerializer,
     ExamRegistrationSerializer, ExamTakeSerializer,
-    QuestionSerializer, OptionSerializer
+    QuestionSerializer, OptionSerializer, ExamSectionSerializer,
+    ExamCloneSerializer, QuestionBatchSerializer, AcceptedAnswerSerializer
+)
+from . import activity
+from .capacity import cancel_registration, promote_waitlist, register_student, sync_seat_counters, waitlist_position
+from .cloning import clone_exam
+from .fast_serializers import (
+    EXAM_FIELDS, EXAM_EXPANDABLE, REGISTRATION_FIELDS,
+    exam_payload, format_datetime, registration_rows, registration_payload
 )
+from backend.fieldsets import parse_fieldset
+from backend.renderers import FAST_RENDERER_CLASSES
+from .exports import EXPORT_FORMATS, iter_export
+from .archive import ARCHIVE_TABLES, ArchiveError, iter_archived_rows, load_manifest
+from .papers import build_paper, get_question_fragments, mark_answers, render_paper, invalidate_paper_cache
+from .ordering import apply_moves, plan_positions
+from .deadlines import is_late, start_registration, start_registrations
+from .offline import SheetError, build_bundle, bundle_archive, ingest_sheets, mark_issued, read_sheet_archive
+from .omr import OMRError, ingest_omr_csv
+from .grading import FREE_TEXT_TYPES, get_answer_key
+from submissions.grading import save_submitted_paper
+from submissions.models import ExamAttempt, record_graded_result
+from submissions.idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
 from users.models import User
 from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
 
 
 # --------------------
@@ -30,15 +57,37 @@ class IsTeacherOrAdmin(permissions.BasePermission):
         OpenApiParameter(name='difficulty', description='Filter by difficulty', required=False, type=str),
         OpenApiParameter(name='search', description='Search by title', required=False, type=str),
         OpenApiParameter(name='ordering', description='Order by field (- for descending)', required=False, type=str),
+        OpenApiParameter(name='fields', description='Comma-separated fields to return', required=False, type=str),
     ]
 )
 class ExamListView(generics.ListCreateAPIView):
     serializer_class = ExamListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = parse_fieldset(self.request, ExamListSerializer.Meta.fields)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == 'GET':
+            context['fieldset'] = self.get_fieldset()
+        return context
+
     def get_queryset(self):
         queryset = Exam.objects.filter(is_active=True)
 
+        # Only load what the requested fields need
+        fieldset = self.get_fieldset()
+        model_fields = [name for name in fieldset if name not in ('creator_name', 'question_count')]
+        if 'creator_name' in fieldset:
+            queryset = queryset.select_related('creator')
+            model_fields += ['creator', 'creator__first_name', 'creator__last_name']
+        queryset = queryset.only('id', *model_fields)
+        if 'question_count' in fieldset:
+            queryset = queryset.annotate(num_questions=Count('questions'))
+
         # Filter by difficulty
         difficulty = self.request.query_params.get('difficulty')
         if difficulty:
@@ -62,22 +111,44 @@ class ExamListView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
     def perform_create(self, serializer):
-        serializer.save(creator=self.request.user)
+        exam = serializer.save(creator=self.request.user)
+        if exam.capacity is not None:
+            sync_seat_counters(exam)
 
 
 # --------------------
 # Exam Detail
 # --------------------
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='fields', description='Comma-separated fields to return', required=False, type=str),
+        OpenApiParameter(name='expand', description='Related collections to embed (questions)', required=False, type=str),
+    ]
+)
 class ExamDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Exam.objects.all()
     serializer_class = ExamSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def retrieve(self, request, *args, **kwargs):
+        fieldset = parse_fieldset(request, EXAM_FIELDS, EXAM_EXPANDABLE)
+        exam = get_object_or_404(Exam.objects.only('id'), pk=self.kwargs['pk'])
+        self.check_object_permissions(request, exam)
+        return Response(exam_payload(exam.id, fieldset))
 
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             return [permissions.IsAuthenticated(), IsTeacherOrAdmin()]
         return [permissions.IsAuthenticated()]
 
+    def perform_update(self, serializer):
+        capacity = serializer.instance.capacity
+        exam = serializer.save()
+        if exam.capacity != capacity:
+            sync_seat_counters(exam)
+            promote_waitlist(exam)
+
 
 # --------------------
 # Exam Registration
@@ -104,15 +175,25 @@ class ExamRegistrationView(generics.CreateAPIView):
         if ExamRegistration.objects.filter(exam=exam, student=request.user).exists():
             return Response({"error": "Already registered for this exam."}, status=400)
 
-        # Create registration
-        registration = ExamRegistration.objects.create(
-            exam=exam,
-            student=request.user
-        )
+        try:
+            registration, waitlisted = register_student(exam, request.user)
+        except IntegrityError:
+            return Response({"error": "Already registered for this exam."}, status=400)
+        if registration is None:
+            return Response(
+                {"waitlisted": True, "position": waitlist_position(waitlisted)}, status=status.HTTP_202_ACCEPTED
+            )
 
         serializer = self.get_serializer(registration)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def delete(self, request, *args, **kwargs):
+        """Give up a registration before the exam is started, or leave the waitlist."""
+        exam = get_object_or_404(Exam, id=self.kwargs.get('exam_id'))
+        if not cancel_registration(exam, request.user):
+            return Response({"error": "No registration or waitlist entry that can be cancelled."}, status=400)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 # --------------------
 # User’s Exam Registrations
@@ -120,10 +201,19 @@ class ExamRegistrationView(generics.CreateAPIView):
 class UserExamRegistrationsView(generics.ListAPIView):
     serializer_class = ExamRegistrationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_queryset(self):
         return ExamRegistration.objects.filter(student=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        fieldset = parse_fieldset(request, REGISTRATION_FIELDS)
+        rows = registration_rows(self.get_queryset(), fieldset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response([registration_payload(row, fieldset) for row in page])
+        return Response([registration_payload(row, fieldset) for row in rows])
+
 
 # --------------------
 # Take Exam
@@ -131,6 +221,7 @@ class UserExamRegistrationsView(generics.ListAPIView):
 class TakeExamView(generics.RetrieveAPIView):
     serializer_class = ExamSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_object(self):
         exam_id = self.kwargs.get('exam_id')
@@ -142,22 +233,38 @@ class TakeExamView(generics.RetrieveAPIView):
         if exam.end_time and now > exam.end_time:
             self.permission_denied(self.request, message="Exam already ended.")
 
-        # Check if user is registered
-        get_object_or_404(
+        # Check if user is registered; the first load starts the clock
+        registration = get_object_or_404(
             ExamRegistration,
             exam=exam,
             student=self.request.user,
             completed_at__isnull=True
         )
+        start_registration(registration, exam, now)
+        if is_late(registration.deadline, now):
+            self.permission_denied(self.request, message="Time limit for this exam has passed.")
 
         return exam
 
+    def retrieve(self, request, *args, **kwargs):
+        exam = self.get_object()
+        activity.log_event(exam.id, request.user.id, ExamActivityEvent.PAPER_FETCHED)
+        if exam.is_randomized:
+            # Per-student paper assembled from the cached question bank
+            return Response(render_paper(exam, build_paper(exam, request.user.id)))
+        return Response(exam_payload(exam.id))
+
 
 # --------------------
 # Submit Exam
 # --------------------
+@extend_schema(
+    request=ExamTakeSerializer,
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
+)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent('submit-exam')
 def submit_exam(request, exam_id):
     exam = get_object_or_404(Exam, id=exam_id, is_active=True)
 
@@ -169,49 +276,47 @@ def submit_exam(request, exam_id):
         completed_at__isnull=True
     )
 
+    if is_late(registration.deadline):
+        return Response({"error": "Time limit for this exam has passed."}, status=status.HTTP_403_FORBIDDEN)
+
     serializer = ExamTakeSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=400)
 
     answers = serializer.validated_data['answers']
 
-    # Bulk fetch questions + options
-    questions = exam.questions.prefetch_related("options").all()
-    question_map = {q.id: q for q in questions}
-
-    total_questions = len(question_map)
-    correct_answers = 0
-
-    for answer in answers:
-        qid = answer.get('question_id')
-        user_answer = answer.get('answer')
-
-        question = question_map.get(qid)
-        if not question:
-            continue  # invalid question id ignored
-
-        if question.question_type == 'multiple_choice':
-            correct_option = question.options.filter(is_correct=True).first()
-            if correct_option and str(correct_option.id) == str(user_answer):
-                correct_answers += 1
-
-        elif question.question_type == 'multiple_select':
-            # For multiple correct answers
-            correct_set = set(map(str, question.options.filter(is_correct=True).values_list("id", flat=True)))
-            user_set = set(map(str, user_answer if isinstance(user_answer, list) else [user_answer]))
-            if correct_set == user_set:
-                correct_answers += 1
-
-        # TODO: handle other question types (text, numeric, etc.)
-
-    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+    if ExamAttempt.objects.filter(exam=exam, student=request.user).exists():
+        return Response({"error": "This exam has already been attempted."}, status=status.HTTP_409_CONFLICT)
+
+    answer_key = get_answer_key(exam.id)
+    if exam.is_randomized:
+        # Rebuild the student's paper from the same seed to map choices back
+        questions = build_paper(exam, request.user.id)
+    else:
+        questions = get_question_fragments(exam.id)['questions']
+    marked = mark_answers(questions, answers, answer_key, by_position=exam.is_randomized)
+    correct_answers = sum(is_correct for _, _, is_correct in marked)
+    total_questions = len(questions)
+
+    # Weighted by points, as ExamAttempt.calculate_score regrades the saved paper
+    total_points = sum(question['points'] for question in questions)
+    obtained_points = sum(question['points'] for question, _, is_correct in marked if is_correct)
+    score = (obtained_points / total_points) * 100 if total_points > 0 else 0
     is_passed = score >= exam.passing_score
 
-    # Update registration
-    registration.score = score
-    registration.is_passed = is_passed
-    registration.completed_at = timezone.now()
-    registration.save()
+    # Update registration, the answers and the denormalized result summaries together
+    # (the conditional update lets only one of several concurrent submits complete it)
+    with transaction.atomic():
+        now = timezone.now()
+        completed = ExamRegistration.objects.filter(pk=registration.pk, completed_at__isnull=True).update(
+            score=score, is_passed=is_passed, completed_at=now
+        )
+        if not completed:
+            return Response({"error": "This exam has already been submitted."}, status=status.HTTP_409_CONFLICT)
+        # Kept as an attempt so unmatched free text reaches the review queue
+        save_submitted_paper(exam, request.user, score, is_passed, marked, now)
+        record_graded_result(request.user, exam, score, is_passed)
+    activity.log_event(exam.id, request.user.id, ExamActivityEvent.SUBMITTED, score=score)
 
     return Response({
         "score": score,
@@ -221,6 +326,175 @@ def submit_exam(request, exam_id):
     })
 
 
+# --------------------
+# Activity Log
+# --------------------
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def record_activity(request, exam_id):
+    """
+    Batch of the exam client's events, ``{"events": [{"kind", "occurred_at",
+    "data"}, ...]}``. They are buffered and written in bulk, so they reach the
+    timeline shortly after the response.
+    """
+    events = request.data.get('events')
+    if not isinstance(events, list) or not events:
+        return Response({"error": "Send a non-empty list of 'events'."}, status=400)
+    if len(events) > activity.BATCH_LIMIT:
+        return Response({"error": f"At most {activity.BATCH_LIMIT} events per batch."}, status=400)
+    if not ExamRegistration.objects.filter(exam_id=exam_id, student=request.user).exists():
+        return Response({"error": "You are not registered for this exam."}, status=403)
+    accepted, rejected = activity.ingest_client_events(exam_id, request.user.id, events)
+    return Response({"accepted": accepted, "rejected": rejected}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def activity_timeline(request, exam_id, student_id):
+    """
+    A student's events for an exam in order, for the exam's creator, admins
+    and the student. Pass the last event's ``id`` back as ``?after=`` for the
+    next page.
+    """
+    exam = get_object_or_404(Exam, id=exam_id)
+    if request.user.id != student_id and exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to view this activity."}, status=403)
+    try:
+        after = int(request.query_params['after']) if 'after' in request.query_params else None
+        limit = min(int(request.query_params.get('limit', 500)), 1000)
+    except ValueError:
+        return Response({"error": "after and limit must be integers."}, status=400)
+    events = activity.timeline(exam.id, student_id, after=after, limit=limit)
+    for event in events:
+        event['occurred_at'] = format_datetime(event['occurred_at'])
+        event['recorded_at'] = format_datetime(event['recorded_at'])
+    return Response({
+        "events": events,
+        "next": events[-1]['id'] if len(events) == limit else None,
+    })
+
+
+# --------------------
+# Offline Exams
+# --------------------
+def _is_open(exam, now):
+    return (not exam.start_time or exam.start_time <= now) and (not exam.end_time or now <= exam.end_time)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def offline_bundle(request, exam_id):
+    """The signed, compressed paper for taking the exam offline."""
+    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    if not _is_open(exam, timezone.now()):
+        return Response({"error": "Exam is not open."}, status=status.HTTP_403_FORBIDDEN)
+    registration = get_object_or_404(ExamRegistration, exam=exam, student=request.user, completed_at__isnull=True)
+    now = timezone.now()
+    start_registration(registration, exam, now)
+    mark_issued([registration], now)
+    return Response({"bundle": build_bundle(exam, registration, now)})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+def offline_bundle_archive(request, exam_id):
+    """One bundle per student still to take the exam, zipped for a test center."""
+    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to download bundles for this exam."}, status=403)
+    now = timezone.now()
+    if not _is_open(exam, now):
+        return Response({"error": "Exam is not open."}, status=status.HTTP_403_FORBIDDEN)
+    registrations = list(
+        ExamRegistration.objects.filter(exam=exam, completed_at__isnull=True).only('id', 'student_id', 'started_at')
+    )
+    # The center hands the bundles out now: everyone's clock starts with them
+    start_registrations(exam, registrations, now)
+    mark_issued(registrations, now)
+    response = HttpResponse(bundle_archive(exam, registrations, now), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="exam-{exam.id}-bundles.zip"'
+    return response
+
+
+def _ingest_response(report):
+    ok = report['graded'] or not report['rejected']
+    return Response(report, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def upload_offline_answers(request, exam_id):
+    """Grade the student's signed answer sheet from an offline bundle."""
+    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    sheet = request.data.get('sheet')
+    if not isinstance(sheet, str):
+        return Response({"error": "Send the signed answer sheet as 'sheet'."}, status=400)
+    return _ingest_response(ingest_sheets(exam, [('sheet', sheet)], student=request.user))
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+def upload_offline_answer_archive(request, exam_id):
+    """Grade a test center's zip of ``.sheet`` files in bulk."""
+    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to upload answers for this exam."}, status=403)
+    uploaded = request.FILES.get('file')
+    if uploaded is None:
+        return Response({"error": "Upload the zip archive as 'file'."}, status=400)
+    try:
+        report = ingest_sheets(exam, read_sheet_archive(uploaded))
+    except SheetError as exc:
+        return Response({"error": str(exc)}, status=400)
+    return _ingest_response(report)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+def upload_omr_results(request, exam_id):
+    """
+    Grade a scanner's OMR CSV export (see ``exams.omr``) and return the
+    reconciliation report. ``register_missing=true`` registers students
+    who have no registration instead of rejecting their sheets. Very large files are better
+    loaded with ``manage.py ingest_omr_results``.
+    """
+    exam = get_object_or_404(Exam, id=exam_id)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to upload results for this exam."}, status=403)
+    uploaded = request.FILES.get('file')
+    if uploaded is None:
+        return Response({"error": "Upload the CSV export as 'file'."}, status=400)
+    register_missing = str(request.data.get('register_missing', '')).lower() in ('1', 'true', 'yes')
+    try:
+        report = ingest_omr_csv(
+            exam, io.TextIOWrapper(uploaded.file, encoding='utf-8-sig', newline=''), register_missing
+        )
+    except (OMRError, UnicodeDecodeError) as exc:
+        return Response({"error": str(exc)}, status=400)
+    return Response(report)
+
+
+# --------------------
+# Section Management
+# --------------------
+class ExamSectionListView(generics.ListCreateAPIView):
+    serializer_class = ExamSectionSerializer
+    permission_classes = [permissions.IsAuthenticated, IsTeacherOrAdmin]
+
+    def get_exam(self):
+        exam = get_object_or_404(Exam, id=self.kwargs.get('exam_id'))
+        # Ensure user has permission to manage sections for this exam
+        if exam.creator != self.request.user and self.request.user.role != 'admin':
+            raise PermissionDenied("You don't have permission to manage sections for this exam.")
+        return exam
+
+    def get_queryset(self):
+        return ExamSection.objects.filter(exam=self.get_exam())
+
+    def perform_create(self, serializer):
+        serializer.save(exam=self.get_exam())
+
+
 # --------------------
 # Question Management
 # --------------------
@@ -233,7 +507,7 @@ class QuestionListView(generics.ListCreateAPIView):
         exam = get_object_or_404(Exam, id=exam_id)
         # Ensure user has permission to view questions for this exam
         if exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to view questions for this exam.")
+            raise PermissionDenied("You don't have permission to view questions for this exam.")
         return Question.objects.filter(exam=exam)
 
     def perform_create(self, serializer):
@@ -241,7 +515,7 @@ class QuestionListView(generics.ListCreateAPIView):
         exam = get_object_or_404(Exam, id=exam_id)
         # Ensure user has permission to add questions to this exam
         if exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to add questions to this exam.")
+            raise PermissionDenied("You don't have permission to add questions to this exam.")
         serializer.save(exam=exam)
 
 
@@ -256,7 +530,7 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
         question = get_object_or_404(Question, id=self.kwargs.get('question_id'))
         # Ensure user has permission to modify this question
         if question.exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to modify this question.")
+            raise PermissionDenied("You don't have permission to modify this question.")
         return question
 
 
@@ -269,7 +543,7 @@ class OptionListView(generics.ListCreateAPIView):
         question = get_object_or_404(Question, id=question_id)
         # Ensure user has permission to view options for this question
         if question.exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to view options for this question.")
+            raise PermissionDenied("You don't have permission to view options for this question.")
         return Option.objects.filter(question=question)
 
     def perform_create(self, serializer):
@@ -277,7 +551,7 @@ class OptionListView(generics.ListCreateAPIView):
         question = get_object_or_404(Question, id=question_id)
         # Ensure user has permission to add options to this question
         if question.exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to add options to this question.")
+            raise PermissionDenied("You don't have permission to add options to this question.")
         serializer.save(question=question)
 
 
@@ -292,10 +566,144 @@ class OptionDetailView(generics.RetrieveUpdateDestroyAPIView):
         option = get_object_or_404(Option, id=self.kwargs.get('option_id'))
         # Ensure user has permission to modify this option
         if option.question.exam.creator != self.request.user and self.request.user.role != 'admin':
-            raise permissions.PermissionDenied("You don't have permission to modify this option.")
+            raise PermissionDenied("You don't have permission to modify this option.")
         return option
 
 
+class AcceptedAnswerListView(generics.ListCreateAPIView):
+    """Auto-grading rules for a short answer or essay question."""
+    serializer_class = AcceptedAnswerSerializer
+    permission_classes = [permissions.IsAuthenticated, IsTeacherOrAdmin]
+
+    def get_question(self):
+        question = get_object_or_404(
+            Question.objects.select_related('exam'),
+            id=self.kwargs.get('question_id'), exam_id=self.kwargs.get('exam_id')
+        )
+        if question.exam.creator != self.request.user and self.request.user.role != 'admin':
+            raise PermissionDenied("You don't have permission to manage accepted answers for this question.")
+        return question
+
+    def get_queryset(self):
+        return AcceptedAnswer.objects.filter(question=self.get_question())
+
+    def perform_create(self, serializer):
+        question = self.get_question()
+        if question.question_type not in FREE_TEXT_TYPES:
+            raise serializers.ValidationError({'question': "Accepted answers only apply to short answer and essay questions."})
+        serializer.save(question=question)
+
+
+class AcceptedAnswerDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = AcceptedAnswerSerializer
+    permission_classes = [permissions.IsAuthenticated, IsTeacherOrAdmin]
+
+    def get_object(self):
+        accepted = get_object_or_404(
+            AcceptedAnswer.objects.select_related('question__exam'),
+            id=self.kwargs.get('answer_id'), question_id=self.kwargs.get('question_id')
+        )
+        if accepted.question.exam.creator != self.request.user and self.request.user.role != 'admin':
+            raise PermissionDenied("You don't have permission to modify this accepted answer.")
+        return accepted
+
+
+# --------------------
+# Batch Reorder / Edit
+# --------------------
+def _validate_batch_edits(serializer_class, instances, items, errors, label):
+    """Validate partial edits against their instances; returns [(instance, validated_data)]."""
+    edits = []
+    for item in items:
+        data = {key: value for key, value in item.items() if key != 'id'}
+        instance = instances.get(item['id'])
+        if instance is None:
+            errors.append({label: item['id'], 'errors': {'id': ['Not part of this exam.']}})
+            continue
+        serializer = serializer_class(instance, data=data, partial=True)
+        if serializer.is_valid():
+            edits.append((instance, serializer.validated_data))
+        else:
+            errors.append({label: item['id'], 'errors': serializer.errors})
+    return edits
+
+
+def _apply_batch_edits(model, edits):
+    fields = set()
+    for instance, validated_data in edits:
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+            fields.add(field)
+    if fields:
+        model.objects.bulk_update([instance for instance, _ in edits], sorted(fields), batch_size=500)
+    return len(edits)
+
+
+@extend_schema(request=QuestionBatchSerializer, responses={200: OpenApiTypes.OBJECT})
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+@transaction.atomic
+def batch_update_questions(request, exam_id):
+    # Locking the exam serializes batches, so positions are planned from committed ones
+    exam = get_object_or_404(Exam.objects.select_for_update(), id=exam_id)
+
+    # Check permission
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to edit questions for this exam."}, status=403)
+
+    positions = dict(Question.objects.filter(exam=exam).values_list('id', 'order'))
+    serializer = QuestionBatchSerializer(data=request.data, context={'question_ids': set(positions)})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    sequence = sorted(positions, key=lambda qid: (positions[qid], qid))
+    errors = []
+
+    # Work out the new sequence
+    new_order = {}
+    if 'moves' in data:
+        new_order = plan_positions(apply_moves(sequence, data['moves']), positions)
+    elif 'order' in data:
+        # A partial ordering permutes the listed questions among their own slots
+        listed = set(data['order'])
+        ordered = iter(data['order'])
+        target = [next(ordered) if qid in listed else qid for qid in sequence]
+        new_order = plan_positions(target, positions)
+
+    # Field edits are validated together before anything is written
+    question_items = [
+        # Positions are only changed through 'order'/'moves'
+        {key: value for key, value in item.items() if key not in ('order', 'exam', 'options')}
+        for item in data['questions']
+    ]
+    question_edits = _validate_batch_edits(
+        QuestionSerializer,
+        Question.objects.filter(exam=exam).in_bulk([item['id'] for item in question_items]),
+        question_items, errors, 'question',
+    )
+    option_edits = _validate_batch_edits(
+        OptionSerializer,
+        Option.objects.filter(question__exam=exam).in_bulk([item['id'] for item in data['options']]),
+        data['options'], errors, 'option',
+    )
+    if errors:
+        return Response({"errors": errors}, status=400)
+
+    questions_updated = _apply_batch_edits(Question, question_edits)
+    Question.objects.bulk_update(
+        [Question(id=qid, order=order) for qid, order in new_order.items()], ['order'], batch_size=500
+    )
+    options_updated = _apply_batch_edits(Option, option_edits)
+    invalidate_paper_cache(exam.id)
+
+    return Response({
+        "reordered": len(new_order),
+        "questions_updated": questions_updated,
+        "options_updated": options_updated,
+    })
+
+
 # --------------------
 # Bulk Question Import
 # --------------------
@@ -357,4 +765,137 @@ def bulk_import_questions(request, exam_id):
     return Response(
         QuestionSerializer(created_questions, many=True).data,
         status=status.HTTP_201_CREATED
-    )
\ No newline at end of file
+    )
+
+
+# --------------------
+# Exam Cloning
+# --------------------
+@extend_schema(request=ExamCloneSerializer, responses={201: ExamListSerializer})
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+def clone_exam_view(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+
+    # Check permission
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to clone this exam."}, status=403)
+
+    serializer = ExamCloneSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    new_exam = clone_exam(exam, creator=request.user, **serializer.validated_data)
+    return Response(ExamListSerializer(new_exam).data, status=status.HTTP_201_CREATED)
+
+
+# --------------------
+# Results Export
+# --------------------
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='answers', description='Pivot per-question answers into columns (1/0)', required=False, type=bool),
+        OpenApiParameter(name='gzip', description='Gzip the export on the fly (1/0)', required=False, type=bool),
+    ]
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsTeacherOrAdmin])
+def export_exam_results(request, exam_id, export_format):
+    exam = get_object_or_404(Exam, id=exam_id)
+
+    # Check permission
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response({"error": "You don't have permission to export results for this exam."}, status=403)
+
+    if export_format not in EXPORT_FORMATS:
+        return Response({"error": f"Unsupported export format. Choose one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+    include_answers = request.query_params.get('answers') in ['1', 'true', 'True']
+    compress = request.query_params.get('gzip') in ['1', 'true', 'True']
+
+    filename = f"exam-{exam.id}-results.{export_format}"
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(
+        iter_export(exam, export_format, include_answers=include_answers, compress=compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# --------------------
+# Archived Results
+# --------------------
+ARCHIVE_MAX_PAGE_SIZE = 1000
+
+
+def _get_archive(request, exam_id):
+    archived = get_object_or_404(ArchivedExam.objects.select_related('exam'), exam_id=exam_id)
+    is_owner = archived.exam.creator_id == request.user.id or request.user.role == 'admin'
+    return archived, is_owner
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def archived_exam_summary(request, exam_id):
+    archived, is_owner = _get_archive(request, exam_id)
+    if not is_owner:
+        return Response({"error": "You don't have permission to view this archive."}, status=403)
+    return Response({
+        'exam': archived.exam_id,
+        'archived_at': archived.archived_at,
+        'registrations': archived.registration_count,
+        'attempts': archived.attempt_count,
+        'answers': archived.answer_count,
+    })
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='student', description='Only rows of this student (registrations, attempts)', required=False, type=int),
+        OpenApiParameter(name='attempt', description='Only answers of this attempt', required=False, type=int),
+        OpenApiParameter(name='offset', description='Rows to skip', required=False, type=int),
+        OpenApiParameter(name='limit', description=f'Rows to return (max {ARCHIVE_MAX_PAGE_SIZE})', required=False, type=int),
+    ]
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def archived_exam_rows(request, exam_id, table):
+    """Read-only rows of an archived exam, served straight from the archive file."""
+    if table not in ARCHIVE_TABLES:
+        return Response({"error": f"Unknown table. Choose one of: {', '.join(ARCHIVE_TABLES)}."}, status=400)
+    archived, is_owner = _get_archive(request, exam_id)
+
+    try:
+        filters = {}
+        if request.query_params.get('student'):
+            filters['student_id'] = int(request.query_params['student'])
+        if request.query_params.get('attempt'):
+            filters['attempt_id'] = int(request.query_params['attempt'])
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), ARCHIVE_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "student, attempt, offset and limit must be integers."}, status=400)
+
+    if not is_owner:
+        # Students only see their own registration and attempt
+        if table == 'answers':
+            return Response({"error": "You don't have permission to view archived answers."}, status=403)
+        filters['student_id'] = request.user.id
+
+    try:
+        rows = iter_archived_rows(archived, table, load_manifest(archived), filters)
+        page = []
+        for index, row in enumerate(rows):
+            if index < offset:
+                continue
+            if len(page) == limit:
+                return Response({'results': page, 'next_offset': offset + limit})
+            page.append(row)
+    except (ArchiveError, OSError):
+        return Response({"error": "The archive for this exam is unavailable."}, status=503)
+    return Response({'results': page, 'next_offset': None})
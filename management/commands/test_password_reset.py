@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.core.mail import send_mail
 from django.conf import settings
-from users.models import User
+from users.models import User, PasswordResetToken
 
 class Command(BaseCommand):
     help = 'Test password reset email functionality'
@@ -16,11 +16,8 @@ class Command(BaseCommand):
             user = User.objects.get(username=username)
             self.stdout.write(f"Testing password reset for: {user.email}")
             
-            # Generate a reset token (simplified version)
-            from django.utils.crypto import get_random_string
-            reset_token = get_random_string(50)
-            user.password_reset_token = reset_token
-            user.save()
+            # Generate a reset token (only its hash is stored)
+            reset_token = PasswordResetToken.issue(user)
             
             # Create reset URL
             reset_url = f"http://localhost:8000/api/users/password-reset-confirm/{reset_token}/"
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from backend.schema import build_schema, code_hash, remove_stale_schemas, schema_path
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema served by /api/schema/ for the current code'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate even if the schema for this code exists')
+        parser.add_argument('--keep-stale', action='store_true', help="Don't delete schemas of other code versions")
+    
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['force'] or not schema_path('yaml').exists() or not schema_path('json').exists():
+            paths = build_schema()
+            message = f"Wrote {', '.join(str(path) for path in paths)}"
+        else:
+            message = f"Schema for code {code_hash()} is up to date"
+        if not options['keep_stale']:
+            removed = remove_stale_schemas()
+            if removed:
+                message += f", removed {removed} stale file(s)"
+        self.stdout.write(self.style.SUCCESS(f"{message} in {time.perf_counter() - start:.1f}s"))
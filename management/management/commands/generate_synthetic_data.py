@@ -0,0 +1,48 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from management.synthetic import SyntheticDataGenerator
+from users.models import User
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, realistically distributed dataset for local performance work'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same data')
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--admins', type=int, default=2)
+        parser.add_argument('--exams', type=int, default=200)
+        parser.add_argument('--questions-per-exam', type=int, default=20, help='Mean questions per exam')
+        parser.add_argument('--attempts', type=int, default=50000,
+                            help='Total attempts, spread over exams by popularity (~questions-per-exam answers each)')
+        parser.add_argument('--prefix', default='synth', help='Username prefix of generated users')
+        parser.add_argument('--skip-summaries', action='store_true', help="Don't rebuild result summaries afterwards")
+    
+    def handle(self, *args, **options):
+        if options['teachers'] < 1 or options['students'] < 1 or options['exams'] < 1:
+            raise CommandError('Need at least one teacher, one student and one exam')
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users with prefix '{options['prefix']}_' already exist; pick another --prefix")
+        
+        start = time.perf_counter()
+        generator = SyntheticDataGenerator(
+            seed=options['seed'],
+            students=options['students'],
+            teachers=options['teachers'],
+            admins=options['admins'],
+            exams=options['exams'],
+            questions_per_exam=options['questions_per_exam'],
+            attempts=options['attempts'],
+            prefix=options['prefix'],
+            progress=self.stdout.write,
+        )
+        counts = generator.generate()
+        if not options['skip_summaries']:
+            call_command('rebuild_result_summaries', stdout=self.stdout)
+        
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count} {name}" for name, count in counts.items())
+            + f" generated in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SCRIPT = '''
+import {module}
+if {load_urls}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+'''
+
+class Command(BaseCommand):
+    help = 'Import-time profile of worker startup (python -X importtime), by package and by module'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='backend.wsgi', help='Entry point to import, e.g. backend.asgi')
+        parser.add_argument('--no-urls', action='store_true',
+                            help="Stop after the entry point; by default the URLconf is loaded too, "
+                                 "as it is on a worker's first request")
+        parser.add_argument('--top', type=int, default=20, help='Rows to show per table')
+    
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+        script = SCRIPT.format(module=options['module'], load_urls=not options['no_urls'])
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(own), int(cumulative)))
+        packages = Counter()
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+        total = sum(packages.values())
+        
+        self.stdout.write(f"{options['module']}: {len(modules)} modules imported in {total / 1000:.0f}ms")
+        self.stdout.write('\nSelf time by top-level package:')
+        for package, own in packages.most_common(options['top']):
+            self.stdout.write(f"  {own / 1000:8.1f}ms  {own / total:6.1%}  {package}")
+        self.stdout.write('\nSlowest modules including their imports:')
+        for name, _, cumulative in sorted(modules, key=lambda row: row[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f}ms  {name}")
@@ -0,0 +1,262 @@
+"""
+Deterministic synthetic dataset for reproducing performance problems locally.
+
+Everything is drawn from one ``random.Random(seed)``, so the same options
+produce the same users, exams, questions and answers. Distributions aim to
+look like production rather than uniform noise:
+
+- exam popularity follows a Zipf law, so a few exams take most attempts;
+- question types follow a fixed mix dominated by multiple choice;
+- every student has an ability and every question a difficulty, and answers
+  are correct with the logistic probability of their difference, giving
+  per-exam score distributions with a realistic spread;
+- some registrations are never started or never completed.
+
+Rows are written with chunked ``bulk_create`` and one password hash shared by
+all generated users. Fields with ``auto_now_add`` get the time of the run.
+"""
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from exams.models import Exam, ExamRegistration, Option, Question
+from exams.ordering import POSITION_GAP
+from submissions.models import Answer, ExamAttempt
+from users.models import User
+
+CHUNK_SIZE = 5000
+PASSWORD = 'synthetic'
+ZIPF_EXPONENT = 1.1
+
+QUESTION_TYPE_MIX = [
+    ('multiple_choice', 0.55),
+    ('true_false', 0.15),
+    ('multiple_select', 0.10),
+    ('short_answer', 0.15),
+    ('essay', 0.05),
+]
+DIFFICULTY_MIX = [('easy', 0.3), ('medium', 0.5), ('hard', 0.2)]
+DIFFICULTY_OFFSET = {'easy': -0.8, 'medium': 0.0, 'hard': 0.9}
+WORDS = (
+    'analysis argument because cell climate data energy evidence example experiment force growth '
+    'history market method model population pressure process rate result society structure system '
+    'theory therefore value water'
+).split()
+
+
+def _weighted(rng, mix):
+    return rng.choices([value for value, _ in mix], weights=[weight for _, weight in mix])[0]
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+class Writer:
+    """Buffers model instances and saves them with ``bulk_create`` per chunk."""
+
+    def __init__(self, model, chunk_size=CHUNK_SIZE):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.count = 0
+
+    def add(self, obj):
+        self.pending.append(obj)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.model.objects.bulk_create(self.pending, batch_size=self.chunk_size)
+            self.count += len(self.pending)
+            self.pending = []
+
+
+class SyntheticDataGenerator:
+    def __init__(self, seed=0, students=5000, teachers=50, admins=2, exams=200,
+                 questions_per_exam=20, attempts=50000, prefix='synth', progress=None):
+        self.rng = random.Random(seed)
+        self.students = students
+        self.teachers = teachers
+        self.admins = admins
+        self.exams = exams
+        self.questions_per_exam = questions_per_exam
+        self.attempts = attempts
+        self.prefix = prefix
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+        self.counts = {}
+
+    def generate(self):
+        student_ids, teacher_ids = self.create_users()
+        exam_sizes = self.attempts_per_exam(min(self.attempts, self.exams * len(student_ids)), len(student_ids))
+        answers = Writer(Answer)
+        attempt_count = registration_count = 0
+        for index in range(self.exams):
+            with transaction.atomic():
+                exam = self.create_exam(index, teacher_ids)
+                questions = self.create_questions(exam)
+                attempts, registrations = self.create_attempts(exam, questions, student_ids, exam_sizes[index], answers)
+                answers.flush()
+            attempt_count += attempts
+            registration_count += registrations
+            if (index + 1) % 10 == 0 or index + 1 == self.exams:
+                self.progress(f"{index + 1}/{self.exams} exams, {answers.count} answers")
+        self.counts.update({
+            'exams': self.exams,
+            'attempts': attempt_count,
+            'registrations': registration_count,
+            'answers': answers.count,
+        })
+        return self.counts
+
+    def create_users(self):
+        password = make_password(PASSWORD)
+        writer = Writer(User)
+        roles = [('admin', self.admins), ('teacher', self.teachers), ('student', self.students)]
+        for role, count in roles:
+            for number in range(1, count + 1):
+                first = self.rng.choice(['Ada', 'Ben', 'Chen', 'Dara', 'Eli', 'Fatima', 'Gus', 'Hana', 'Ivan', 'Jo'])
+                last = self.rng.choice(['Ng', 'Okafor', 'Patel', 'Quinn', 'Rossi', 'Silva', 'Tanaka', 'Umar'])
+                username = f'{self.prefix}_{role}_{number:06d}'
+                writer.add(User(
+                    username=username, email=f'{username}@example.com', password=password,
+                    first_name=first, last_name=last, role=role, is_staff=role == 'admin',
+                ))
+        writer.flush()
+        self.counts['users'] = writer.count
+
+        ids = {
+            role: list(
+                User.objects.filter(username__startswith=f'{self.prefix}_{role}_')
+                .order_by('username').values_list('id', flat=True)
+            )
+            for role, _ in roles
+        }
+        # Ability per student drives their scores across exams
+        self.ability = {student_id: self.rng.gauss(0.4, 1.0) for student_id in ids['student']}
+        return ids['student'], ids['teacher'] or ids['admin']
+
+    def attempts_per_exam(self, total, max_per_exam):
+        """Split ``total`` attempts over the exams by a Zipf law, capped at ``max_per_exam``."""
+        weights = [1 / (rank ** ZIPF_EXPONENT) for rank in range(1, self.exams + 1)]
+        self.rng.shuffle(weights)
+        scale = total / sum(weights)
+        return [min(max_per_exam, max(1, round(weight * scale))) for weight in weights]
+
+    def create_exam(self, index, teacher_ids):
+        difficulty = _weighted(self.rng, DIFFICULTY_MIX)
+        start_time = self.now - timedelta(days=self.rng.uniform(0, 365))
+        return Exam.objects.create(
+            title=f'{_sentence(self.rng, 3)[:-1]} #{index + 1}',
+            description=_sentence(self.rng, 12),
+            creator_id=self.rng.choice(teacher_ids),
+            duration_minutes=self.rng.choice([20, 30, 45, 60, 90, 120]),
+            passing_score=self.rng.choice([50, 60, 60, 70]),
+            difficulty=difficulty,
+            start_time=start_time,
+            end_time=start_time + timedelta(days=self.rng.choice([1, 7, 14, 30])),
+            is_active=self.rng.random() < 0.8,
+        )
+
+    def create_questions(self, exam):
+        count = max(1, round(self.rng.gauss(self.questions_per_exam, self.questions_per_exam / 4)))
+        offset = DIFFICULTY_OFFSET[exam.difficulty]
+        questions = Question.objects.bulk_create([
+            Question(
+                exam=exam,
+                question_text=_sentence(self.rng, 10)[:-1] + '?',
+                question_type=_weighted(self.rng, QUESTION_TYPE_MIX),
+                points=self.rng.choice([1, 1, 1, 2, 2, 3, 5]),
+                order=(number + 1) * POSITION_GAP,
+            )
+            for number in range(count)
+        ])
+
+        options = []
+        generated = []
+        for question in questions:
+            choices = []
+            if question.question_type == 'true_false':
+                correct = self.rng.choice(['True', 'False'])
+                choices = [('True', correct == 'True'), ('False', correct == 'False')]
+            elif question.question_type == 'multiple_choice':
+                right = self.rng.randrange(4)
+                choices = [(_sentence(self.rng, 3), i == right) for i in range(4)]
+            elif question.question_type == 'multiple_select':
+                right = set(self.rng.sample(range(5), 2))
+                choices = [(_sentence(self.rng, 3), i in right) for i in range(5)]
+            options.extend(
+                Option(question=question, option_text=text, is_correct=is_correct, order=i)
+                for i, (text, is_correct) in enumerate(choices)
+            )
+            generated.append((question, choices, offset + self.rng.gauss(0, 0.8)))
+        Option.objects.bulk_create(options, batch_size=CHUNK_SIZE)
+        return generated
+
+    def create_attempts(self, exam, questions, student_ids, size, answers):
+        students = self.rng.sample(student_ids, size)
+        total_points = sum(question.points for question, _, _ in questions)
+        attempts = []
+        registrations = []
+        graded = []
+        for student_id in students:
+            started_at = exam.start_time + timedelta(hours=self.rng.uniform(0, 24))
+            state = self.rng.random()
+            if state < 0.05:
+                # Registered, never started
+                registrations.append(ExamRegistration(exam=exam, student_id=student_id))
+                continue
+            deadline = exam.deadline_for(started_at)
+            if state < 0.08:
+                # Abandoned mid-way, left for the sweeper
+                registrations.append(ExamRegistration(
+                    exam=exam, student_id=student_id, started_at=started_at, deadline=deadline
+                ))
+                continue
+
+            ability = self.ability[student_id]
+            rows = []
+            obtained = 0
+            for question, choices, difficulty in questions:
+                is_correct = self.rng.random() < 1 / (1 + math.exp(difficulty - ability))
+                rows.append((question, self._answer_text(question, choices, is_correct), is_correct))
+                obtained += question.points if is_correct else 0
+            score = obtained / total_points * 100 if total_points else 0
+            passed = score >= exam.passing_score
+            end_time = started_at + (deadline - started_at) * self.rng.betavariate(5, 2)
+            attempts.append(ExamAttempt(
+                exam=exam, student_id=student_id, deadline=deadline, end_time=end_time,
+                is_submitted=True, score=score, passed=passed,
+            ))
+            registrations.append(ExamRegistration(
+                exam=exam, student_id=student_id, started_at=started_at, deadline=deadline,
+                completed_at=end_time, score=score, is_passed=passed,
+            ))
+            graded.append(rows)
+
+        ExamRegistration.objects.bulk_create(registrations, batch_size=CHUNK_SIZE)
+        ExamAttempt.objects.bulk_create(attempts, batch_size=CHUNK_SIZE)
+        for attempt, rows in zip(attempts, graded):
+            for question, answer_text, is_correct in rows:
+                answers.add(Answer(attempt=attempt, question=question, answer_text=answer_text, is_correct=is_correct))
+        return len(attempts), len(registrations)
+
+    def _answer_text(self, question, choices, is_correct):
+        if question.question_type == 'multiple_select':
+            right = [text for text, correct in choices if correct]
+            picked = right if is_correct else self.rng.sample([text for text, _ in choices], 2)
+            if not is_correct and sorted(picked) == sorted(right):
+                picked = picked[:1]
+            return ','.join(picked)
+        if choices:
+            pool = [text for text, correct in choices if correct == is_correct]
+            return self.rng.choice(pool)
+        if question.question_type == 'essay':
+            return ' '.join(_sentence(self.rng, self.rng.randint(8, 20)) for _ in range(self.rng.randint(3, 8)))
+        return self.rng.choice(WORDS)
@@ -1,3 +1,22 @@
 from django.test import TestCase
 
-# Create your tests here.
+from exams.models import Exam
+from submissions.models import Answer
+from .synthetic import SyntheticDataGenerator
+
+
+class SyntheticDataGeneratorTests(TestCase):
+    def generate(self, prefix):
+        return SyntheticDataGenerator(
+            seed=42, students=40, teachers=3, admins=1, exams=4, questions_per_exam=6, attempts=60, prefix=prefix
+        ).generate()
+
+    def test_same_seed_generates_the_same_data(self):
+        first = self.generate('a')
+        first_answers = list(Answer.objects.order_by('id').values_list('answer_text', 'is_correct'))
+        Exam.objects.all().delete()
+        second = self.generate('b')
+        second_answers = list(Answer.objects.order_by('id').values_list('answer_text', 'is_correct'))
+        self.assertEqual(first, second)
+        self.assertEqual(first_answers, second_answers)
+        self.assertEqual(first['users'], 44)
@@ -1,14 +1,47 @@
 from django.contrib import admin
-from .models import ExamAttempt, Answer
+from exams.admin import ExamListFilter
+from .models import ExamAttempt, Answer, ManualReview, SimilarEssayPair, SuspiciousPair
 
 @admin.register(ExamAttempt)
 class ExamAttemptAdmin(admin.ModelAdmin):
     list_display = ['student', 'exam', 'start_time', 'end_time', 'is_submitted', 'score', 'passed']
-    list_filter = ['is_submitted', 'passed', 'exam']
+    list_filter = ['is_submitted', 'passed', ExamListFilter]
+    list_select_related = ['student', 'exam']
     search_fields = ['student__username', 'exam__title']
+    raw_id_fields = ['student', 'exam']
+    show_full_result_count = False
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ['attempt', 'question', 'is_correct']
     list_filter = ['is_correct']
-    search_fields = ['attempt__student__username', 'question__question_text']
\ No newline at end of file
+    # Question.__str__ reads exam.title
+    list_select_related = ['question__exam']
+    search_fields = ['attempt__student__username', 'question__question_text']
+    raw_id_fields = ['attempt', 'question']
+    show_full_result_count = False
+
+@admin.register(ManualReview)
+class ManualReviewAdmin(admin.ModelAdmin):
+    list_display = ['answer', 'exam', 'status', 'created_at', 'reviewed_by', 'reviewed_at']
+    list_filter = ['status', ExamListFilter]
+    list_select_related = ['exam', 'reviewed_by']
+    raw_id_fields = ['answer', 'exam', 'reviewed_by']
+    show_full_result_count = False
+
+@admin.register(SimilarEssayPair)
+class SimilarEssayPairAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'question', 'first_answer', 'second_answer', 'similarity', 'created_at']
+    list_filter = [ExamListFilter]
+    list_select_related = ['exam', 'question__exam']
+    raw_id_fields = ['exam', 'question', 'first_answer', 'second_answer']
+    show_full_result_count = False
+
+@admin.register(SuspiciousPair)
+class SuspiciousPairAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'first_attempt', 'second_attempt', 'identical_wrong', 'both_wrong', 'z_score']
+    list_filter = [ExamListFilter]
+    list_select_related = ['exam', 'first_attempt__student', 'first_attempt__exam',
+                           'second_attempt__student', 'second_attempt__exam']
+    raw_id_fields = ['exam', 'first_attempt', 'second_attempt']
+    show_full_result_count = False
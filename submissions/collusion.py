@@ -0,0 +1,152 @@
+"""
+Answer-pattern collusion screening for objective questions.
+
+Every submitted attempt of an exam becomes a row of a compact ``int16``
+matrix holding, per question, a code for the response given (0 = not
+answered). Wrong responses are one-hot encoded per (question, response), so
+for two attempts the number of identical wrong answers is the dot product of
+their rows. Pairs are scored against chance: given that both got a question
+wrong, they pick the same wrong answer with probability ``q`` (the sum of
+squared shares of that question's wrong responses), which gives an expected
+count and variance per pair and a z-score.
+
+The pairwise products are computed in row blocks of ``block_size`` attempts
+against all attempts, so peak memory is ``O(block_size * attempts)`` rather
+than quadratic, and only the running top ``k`` pairs are kept.
+
+Needs NumPy, which is an optional dependency.
+"""
+import heapq
+
+from django.db import transaction
+
+from exams.models import Question
+from .models import Answer, ExamAttempt, SuspiciousPair
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+OBJECTIVE_TYPES = ('multiple_choice', 'true_false', 'multiple_select')
+DEFAULT_TOP_K = 100
+DEFAULT_BLOCK_SIZE = 256
+MIN_IDENTICAL_WRONG = 3
+
+
+def _normalize_response(question_type, text):
+    text = str(text).strip().casefold()
+    if question_type == 'multiple_select':
+        return ','.join(sorted(part.strip() for part in text.split(',') if part.strip()))
+    return text
+
+
+def encode_responses(exam_id):
+    """
+    Returns ``(attempt_ids, codes, wrong)``: the submitted attempts, an
+    ``int16`` matrix of response codes (attempts x questions) and a boolean
+    matrix marking answered-but-wrong cells.
+    """
+    attempt_ids = list(
+        ExamAttempt.objects.filter(exam_id=exam_id, is_submitted=True).order_by('id').values_list('id', flat=True)
+    )
+    rows = {attempt_id: index for index, attempt_id in enumerate(attempt_ids)}
+    columns = {
+        question_id: index for index, question_id in enumerate(
+            Question.objects.filter(exam_id=exam_id, question_type__in=OBJECTIVE_TYPES)
+            .order_by('id').values_list('id', flat=True)
+        )
+    }
+    codes = np.zeros((len(attempt_ids), len(columns)), dtype=np.int16)
+    wrong = np.zeros((len(attempt_ids), len(columns)), dtype=bool)
+
+    response_codes = {}
+    answers = Answer.objects.filter(
+        attempt__exam_id=exam_id, attempt__is_submitted=True,
+        question__question_type__in=OBJECTIVE_TYPES,
+    ).values_list('attempt_id', 'question_id', 'question__question_type', 'answer_text', 'is_correct')
+    for attempt_id, question_id, question_type, text, is_correct in answers.iterator(chunk_size=5000):
+        response = _normalize_response(question_type, text)
+        if not response:
+            continue
+        known = response_codes.setdefault(question_id, {})
+        row, column = rows[attempt_id], columns[question_id]
+        codes[row, column] = known.setdefault(response, len(known) + 1)
+        wrong[row, column] = not is_correct
+    return attempt_ids, codes, wrong
+
+
+def _wrong_indicators(codes, wrong):
+    """One-hot columns per (question, wrong response) and per-question chance ``q``."""
+    wrong_codes = np.where(wrong, codes, 0)
+    blocks = []
+    chance = np.zeros(codes.shape[1], dtype=np.float64)
+    for column in range(codes.shape[1]):
+        values, counts = np.unique(wrong_codes[:, column], return_counts=True)
+        counts = counts[values > 0]
+        values = values[values > 0]
+        if not len(values):
+            continue
+        shares = counts / counts.sum()
+        chance[column] = float((shares ** 2).sum())
+        blocks.append(wrong_codes[:, column, None] == values[None, :])
+    if not blocks:
+        return np.zeros((codes.shape[0], 0), dtype=np.float32), chance
+    return np.hstack(blocks).astype(np.float32), chance
+
+
+def find_suspicious_pairs(codes, wrong, top_k=DEFAULT_TOP_K, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Returns up to ``top_k`` tuples ``(z, i, j, identical, both_wrong, expected)``
+    with ``i < j`` row indexes, highest z-score first.
+    """
+    count = codes.shape[0]
+    indicators, chance = _wrong_indicators(codes, wrong)
+    wrong_f = wrong.astype(np.float32)
+    weighted_mean = wrong_f * chance.astype(np.float32)
+    weighted_var = wrong_f * (chance * (1 - chance)).astype(np.float32)
+
+    heap = []
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        identical = indicators[start:stop] @ indicators.T
+        both_wrong = wrong_f[start:stop] @ wrong_f.T
+        expected = weighted_mean[start:stop] @ wrong_f.T
+        variance = weighted_var[start:stop] @ wrong_f.T
+        z = (identical - expected) / np.sqrt(np.maximum(variance, 1e-6))
+
+        # Upper triangle only, and at least a few identical wrong answers
+        rows = np.arange(start, stop)[:, None]
+        mask = (np.arange(count)[None, :] > rows) & (identical >= MIN_IDENTICAL_WRONG)
+        z = np.where(mask, z, -np.inf)
+
+        flat = z.ravel()
+        keep = min(top_k, int(np.isfinite(flat).sum()))
+        if not keep:
+            continue
+        for index in np.argpartition(flat, -keep)[-keep:]:
+            i, j = divmod(int(index), count)
+            item = (float(flat[index]), start + i, j, int(identical[i, j]), int(both_wrong[i, j]), float(expected[i, j]))
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+    return sorted(heap, reverse=True)
+
+
+def detect_collusion(exam_id, top_k=DEFAULT_TOP_K, block_size=DEFAULT_BLOCK_SIZE):
+    """Replace the exam's stored ``SuspiciousPair`` rows with a fresh analysis."""
+    if np is None:
+        raise RuntimeError("Collusion detection requires NumPy.")
+    attempt_ids, codes, wrong = encode_responses(exam_id)
+    pairs = find_suspicious_pairs(codes, wrong, top_k=top_k, block_size=block_size) if attempt_ids else []
+    with transaction.atomic():
+        SuspiciousPair.objects.filter(exam_id=exam_id).delete()
+        SuspiciousPair.objects.bulk_create([
+            SuspiciousPair(
+                exam_id=exam_id, first_attempt_id=attempt_ids[i], second_attempt_id=attempt_ids[j],
+                identical_wrong=identical, both_wrong=both_wrong, expected=expected, z_score=z,
+            )
+            for z, i, j, identical, both_wrong, expected in pairs
+        ])
+    return len(attempt_ids), len(pairs)
@@ -0,0 +1,181 @@
+"""
+Student home page in one call.
+
+``build_dashboard`` gathers the profile, upcoming registered exams, exams open
+right now, recent results and the overall result summary with a fixed five
+queries. The payload is cached per user under two versions: the user's own,
+bumped when their registrations, results or profile change, and a global one
+bumped when any exam changes. Because "upcoming" and "open" depend on the
+clock, an entry also expires at the next start, end or deadline it shows,
+and after ``DASHBOARD_CACHE_TIMEOUT`` seconds at most so newly opened exams
+show up.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from exams.fast_serializers import format_datetime
+from exams.models import Exam, ExamRegistration
+from users.serializers import UserProfileSerializer
+from .models import ExamAttempt, StudentResultSummary, without_attempt_results
+from .serializers import StudentResultSummarySerializer
+
+CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 120)
+OPEN_EXAMS_LIMIT = 20
+RECENT_RESULTS_LIMIT = 5
+EXAMS_VERSION_KEY = 'dashboard_exams_version'
+
+
+def _user_version_key(user_id):
+    return f"dashboard_version:{user_id}"
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = 1
+        cache.add(key, version, None)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def invalidate_dashboard(user_id):
+    """Drop the user's cached dashboard after their registrations or results change."""
+    _bump_version(_user_version_key(user_id))
+
+
+def invalidate_all_dashboards():
+    """Drop every cached dashboard after an exam changes."""
+    _bump_version(EXAMS_VERSION_KEY)
+
+
+def _upcoming(user, now):
+    rows = (
+        ExamRegistration.objects
+        .filter(student=user, completed_at__isnull=True, exam__is_active=True)
+        .filter(Q(exam__end_time__isnull=True) | Q(exam__end_time__gt=now))
+        .order_by(F('exam__start_time').asc(nulls_first=True), 'id')
+        .values('id', 'exam', 'exam__title', 'exam__duration_minutes', 'exam__start_time',
+                'exam__end_time', 'started_at', 'deadline')
+    )
+    return [
+        {
+            'registration': row['id'],
+            'exam': row['exam'],
+            'exam_title': row['exam__title'],
+            'duration_minutes': row['exam__duration_minutes'],
+            'start_time': row['exam__start_time'],
+            'end_time': row['exam__end_time'],
+            'started_at': row['started_at'],
+            'deadline': row['deadline'],
+        }
+        for row in rows
+    ]
+
+
+def _open_exams(user, now):
+    rows = (
+        Exam.objects
+        .filter(is_active=True)
+        .filter(Q(start_time__isnull=True) | Q(start_time__lte=now))
+        .filter(Q(end_time__isnull=True) | Q(end_time__gt=now))
+        .annotate(is_registered=Exists(ExamRegistration.objects.filter(exam=OuterRef('pk'), student=user)))
+        .order_by(F('end_time').asc(nulls_last=True), 'id')
+        .values('id', 'title', 'difficulty', 'duration_minutes', 'end_time', 'is_registered')
+        [:OPEN_EXAMS_LIMIT]
+    )
+    return [
+        {
+            'exam': row['id'],
+            'exam_title': row['title'],
+            'difficulty': row['difficulty'],
+            'duration_minutes': row['duration_minutes'],
+            'end_time': row['end_time'],
+            'is_registered': row['is_registered'],
+        }
+        for row in rows
+    ]
+
+
+def _recent_results(user):
+    """Latest graded results from both the registration and the attempt flows."""
+    registrations = (
+        without_attempt_results(ExamRegistration.objects.filter(student=user, completed_at__isnull=False))
+        .order_by('-completed_at')
+        .values_list('exam', 'exam__title', 'score', 'is_passed', 'completed_at')
+        [:RECENT_RESULTS_LIMIT]
+    )
+    attempts = (
+        ExamAttempt.objects
+        .filter(student=user, is_submitted=True, end_time__isnull=False)
+        .order_by('-end_time')
+        .values_list('exam', 'exam__title', 'score', 'passed', 'end_time')
+        [:RECENT_RESULTS_LIMIT]
+    )
+    results = sorted([*registrations, *attempts], key=lambda row: row[4], reverse=True)
+    return [
+        {
+            'exam': exam_id,
+            'exam_title': title,
+            'score': score,
+            'passed': passed,
+            'completed_at': format_datetime(completed_at),
+        }
+        for exam_id, title, score, passed, completed_at in results[:RECENT_RESULTS_LIMIT]
+    ]
+
+
+def _seconds_until_stale(now, upcoming, open_exams):
+    boundaries = [exam['end_time'] for exam in open_exams]
+    for registration in upcoming:
+        boundaries += [registration['start_time'], registration['end_time'], registration['deadline']]
+    timeout = CACHE_TIMEOUT
+    for boundary in boundaries:
+        if boundary is not None and boundary > now:
+            timeout = min(timeout, math.ceil((boundary - now).total_seconds()))
+    return timeout
+
+
+def build_dashboard(user, now=None):
+    """Return ``(payload, seconds until it may go stale)``."""
+    now = now or timezone.now()
+    upcoming = _upcoming(user, now)
+    open_exams = _open_exams(user, now)
+    summary = StudentResultSummary.objects.filter(student=user, difficulty=StudentResultSummary.ALL).first()
+    timeout = _seconds_until_stale(now, upcoming, open_exams)
+
+    for registration in upcoming:
+        registration['is_open'] = registration['start_time'] is None or registration['start_time'] <= now
+        for name in ('start_time', 'end_time', 'started_at', 'deadline'):
+            registration[name] = format_datetime(registration[name])
+    for exam in open_exams:
+        exam['end_time'] = format_datetime(exam['end_time'])
+
+    payload = {
+        'profile': UserProfileSerializer(user).data,
+        'upcoming_exams': upcoming,
+        'open_exams': open_exams,
+        'recent_results': _recent_results(user),
+        'summary': StudentResultSummarySerializer(summary).data if summary else None,
+    }
+    return payload, timeout
+
+
+def get_dashboard(user):
+    cache_key = (
+        f"dashboard:{user.id}:{_get_version(_user_version_key(user.id))}:{_get_version(EXAMS_VERSION_KEY)}"
+    )
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload, timeout = build_dashboard(user)
+        cache.set(cache_key, payload, timeout)
+    return payload
@@ -0,0 +1,61 @@
+"""
+Read-only fast path for exam attempts: the same dicts as
+``ExamAttemptSerializer`` built from ``.values()`` rows. Kept in sync with the
+serializer by parity tests.
+"""
+from exams.fast_serializers import format_datetime, lookups_for
+
+from .models import Answer
+
+ATTEMPT_COLUMNS = {
+    'id': (['id'], lambda row: row['id']),
+    'exam': (['exam'], lambda row: row['exam']),
+    'student': (['student'], lambda row: row['student']),
+    'start_time': (['start_time'], lambda row: format_datetime(row['start_time'])),
+    'deadline': (['deadline'], lambda row: format_datetime(row['deadline'])),
+    'end_time': (['end_time'], lambda row: format_datetime(row['end_time'])),
+    'is_submitted': (['is_submitted'], lambda row: row['is_submitted']),
+    'score': (['score'], lambda row: row['score']),
+    'passed': (['passed'], lambda row: row['passed']),
+    'answers': (['id'], None),
+}
+ATTEMPT_FIELDS = list(ATTEMPT_COLUMNS)
+ATTEMPT_EXPANDABLE = ('answers',)
+ANSWER_FIELDS = ('id', 'question', 'answer_text')
+
+
+def attempt_rows(queryset, fieldset=None):
+    """A ``.values()`` queryset that ``attempt_payloads`` can format (paginates lazily)."""
+    fields = list(fieldset) if fieldset is not None else ATTEMPT_FIELDS
+    return queryset.values(*lookups_for(ATTEMPT_COLUMNS, fields))
+
+
+def attempt_payloads(rows, fieldset=None):
+    """
+    ``ExamAttemptSerializer(attempts, many=True).data`` from ``attempt_rows``
+    rows, plus one query for the answers when ``answers`` is selected.
+    """
+    fields = list(fieldset) if fieldset is not None else ATTEMPT_FIELDS
+    rows = list(rows)
+
+    answers = {}
+    if 'answers' in fields:
+        answer_rows = (
+            Answer.objects
+            .filter(attempt_id__in=[row['id'] for row in rows])
+            .order_by('id')
+            .values_list('attempt_id', *ANSWER_FIELDS)
+        )
+        for attempt_id, *answer in answer_rows:
+            answers.setdefault(attempt_id, []).append(dict(zip(ANSWER_FIELDS, answer)))
+
+    payloads = []
+    for row in rows:
+        attempt = {}
+        for name in fields:
+            if name == 'answers':
+                attempt[name] = answers.get(row['id'], [])
+            else:
+                attempt[name] = ATTEMPT_COLUMNS[name][1](row)
+        payloads.append(attempt)
+    return payloads
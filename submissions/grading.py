@@ -0,0 +1,158 @@
+"""
+Batch grading of free-text answers for a whole exam.
+
+Answers are streamed in chunks and matched against the exam's compiled answer
+key (``exams.grading``); matches are flagged correct with one UPDATE per
+chunk, the rest are queued for manual review with ``bulk_create``, and the
+affected attempts are re-scored with a single aggregate query.
+
+Papers submitted through ``exams`` are kept as submitted attempts by
+``save_submitted_paper``, so their free text is reviewed the same way.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, When
+
+from exams.grading import FREE_TEXT_TYPES, get_answer_key
+from exams.models import Exam
+from .models import Answer, ExamAttempt, ManualReview, record_regraded_results
+from .similarity import index_attempt_essays
+
+CHUNK_SIZE = 2000
+
+
+def rescore_attempts(exam, attempt_ids):
+    """
+    Recompute score/passed for ``attempt_ids`` from their answers. Submitted
+    attempts are already in the result summaries, which move with them.
+    """
+    totals = (
+        Answer.objects
+        .filter(attempt_id__in=attempt_ids)
+        .values('attempt_id')
+        .annotate(
+            total=Sum('question__points'),
+            obtained=Sum(Case(When(is_correct=True, then='question__points'), default=0,
+                              output_field=IntegerField())),
+        )
+    )
+    previous = {
+        attempt_id: (student_id, score, passed, is_submitted)
+        for attempt_id, student_id, score, passed, is_submitted in ExamAttempt.objects.filter(
+            id__in=attempt_ids
+        ).values_list('id', 'student_id', 'score', 'passed', 'is_submitted')
+    }
+    attempts = []
+    changes = []
+    for row in totals:
+        if not row['total']:
+            continue
+        score = (row['obtained'] / row['total']) * 100
+        passed = score >= exam.passing_score
+        attempts.append(ExamAttempt(id=row['attempt_id'], score=score, passed=passed))
+        student_id, old_score, old_passed, is_submitted = previous[row['attempt_id']]
+        if is_submitted:
+            changes.append((student_id, old_score, old_passed, score, passed))
+    with transaction.atomic():
+        ExamAttempt.objects.bulk_update(attempts, ['score', 'passed'], batch_size=CHUNK_SIZE)
+        record_regraded_results(exam, changes)
+    return len(attempts)
+
+
+def save_submitted_paper(exam, student, score, passed, marked, submitted_at):
+    """
+    Keep a paper graded by ``exams.views.submit_exam`` as a submitted attempt.
+    ``marked`` is ``exams.papers.mark_answers`` output, so unanswered
+    questions are kept as wrong and a regrade scores the whole paper; free
+    text no rule matched is queued for manual review. Call it in the
+    transaction that completes the registration.
+    """
+    attempt = ExamAttempt.objects.create(
+        exam=exam, student=student, score=score, passed=passed, is_submitted=True, end_time=submitted_at
+    )
+    answers = Answer.objects.bulk_create([
+        Answer(attempt=attempt, question_id=question['id'], answer_text=answer_text, is_correct=is_correct)
+        for question, answer_text, is_correct in marked
+    ])
+    ManualReview.objects.bulk_create([
+        ManualReview(answer=answer, exam=exam)
+        for answer, (question, answer_text, is_correct) in zip(answers, marked)
+        if question['question_type'] in FREE_TEXT_TYPES and answer_text.strip() and not is_correct
+    ])
+    transaction.on_commit(partial(index_attempt_essays, attempt.id))
+    return attempt
+
+
+def _grade_chunk(exam, answer_key, chunk):
+    """
+    Grade ``[(answer_id, question_id, answer_text, attempt_id, is_correct)]``.
+    Returns the matched and unmatched counts and the ids of attempts whose
+    answers changed.
+    """
+    matched = []
+    unmatched = []
+    lost = []
+    changed = set()
+    for answer_id, question_id, answer_text, attempt_id, is_correct in chunk:
+        matcher = answer_key.get(question_id)
+        if matcher and matcher.match(answer_text):
+            matched.append(answer_id)
+            if not is_correct:
+                changed.add(attempt_id)
+        else:
+            unmatched.append(answer_id)
+            # Regrading: a rule that no longer matches takes its mark back
+            if is_correct:
+                lost.append(answer_id)
+                changed.add(attempt_id)
+
+    with transaction.atomic():
+        if matched:
+            Answer.objects.filter(id__in=matched).update(is_correct=True)
+            ManualReview.objects.filter(answer_id__in=matched, status='pending').delete()
+        if lost:
+            Answer.objects.filter(id__in=lost).update(is_correct=False)
+        ManualReview.objects.bulk_create(
+            [ManualReview(answer_id=answer_id, exam=exam) for answer_id in unmatched],
+            ignore_conflicts=True,
+        )
+    return len(matched), len(unmatched), changed
+
+
+def grade_free_text_answers(exam_id, regrade=False):
+    """
+    Grade every ungraded short answer/essay answer of the exam. With
+    ``regrade`` answers already marked correct are checked again too; answers
+    a teacher has reviewed are never touched. Returns a summary dict.
+    """
+    exam = Exam.objects.get(id=exam_id)
+    answer_key = get_answer_key(exam_id)
+
+    answers = Answer.objects.filter(
+        question__exam_id=exam_id,
+        question__question_type__in=FREE_TEXT_TYPES,
+    ).exclude(review__status__in=['accepted', 'rejected'])
+    if not regrade:
+        answers = answers.filter(is_correct=False)
+
+    matched = unmatched = 0
+    attempt_ids = set()
+    chunk = []
+    rows = answers.values_list('id', 'question_id', 'answer_text', 'attempt_id', 'is_correct')
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            chunk_matched, chunk_unmatched, changed = _grade_chunk(exam, answer_key, chunk)
+            matched += chunk_matched
+            unmatched += chunk_unmatched
+            attempt_ids |= changed
+            chunk = []
+    if chunk:
+        chunk_matched, chunk_unmatched, changed = _grade_chunk(exam, answer_key, chunk)
+        matched += chunk_matched
+        unmatched += chunk_unmatched
+        attempt_ids |= changed
+
+    rescored = rescore_attempts(exam, attempt_ids) if attempt_ids else 0
+    return {'matched': matched, 'queued_for_review': unmatched, 'attempts_rescored': rescored}
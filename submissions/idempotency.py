@@ -0,0 +1,141 @@
+"""
+``Idempotency-Key`` support for the submit endpoints.
+
+The first request with a key claims it by committing an in-progress
+``IdempotencyRecord``, then runs the view and stores its response on the
+record in the same transaction as the view's own writes. A retry with the
+same key is answered from the record without re-grading: a completed record
+is replayed, an in-flight one is polled until the first request finishes, or
+a 409 is returned after ``IDEMPOTENCY_WAIT_SECONDS``. Server errors release
+the key so the client can try again; reusing a key for a different request
+is rejected with a 422.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+MAX_KEY_LENGTH = 255
+WAIT_SECONDS = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 5)
+# An in-progress claim this old belongs to a request that died mid-way
+STALE_AFTER = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_STALE_SECONDS', 60))
+RETENTION = timedelta(hours=getattr(settings, 'IDEMPOTENCY_RETENTION_HOURS', 24))
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name='Idempotency-Key', location=OpenApiParameter.HEADER, required=False, type=str,
+    description='Client-chosen key; retries with the same key replay the first response',
+)
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(user, key, scope, request_hash):
+    """Return ``(record, claimed)``; waits while another request holds the key."""
+    records = IdempotencyRecord.objects.filter(user=user, key=key)
+    record = records.first()
+    if record is None:
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(
+                    user=user, key=key, scope=scope, request_hash=request_hash
+                )
+            return record, True
+        except IntegrityError:
+            record = records.first()
+            if record is None:
+                return _claim(user, key, scope, request_hash)
+
+    give_up = time.monotonic() + WAIT_SECONDS
+    delay = 0.05
+    while record.status == IdempotencyRecord.IN_PROGRESS and record.request_hash == request_hash:
+        if record.created_at < timezone.now() - STALE_AFTER:
+            taken_over = records.filter(
+                status=IdempotencyRecord.IN_PROGRESS, created_at=record.created_at
+            ).update(created_at=timezone.now())
+            if taken_over:
+                return record, True
+        if time.monotonic() >= give_up:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        record = records.first()
+        if record is None:
+            # The first request failed and released the key
+            return _claim(user, key, scope, request_hash)
+    return record, False
+
+
+def idempotent(scope):
+    """
+    Decorate a DRF view function or viewset action so that requests carrying
+    an ``Idempotency-Key`` header run at most once per user and key.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            request_hash = _request_hash(request)
+            record, claimed = _claim(request.user, key, scope, request_hash)
+            if not claimed:
+                if record.scope != scope or record.request_hash != request_hash:
+                    return Response(
+                        {"error": "This Idempotency-Key was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record.status == IdempotencyRecord.IN_PROGRESS:
+                    response = Response(
+                        {"error": "A request with this Idempotency-Key is still being processed."},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                response = Response(record.response_body, status=record.response_status)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                with transaction.atomic():
+                    response = view(*args, **kwargs)
+                    if response.status_code < 500:
+                        IdempotencyRecord.objects.filter(pk=record.pk).update(
+                            status=IdempotencyRecord.COMPLETED,
+                            response_status=response.status_code,
+                            response_body=response.data,
+                        )
+            except Exception:
+                IdempotencyRecord.objects.filter(pk=record.pk).delete()
+                raise
+            if response.status_code >= 500:
+                IdempotencyRecord.objects.filter(pk=record.pk).delete()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired():
+    """Delete records past the retention window. Returns the number of rows removed."""
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - RETENTION).delete()
+    return deleted
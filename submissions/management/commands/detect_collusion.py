@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from exams.models import Exam
+from submissions import collusion
+
+class Command(BaseCommand):
+    help = 'Flag pairs of attempts with suspiciously many identical wrong answers on objective questions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam to analyse')
+        parser.add_argument('--top-k', type=int, default=collusion.DEFAULT_TOP_K, help='Number of pairs to keep')
+        parser.add_argument('--block-size', type=int, default=collusion.DEFAULT_BLOCK_SIZE,
+                            help='Attempts compared per block; bounds peak memory')
+    
+    def handle(self, *args, **options):
+        if collusion.np is None:
+            raise CommandError('NumPy is required for collusion detection')
+        if not Exam.objects.filter(id=options['exam_id']).exists():
+            raise CommandError(f"Exam {options['exam_id']} not found")
+        
+        start = time.perf_counter()
+        attempts, pairs = collusion.detect_collusion(
+            options['exam_id'], top_k=options['top_k'], block_size=options['block_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Compared {attempts} attempt(s), stored {pairs} suspicious pair(s) in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from submissions.models import Answer
+from submissions.similarity import index_essays
+
+class Command(BaseCommand):
+    help = 'Sign new essay answers and flag near-duplicates (incremental)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, help='Only index essays of this exam')
+    
+    def handle(self, *args, **options):
+        answers = Answer.objects.all()
+        if options['exam']:
+            answers = answers.filter(question__exam_id=options['exam'])
+        
+        start = time.perf_counter()
+        indexed, flagged = index_essays(answers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} essay(s), flagged {flagged} similar pair(s) in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from exams.models import Exam
+from submissions.grading import grade_free_text_answers
+
+class Command(BaseCommand):
+    help = 'Auto-grade short answer and essay answers of an exam against its accepted answers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='ID of the exam to grade')
+        parser.add_argument('--regrade', action='store_true', help='Also re-check answers already marked correct')
+    
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = grade_free_text_answers(options['exam_id'], regrade=options['regrade'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} not found")
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['matched']} answer(s) matched, {result['queued_for_review']} queued for review, "
+            f"{result['attempts_rescored']} attempt(s) rescored in {time.perf_counter() - start:.2f}s"
+        ))
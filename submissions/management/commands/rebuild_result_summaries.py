@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from exams.models import ExamRegistration
+from submissions.models import ExamAttempt, StudentResultSummary, ExamResultSummary, without_attempt_results
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-student and per-exam result summaries from graded registrations and attempts'
+    
+    def handle(self, *args, **options):
+        graded = [
+            # A result kept as both a registration and an attempt counts once
+            without_attempt_results(ExamRegistration.objects.filter(completed_at__isnull=False, score__isnull=False))
+            .values('student_id', 'exam_id', 'exam__difficulty', 'score', 'is_passed'),
+            ExamAttempt.objects.filter(is_submitted=True)
+            .values('student_id', 'exam_id', 'exam__difficulty', 'score', is_passed=F('passed')),
+        ]
+        
+        def empty():
+            return {'attempt_count': 0, 'passed_count': 0, 'total_score': 0, 'min_score': None, 'max_score': None}
+        
+        students = defaultdict(empty)
+        exams = defaultdict(empty)
+        for queryset in graded:
+            for row in queryset.iterator(chunk_size=5000):
+                score = row['score']
+                for totals in (
+                    students[(row['student_id'], StudentResultSummary.ALL)],
+                    students[(row['student_id'], row['exam__difficulty'])],
+                    exams[row['exam_id']],
+                ):
+                    totals['attempt_count'] += 1
+                    totals['passed_count'] += 1 if row['is_passed'] else 0
+                    totals['total_score'] += score
+                    totals['min_score'] = score if totals['min_score'] is None else min(totals['min_score'], score)
+                    totals['max_score'] = score if totals['max_score'] is None else max(totals['max_score'], score)
+        
+        with transaction.atomic():
+            StudentResultSummary.objects.all().delete()
+            ExamResultSummary.objects.all().delete()
+            StudentResultSummary.objects.bulk_create(
+                [StudentResultSummary(student_id=sid, difficulty=difficulty, **totals)
+                 for (sid, difficulty), totals in students.items()],
+                batch_size=1000,
+            )
+            ExamResultSummary.objects.bulk_create(
+                [ExamResultSummary(exam_id=eid, **totals) for eid, totals in exams.items()],
+                batch_size=1000,
+            )
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(students)} student and {len(exams)} exam result summaries"
+        ))
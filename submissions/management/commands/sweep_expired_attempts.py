@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from submissions.sweeper import BATCH_SIZE, close_expired_registrations, submit_expired_attempts
+
+class Command(BaseCommand):
+    help = 'Auto-submit attempts and close registrations whose time limit has passed'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows closed per transaction')
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Keep sweeping every SECONDS instead of exiting after one pass')
+    
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            attempts = submit_expired_attempts(batch_size=options['batch_size'])
+            registrations = close_expired_registrations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Submitted {attempts} attempt(s), closed {registrations} registration(s) "
+                f"in {time.perf_counter() - start:.2f}s"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -1,7 +1,13 @@
-from django.db import models
+from functools import partial
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from exams.models import Exam, Question
+from exams.models import Exam, ExamRegistration, Question, Option
+from exams.grading import FREE_TEXT_TYPES, get_answer_key, grade_free_text
 
 User = get_user_model()
 
@@ -13,9 +19,14 @@ class ExamAttempt(models.Model):
     is_submitted = models.BooleanField(default=False)
     score = models.FloatField(default=0)
     passed = models.BooleanField(default=False)
+    deadline = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         unique_together = ('student', 'exam')
+        indexes = [
+            models.Index(fields=['deadline'], condition=models.Q(is_submitted=False),
+                         name='open_attempt_deadline'),
+        ]
     
     def calculate_score(self):
         # Calculate the score based on answers
@@ -61,5 +72,318 @@ class Answer(models.Model):
                     self.is_correct = self.answer_text.strip().lower() == correct_option.option_text.strip().lower()
             
             self.save()
-        # For short answer questions, is_correct remains False until manually graded
-        return self.is_correct
\ No newline at end of file
+        elif self.question.question_type in FREE_TEXT_TYPES:
+            # Accepted-answer rules first; anything unmatched goes to manual review
+            answer_key = get_answer_key(self.question.exam_id)
+            if grade_free_text(answer_key, self.question_id, self.answer_text):
+                self.is_correct = True
+                self.save()
+            else:
+                ManualReview.objects.get_or_create(answer=self, defaults={'exam_id': self.question.exam_id})
+        return self.is_correct
+
+
+class ManualReview(models.Model):
+    """Free-text answer that no accepted-answer rule matched, waiting for a teacher."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+    ]
+    
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, related_name='review')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='manual_reviews')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    reviewed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='manual_reviews'
+    )
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['exam', 'status', 'created_at'])]
+    
+    def __str__(self):
+        return f"Review of answer {self.answer_id} ({self.status})"
+
+
+class EssaySignature(models.Model):
+    """MinHash signature of an essay answer, see ``submissions.similarity``."""
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, related_name='signature')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='essay_signatures')
+    signature = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Signature of answer {self.answer_id}"
+
+
+class EssayBucket(models.Model):
+    """One LSH band of an essay's signature; essays sharing a bucket are candidate pairs."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='+')
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='+')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('answer', 'band')
+        indexes = [models.Index(fields=['exam', 'bucket'])]
+
+
+class SimilarEssayPair(models.Model):
+    """Two essay answers of the same question flagged as near-duplicates."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='similar_essay_pairs')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    first_answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='+')
+    second_answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField(help_text="Estimated Jaccard similarity of the essays' shingles")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('first_answer', 'second_answer')
+        ordering = ['-similarity']
+        indexes = [models.Index(fields=['exam', '-similarity'])]
+
+    def __str__(self):
+        return f"Answers {self.first_answer_id} and {self.second_answer_id} ({self.similarity:.2f})"
+
+
+class SuspiciousPair(models.Model):
+    """Two attempts sharing unusually many identical wrong answers, see ``submissions.collusion``."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='suspicious_pairs')
+    first_attempt = models.ForeignKey(ExamAttempt, on_delete=models.CASCADE, related_name='+')
+    second_attempt = models.ForeignKey(ExamAttempt, on_delete=models.CASCADE, related_name='+')
+    identical_wrong = models.PositiveIntegerField(help_text="Questions both answered wrong with the same answer")
+    both_wrong = models.PositiveIntegerField(help_text="Questions both answered wrong")
+    expected = models.FloatField(help_text="Identical wrong answers expected by chance")
+    z_score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('first_attempt', 'second_attempt')
+        ordering = ['-z_score']
+        indexes = [models.Index(fields=['exam', '-z_score'])]
+
+    def __str__(self):
+        return f"Attempts {self.first_attempt_id} and {self.second_attempt_id} (z={self.z_score:.1f})"
+
+
+
+class IdempotencyRecord(models.Model):
+    """Outcome of a request sent with an ``Idempotency-Key``, see ``submissions.idempotency``."""
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETED, 'Completed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        unique_together = ('user', 'key')
+    
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status})"
+
+
+class ResultSummary(models.Model):
+    """
+    Running totals of graded results. Rows are only ever updated with
+    ``F()`` expressions so concurrent submissions never lose an update, and
+    mean/pass rate are derived from the totals on read.
+    """
+    attempt_count = models.PositiveIntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+    total_score = models.FloatField(default=0)
+    min_score = models.FloatField(null=True, blank=True)
+    max_score = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def mean_score(self):
+        if not self.attempt_count:
+            return None
+        return self.total_score / self.attempt_count
+    
+    @property
+    def pass_rate(self):
+        if not self.attempt_count:
+            return None
+        return self.passed_count / self.attempt_count
+    
+    @classmethod
+    def add_result(cls, score, passed, **lookup):
+        cls.add_results([score], [passed], **lookup)
+    
+    @classmethod
+    def add_results(cls, scores, passed, **lookup):
+        """Fold several results into one summary row with a single update."""
+        summary, _ = cls.objects.get_or_create(**lookup)
+        cls.objects.filter(pk=summary.pk).update(
+            attempt_count=F('attempt_count') + len(scores),
+            passed_count=F('passed_count') + sum(1 for result in passed if result),
+            total_score=F('total_score') + sum(scores),
+            min_score=Least(Coalesce(F('min_score'), min(scores)), min(scores)),
+            max_score=Greatest(Coalesce(F('max_score'), max(scores)), max(scores)),
+            updated_at=timezone.now(),
+        )
+
+
+class StudentResultSummary(ResultSummary):
+    """Per-student totals, overall (``difficulty='all'``) and per exam difficulty."""
+    ALL = 'all'
+    DIFFICULTY_CHOICES = [(ALL, 'All')] + Exam.DIFFICULTY_CHOICES
+    
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='result_summaries')
+    difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default=ALL)
+    
+    class Meta:
+        unique_together = ('student', 'difficulty')
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.difficulty}"
+
+
+class ExamResultSummary(ResultSummary):
+    """Per-exam totals across all graded submissions."""
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='result_summary')
+    
+    def __str__(self):
+        return f"Summary for exam {self.exam_id}"
+
+
+def without_attempt_results(registrations):
+    """
+    Drop registrations whose result is already a submitted attempt of the
+    same student and exam: ``exams`` submits and OMR grading keep both rows
+    for one result, and the attempt is the one regrades keep current.
+    """
+    return registrations.exclude(Exists(ExamAttempt.objects.filter(
+        exam_id=OuterRef('exam_id'), student_id=OuterRef('student_id'), is_submitted=True,
+    )))
+
+
+def record_graded_result(student, exam, score, passed):
+    """
+    Fold one graded submission into the student's and the exam's summaries.
+    Call this inside the transaction that saves the graded result.
+    """
+    # Imported here: the dashboard module builds on these models
+    from .dashboard import invalidate_dashboard
+
+    with transaction.atomic():
+        StudentResultSummary.add_result(score, passed, student=student, difficulty=StudentResultSummary.ALL)
+        StudentResultSummary.add_result(score, passed, student=student, difficulty=exam.difficulty)
+        ExamResultSummary.add_result(score, passed, exam=exam)
+    transaction.on_commit(partial(invalidate_dashboard, student.id))
+
+
+def record_graded_results(exam, results):
+    """
+    ``record_graded_result`` for many students of one exam at once.
+    ``results`` is ``[(student_id, score, passed), ...]`` with each student
+    at most once. Student summaries get one update per distinct
+    ``(score, passed)``, which stays small because scores are fractions of
+    the exam's question count, and the exam's summary a single one.
+    """
+    from .dashboard import invalidate_dashboard
+
+    if not results:
+        return
+    student_ids = [student_id for student_id, _, _ in results]
+    difficulties = [StudentResultSummary.ALL, exam.difficulty]
+    by_result = {}
+    for student_id, score, passed in results:
+        by_result.setdefault((float(score), bool(passed)), []).append(student_id)
+    with transaction.atomic():
+        StudentResultSummary.objects.bulk_create(
+            [StudentResultSummary(student_id=student_id, difficulty=difficulty)
+             for student_id in student_ids for difficulty in difficulties],
+            ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for (score, passed), ids in by_result.items():
+            StudentResultSummary.objects.filter(student_id__in=ids, difficulty__in=difficulties).update(
+                attempt_count=F('attempt_count') + 1,
+                passed_count=F('passed_count') + int(passed),
+                total_score=F('total_score') + score,
+                min_score=Least(Coalesce(F('min_score'), score), score),
+                max_score=Greatest(Coalesce(F('max_score'), score), score),
+                updated_at=now,
+            )
+        ExamResultSummary.add_results(
+            [score for _, score, _ in results], [passed for _, _, passed in results], exam=exam
+        )
+    for student_id in student_ids:
+        transaction.on_commit(partial(invalidate_dashboard, student_id))
+
+
+def record_regraded_result(student, exam, old_score, old_passed, score, passed):
+    """
+    Move a result already folded into the summaries to its new score, e.g.
+    after a manual review. Call this inside the transaction that saves it.
+    """
+    record_regraded_results(exam, [(student.id, old_score, old_passed, score, passed)])
+
+
+def record_regraded_results(exam, changes):
+    """
+    ``record_regraded_result`` for many students of one exam at once.
+    ``changes`` is ``[(student_id, old_score, old_passed, score, passed), ...]``.
+    Attempt counts stay, totals and pass counts move by the difference and
+    min/max widen to take in the new scores; they are not narrowed back, as
+    another result may still sit at the old extreme. The students' completed
+    registrations take the new result too.
+    """
+    from .dashboard import invalidate_dashboard
+
+    changes = [
+        (student_id, float(old_score), bool(old_passed), float(score), bool(passed))
+        for student_id, old_score, old_passed, score, passed in changes
+        if (float(old_score), bool(old_passed)) != (float(score), bool(passed))
+    ]
+    if not changes:
+        return
+    difficulties = [StudentResultSummary.ALL, exam.difficulty]
+    by_change = {}
+    for student_id, old_score, old_passed, score, passed in changes:
+        by_change.setdefault((score - old_score, int(passed) - int(old_passed), score), []).append(student_id)
+    scores = [score for _, _, _, score, _ in changes]
+    now = timezone.now()
+    by_result = {}
+    for student_id, _, _, score, passed in changes:
+        by_result.setdefault((score, passed), []).append(student_id)
+    with transaction.atomic():
+        for (score, passed), ids in by_result.items():
+            ExamRegistration.objects.filter(exam=exam, student_id__in=ids, completed_at__isnull=False).update(
+                score=score, is_passed=passed
+            )
+        for (score_delta, passed_delta, score), ids in by_change.items():
+            StudentResultSummary.objects.filter(student_id__in=ids, difficulty__in=difficulties).update(
+                passed_count=F('passed_count') + passed_delta,
+                total_score=F('total_score') + score_delta,
+                min_score=Least(Coalesce(F('min_score'), score), score),
+                max_score=Greatest(Coalesce(F('max_score'), score), score),
+                updated_at=now,
+            )
+        ExamResultSummary.objects.filter(exam=exam).update(
+            passed_count=F('passed_count') + sum(int(passed) - int(old_passed) for _, _, old_passed, _, passed in changes),
+            total_score=F('total_score') + sum(score - old_score for _, old_score, _, score, _ in changes),
+            min_score=Least(Coalesce(F('min_score'), min(scores)), min(scores)),
+            max_score=Greatest(Coalesce(F('max_score'), max(scores)), max(scores)),
+            updated_at=now,
+        )
+    for student_id, _, _, _, _ in changes:
+        transaction.on_commit(partial(invalidate_dashboard, student_id))
@@ -2,14 +2,18 @@ from rest_framework import permissions
 
 class IsStudent(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 'student'
+        return request.user.is_authenticated and request.user.role == 'student'
 
 class IsTeacher(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.user_type == 'teacher'
+        return request.user.is_authenticated and request.user.role == 'teacher'
+
+class IsTeacherOrAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['teacher', 'admin']
 
 class IsOwnerOrTeacher(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if request.user.user_type == 'teacher' and obj.exam.creator == request.user:
+        if request.user.role == 'teacher' and obj.exam.creator == request.user:
             return True
         return obj.student == request.user
\ No newline at end of file
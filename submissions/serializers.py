@@ -1,7 +1,12 @@
+from functools import partial
+
 from rest_framework import serializers
-from .models import ExamAttempt, Answer
+from django.db import transaction
+from .models import ExamAttempt, Answer, ManualReview, SimilarEssayPair, SuspiciousPair, StudentResultSummary, ExamResultSummary, record_graded_result
 from exams.models import Exam, Question, Option
 from django.utils import timezone
+from backend.fieldsets import SparseFieldsMixin
+from .similarity import index_attempt_essays
 
 class OptionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,7 +20,7 @@ class QuestionSerializer(serializers.ModelSerializer):
         model = Question
         fields = ['id', 'question_text', 'question_type', 'points', 'order', 'options']
 
-class ExamSerializer(serializers.ModelSerializer):
+class ExamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
     is_available = serializers.SerializerMethodField()
     
@@ -38,12 +43,14 @@ class ExamAttemptSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ExamAttempt
-        fields = ['id', 'exam', 'student', 'start_time', 'end_time', 'is_submitted', 'score', 'passed', 'answers']
-        read_only_fields = ['id', 'student', 'start_time', 'end_time', 'score', 'passed']
+        fields = ['id', 'exam', 'student', 'start_time', 'deadline', 'end_time', 'is_submitted', 'score', 'passed', 'answers']
+        read_only_fields = ['id', 'student', 'start_time', 'deadline', 'end_time', 'score', 'passed']
     
     def create(self, validated_data):
         answers_data = validated_data.pop('answers')
-        attempt = ExamAttempt.objects.create(**validated_data)
+        attempt = ExamAttempt.objects.create(
+            deadline=validated_data['exam'].deadline_for(timezone.now()), **validated_data
+        )
         
         for answer_data in answers_data:
             answer = Answer.objects.create(attempt=attempt, **answer_data)
@@ -53,6 +60,8 @@ class ExamAttemptSerializer(serializers.ModelSerializer):
         if validated_data.get('is_submitted', False):
             attempt.end_time = timezone.now()
             attempt.calculate_score()
+            record_graded_result(attempt.student, attempt.exam, attempt.score, attempt.passed)
+            transaction.on_commit(partial(index_attempt_essays, attempt.id))
         
         return attempt
     
@@ -65,4 +74,61 @@ class ExamAttemptSerializer(serializers.ModelSerializer):
         if ExamAttempt.objects.filter(student=data['student'], exam=data['exam']).exists():
             raise serializers.ValidationError("You have already attempted this exam.")
         
-        return data
\ No newline at end of file
+        return data
+
+class ResultSummarySerializer(serializers.ModelSerializer):
+    mean_score = serializers.FloatField(read_only=True)
+    pass_rate = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        fields = ['attempt_count', 'passed_count', 'mean_score', 'min_score', 'max_score', 'pass_rate', 'updated_at']
+        read_only_fields = fields
+
+class StudentResultSummarySerializer(ResultSummarySerializer):
+    class Meta(ResultSummarySerializer.Meta):
+        model = StudentResultSummary
+        fields = ['difficulty'] + ResultSummarySerializer.Meta.fields
+        read_only_fields = fields
+
+class ExamResultSummarySerializer(ResultSummarySerializer):
+    class Meta(ResultSummarySerializer.Meta):
+        model = ExamResultSummary
+        fields = ['exam'] + ResultSummarySerializer.Meta.fields
+        read_only_fields = fields
+
+class ManualReviewSerializer(serializers.ModelSerializer):
+    question = serializers.IntegerField(source='answer.question_id', read_only=True)
+    question_text = serializers.CharField(source='answer.question.question_text', read_only=True)
+    answer_text = serializers.CharField(source='answer.answer_text', read_only=True)
+    student = serializers.CharField(source='answer.attempt.student.username', read_only=True)
+    
+    class Meta:
+        model = ManualReview
+        fields = ['id', 'exam', 'answer', 'question', 'question_text', 'answer_text', 'student',
+                  'status', 'created_at', 'reviewed_by', 'reviewed_at']
+        read_only_fields = fields
+
+class ReviewDecisionSerializer(serializers.Serializer):
+    is_correct = serializers.BooleanField()
+
+class SimilarEssayPairSerializer(serializers.ModelSerializer):
+    first_student = serializers.CharField(source='first_answer.attempt.student.username', read_only=True)
+    second_student = serializers.CharField(source='second_answer.attempt.student.username', read_only=True)
+    first_answer_text = serializers.CharField(source='first_answer.answer_text', read_only=True)
+    second_answer_text = serializers.CharField(source='second_answer.answer_text', read_only=True)
+    
+    class Meta:
+        model = SimilarEssayPair
+        fields = ['id', 'exam', 'question', 'similarity', 'first_answer', 'first_student', 'first_answer_text',
+                  'second_answer', 'second_student', 'second_answer_text', 'created_at']
+        read_only_fields = fields
+
+class SuspiciousPairSerializer(serializers.ModelSerializer):
+    first_student = serializers.CharField(source='first_attempt.student.username', read_only=True)
+    second_student = serializers.CharField(source='second_attempt.student.username', read_only=True)
+    
+    class Meta:
+        model = SuspiciousPair
+        fields = ['id', 'exam', 'first_attempt', 'first_student', 'second_attempt', 'second_student',
+                  'identical_wrong', 'both_wrong', 'expected', 'z_score', 'created_at']
+        read_only_fields = fields
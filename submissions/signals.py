@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from exams.models import Exam, ExamRegistration
+from .dashboard import invalidate_all_dashboards, invalidate_dashboard
+from .models import ExamAttempt
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    invalidate_all_dashboards()
+
+
+@receiver([post_save, post_delete], sender=ExamRegistration)
+@receiver([post_save, post_delete], sender=ExamAttempt)
+def student_exam_changed(sender, instance, **kwargs):
+    invalidate_dashboard(instance.student_id)
+
+
+@receiver(post_save, sender=User)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_dashboard(instance.id)
@@ -0,0 +1,177 @@
+"""
+Near-duplicate essay detection with MinHash and locality-sensitive hashing.
+
+Each essay answer is reduced to its set of word shingles and summarized by a
+fixed-size MinHash signature, whose agreement between two essays estimates
+the Jaccard similarity of their shingle sets. The signature is cut into
+bands; every band is hashed into an indexed ``EssayBucket`` row, so essays
+sharing any bucket become candidate pairs without comparing every pair of
+essays. Candidates of the same question whose estimated similarity reaches
+``SIMILARITY_THRESHOLD`` are stored as ``SimilarEssayPair`` rows.
+
+Indexing is incremental: only essays without a signature are processed, and
+they are compared against everything indexed before them. Essays shorter than
+one shingle are signed but never bucketed. A bucket holding more than
+``MAX_BUCKET_SIZE`` essays (a text copied by a whole class) is kept as a
+cluster: its new members are paired with its first essay only.
+"""
+import hashlib
+import random
+import re
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Answer, EssayBucket, EssaySignature, SimilarEssayPair
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 4
+SIMILARITY_THRESHOLD = 0.6
+CHUNK_SIZE = 500
+MAX_BUCKET_SIZE = 50
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+_word = re.compile(r'\w+')
+
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), 'little')
+
+
+def shingles(text):
+    """Hashed word shingles of ``text``; none for texts shorter than a shingle."""
+    words = _word.findall(str(text).casefold())
+    return {_hash32(' '.join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_hashes):
+    return array('I', [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in shingle_hashes)
+        for a, b in _PERMUTATIONS
+    ])
+
+
+def band_buckets(signature):
+    """Yield ``(band, bucket)`` with a signed 64-bit bucket id per band."""
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(band.to_bytes(2, 'little') + rows.tobytes(), digest_size=8).digest()
+        yield band, int.from_bytes(digest, 'little', signed=True)
+
+
+def estimate_similarity(first, second):
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+
+def _load_signature(data):
+    signature = array('I')
+    signature.frombytes(bytes(data))
+    return signature
+
+
+def _index_chunk(rows):
+    """Index ``[(answer_id, exam_id, question_id, text)]`` and flag their near-duplicates."""
+    signatures = {}
+    new_signatures = []
+    new_buckets = []
+    for answer_id, exam_id, question_id, text in rows:
+        hashes = shingles(text)
+        signature = minhash(hashes) if hashes else array('I')
+        new_signatures.append(EssaySignature(answer_id=answer_id, exam_id=exam_id, signature=signature.tobytes()))
+        if hashes:
+            signatures[answer_id] = signature
+            new_buckets.extend(
+                EssayBucket(exam_id=exam_id, answer_id=answer_id, band=band, bucket=bucket)
+                for band, bucket in band_buckets(signature)
+            )
+
+    with transaction.atomic():
+        EssaySignature.objects.bulk_create(new_signatures, ignore_conflicts=True)
+        EssayBucket.objects.bulk_create(new_buckets, ignore_conflicts=True, batch_size=CHUNK_SIZE * 4)
+
+    if not signatures:
+        return 0
+
+    # Every answer sharing a bucket with a new answer, the new ones included
+    groups = defaultdict(set)
+    bucket_ids = {bucket.bucket for bucket in new_buckets}
+    exam_ids = {bucket.exam_id for bucket in new_buckets}
+    for answer_id, bucket in EssayBucket.objects.filter(
+        exam_id__in=exam_ids, bucket__in=bucket_ids
+    ).values_list('answer_id', 'bucket').iterator():
+        groups[bucket].add(answer_id)
+
+    # Only new answers against the bucket, so earlier pairs are not recounted
+    candidates = set()
+    for members in groups.values():
+        members = sorted(members)
+        others = members[:1] if len(members) > MAX_BUCKET_SIZE else members
+        for answer_id in members:
+            if answer_id not in signatures:
+                continue
+            for other in others:
+                if other != answer_id:
+                    candidates.add((min(answer_id, other), max(answer_id, other)))
+    if not candidates:
+        return 0
+
+    involved = {answer_id for pair in candidates for answer_id in pair}
+    questions = dict(Answer.objects.filter(id__in=involved).values_list('id', 'question_id'))
+    exams = {answer_id: exam_id for answer_id, exam_id, _, _ in rows}
+    missing = involved - signatures.keys()
+    for answer_id, exam_id, data in EssaySignature.objects.filter(
+        answer_id__in=missing
+    ).values_list('answer_id', 'exam_id', 'signature'):
+        signatures[answer_id] = _load_signature(data)
+        exams[answer_id] = exam_id
+
+    pairs = []
+    for first, second in candidates:
+        if questions[first] != questions[second]:
+            continue
+        similarity = estimate_similarity(signatures[first], signatures[second])
+        if similarity >= SIMILARITY_THRESHOLD:
+            pairs.append(SimilarEssayPair(
+                exam_id=exams[first], question_id=questions[first],
+                first_answer_id=first, second_answer_id=second, similarity=similarity,
+            ))
+    SimilarEssayPair.objects.bulk_create(pairs, ignore_conflicts=True)
+    return len(pairs)
+
+
+def index_essays(answers):
+    """
+    Sign and compare every essay answer in the ``answers`` queryset that has no
+    signature yet. Returns ``(indexed, flagged)`` counts.
+    """
+    rows = (
+        answers
+        .filter(question__question_type='essay', signature__isnull=True)
+        .order_by('id')
+        .values_list('id', 'question__exam_id', 'question_id', 'answer_text')
+    )
+    indexed = flagged = 0
+    last_id = 0
+    while True:
+        # Keyset pagination: each chunk is written before the next one is read
+        chunk = list(rows.filter(id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        flagged += _index_chunk(chunk)
+        indexed += len(chunk)
+        last_id = chunk[-1][0]
+    return indexed, flagged
+
+
+def index_attempt_essays(attempt_id):
+    """Index the essays of one submitted attempt; run after the submission commits."""
+    return index_essays(Answer.objects.filter(attempt_id=attempt_id))
@@ -0,0 +1,94 @@
+"""
+Closing of time-limited registrations and attempts whose deadline has passed.
+
+Expired rows are picked from the partial deadline indexes in batches, locked
+with ``SKIP LOCKED`` so several sweepers (or a late submit) never process the
+same row twice, and closed with one UPDATE per exam in a batch. Attempts are
+graded from the answers saved so far; registrations have no saved answers and
+are closed with a score of 0, as are registrations never started once their
+exam has ended. Registrations issued offline bundles are left open for
+``OFFLINE_UPLOAD_WINDOW`` past their deadline, until the test center uploads
+the sheets. All are folded into the result summaries.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from exams.deadlines import OFFLINE_UPLOAD_WINDOW, SUBMISSION_GRACE
+from exams.models import ExamRegistration
+from .grading import rescore_attempts
+from .models import ExamAttempt, record_graded_result
+
+BATCH_SIZE = 500
+
+
+def close_expired_registrations(now=None, batch_size=BATCH_SIZE):
+    """
+    Close registrations whose deadline has passed, then those never started
+    whose exam has ended (completed at the exam's end). Both score 0.
+    """
+    cutoff = (now or timezone.now()) - SUBMISSION_GRACE
+    closed = 0
+    for pending, order in (
+        (Q(deadline__lt=cutoff) & (Q(offline_issued_at__isnull=True) | Q(deadline__lt=cutoff - OFFLINE_UPLOAD_WINDOW)),
+         'deadline'),
+        (Q(started_at__isnull=True, exam__end_time__lt=cutoff), 'id'),
+    ):
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    ExamRegistration.objects
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .filter(pending, completed_at__isnull=True)
+                    .select_related('student', 'exam')
+                    .order_by(order)[:batch_size]
+                )
+                if not batch:
+                    break
+                by_exam = defaultdict(list)
+                for registration in batch:
+                    by_exam[registration.exam].append(registration.id)
+                for exam, registration_ids in by_exam.items():
+                    ExamRegistration.objects.filter(id__in=registration_ids).update(
+                        completed_at=Coalesce('deadline', Value(exam.end_time)), score=0, is_passed=False
+                    )
+                for registration in batch:
+                    record_graded_result(registration.student, registration.exam, 0, False)
+            closed += len(batch)
+    return closed
+
+
+def submit_expired_attempts(now=None, batch_size=BATCH_SIZE):
+    cutoff = (now or timezone.now()) - SUBMISSION_GRACE
+    submitted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ExamAttempt.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .filter(is_submitted=False, deadline__lt=cutoff)
+                .select_related('student', 'exam')
+                .order_by('deadline')[:batch_size]
+            )
+            if not batch:
+                return submitted
+            by_exam = defaultdict(list)
+            for attempt in batch:
+                by_exam[attempt.exam].append(attempt.id)
+            # Scored while still open, so they are recorded below rather than regraded
+            for exam, attempt_ids in by_exam.items():
+                rescore_attempts(exam, attempt_ids)
+            ExamAttempt.objects.filter(id__in=[a.id for a in batch]).update(
+                is_submitted=True, end_time=F('deadline')
+            )
+            results = {
+                attempt_id: (score, passed) for attempt_id, score, passed in
+                ExamAttempt.objects.filter(id__in=[a.id for a in batch]).values_list('id', 'score', 'passed')
+            }
+            for attempt in batch:
+                score, passed = results[attempt.id]
+                record_graded_result(attempt.student, attempt.exam, score, passed)
+        submitted += len(batch)
@@ -1,3 +1,386 @@
+import io
+import json
+from datetime import timedelta
+import random
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from exams import activity
+from exams.models import Exam, Question, Option, AcceptedAnswer, ExamRegistration
+from exams.papers import invalidate_paper_cache
+from users.models import User
+from .fast_serializers import attempt_rows, attempt_payloads
+from . import collusion, similarity
+from .grading import grade_free_text_answers
+from .sweeper import close_expired_registrations, submit_expired_attempts
+from .models import (
+    ExamAttempt, Answer, ManualReview, SimilarEssayPair, SuspiciousPair, ExamResultSummary, StudentResultSummary,
+    record_graded_result,
+)
+from .similarity import index_essays
+from .serializers import ExamAttemptSerializer
+
+
+class AttemptFastSerializerParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Exam', description='', creator=cls.teacher, duration_minutes=30)
+        cls.questions = [
+            Question.objects.create(exam=cls.exam, question_text=f'Q{i}', question_type='short_answer', order=i)
+            for i in range(3)
+        ]
+        cls.attempt = ExamAttempt.objects.create(student=cls.student, exam=cls.exam)
+        for question in cls.questions:
+            Answer.objects.create(attempt=cls.attempt, question=question, answer_text=f'A{question.order}')
+
+    def test_attempt_payload_matches_attempt_serializer(self):
+        fast = attempt_payloads(attempt_rows(ExamAttempt.objects.filter(pk=self.attempt.pk)))[0]
+        self.assertEqual(json.dumps(fast), json.dumps(ExamAttemptSerializer(self.attempt).data))
+
+    def test_attempt_list_endpoint_uses_fast_path(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with self.assertNumQueries(3):
+            response = client.get('/api/submissions/attempts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['answers'][2]['answer_text'], 'A2')
+
+    def test_attempt_summary_does_not_load_answers(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(f'/api/submissions/attempts/{self.attempt.id}/?fields=id,score')
+        self.assertEqual(response.json(), {'id': self.attempt.id, 'score': 0.0})
+        self.assertFalse(any('submissions_answer' in query['sql'] for query in context.captured_queries))
+
+
+class FreeTextGradingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.exam = Exam.objects.create(title='Exam', description='', creator=cls.teacher, duration_minutes=30)
+        cls.capital = Question.objects.create(exam=cls.exam, question_text='Capital of France?', question_type='short_answer')
+        cls.pi = Question.objects.create(exam=cls.exam, question_text='Pi to two places?', question_type='short_answer', order=1)
+        AcceptedAnswer.objects.create(question=cls.capital, rule_type='edit_distance', value='Paris', max_distance=1)
+        AcceptedAnswer.objects.create(question=cls.pi, rule_type='numeric', value='3.14', tolerance=0.005)
+        cls.attempt = ExamAttempt.objects.create(student=cls.student, exam=cls.exam, is_submitted=True)
+        Answer.objects.create(attempt=cls.attempt, question=cls.capital, answer_text='  paris! ')
+        Answer.objects.create(attempt=cls.attempt, question=cls.pi, answer_text='22/7')
+
+    def test_batch_grading_matches_and_queues_the_rest(self):
+        result = grade_free_text_answers(self.exam.id)
+        self.assertEqual(result, {'matched': 1, 'queued_for_review': 1, 'attempts_rescored': 1})
+        self.assertEqual(ManualReview.objects.get().answer.question, self.pi)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 50.0)
+
+    def test_regrading_takes_back_marks_no_rule_matches_any_more(self):
+        grade_free_text_answers(self.exam.id)
+        AcceptedAnswer.objects.filter(question=self.capital).update(value='Lyon')
+        invalidate_paper_cache(self.exam.id)
+        result = grade_free_text_answers(self.exam.id, regrade=True)
+        self.assertEqual(result, {'matched': 0, 'queued_for_review': 2, 'attempts_rescored': 1})
+        self.assertFalse(Answer.objects.filter(attempt=self.attempt, is_correct=True).exists())
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 0.0)
+
+    def test_resolving_a_review_rescores_the_attempt(self):
+        grade_free_text_answers(self.exam.id)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        review = client.get(f'/api/submissions/reviews/exams/{self.exam.id}/').json()['results'][0]
+        response = client.post(f"/api/submissions/reviews/{review['id']}/resolve/", {'is_correct': True}, format='json')
+        self.assertEqual(response.json()['status'], 'accepted')
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 100.0)
+        self.assertEqual(grade_free_text_answers(self.exam.id)['queued_for_review'], 0)
+
+    def test_regrading_moves_the_result_summaries(self):
+        record_graded_result(self.student, self.exam, 0, False)
+        grade_free_text_answers(self.exam.id)
+        review = ManualReview.objects.get()
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/submissions/reviews/{review.id}/resolve/', {'is_correct': True}, format='json')
+        summary = ExamResultSummary.objects.get(exam=self.exam)
+        self.assertEqual((summary.attempt_count, summary.passed_count, summary.total_score), (1, 1, 100.0))
+        self.assertEqual(summary.max_score, 100.0)
+        for summary in StudentResultSummary.objects.filter(student=self.student):
+            self.assertEqual((summary.attempt_count, summary.passed_count, summary.mean_score), (1, 1, 100.0))
+
+    def test_students_cannot_reach_the_review_queue(self):
+        grade_free_text_answers(self.exam.id)
+        review = ManualReview.objects.get()
+        client = APIClient()
+        client.force_authenticate(self.student)
+        self.assertEqual(client.get(f'/api/submissions/reviews/exams/{self.exam.id}/').status_code, 403)
+        self.assertEqual(client.post(f'/api/submissions/reviews/{review.id}/resolve/', {'is_correct': True}).status_code, 403)
+        self.assertEqual(client.get('/api/submissions/results/summary/').status_code, 200)
+        client.force_authenticate(None)
+        self.assertEqual(client.get('/api/submissions/dashboard/').status_code, 401)
+
+    def test_only_the_owner_manages_accepted_answers(self):
+        other = User.objects.create_user('other', role='teacher')
+        rule = self.capital.accepted_answers.get()
+        list_url = f'/api/exams/{self.exam.id}/questions/{self.capital.id}/accepted-answers/'
+        detail_url = f'{list_url}{rule.id}/'
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(list_url).status_code, 403)
+        self.assertEqual(client.post(list_url, {'value': 'Lutetia'}, format='json').status_code, 403)
+        self.assertEqual(client.get(detail_url).status_code, 403)
+        self.assertEqual(client.delete(detail_url).status_code, 403)
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.get(detail_url).json()['value'], 'Paris')
+
+
+class EssaySimilarityTests(TestCase):
+    ESSAY = (
+        "The industrial revolution began in Britain because of abundant coal, a growing population "
+        "and colonial markets that created demand for manufactured textiles and iron goods."
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='History', description='', creator=cls.teacher, duration_minutes=30)
+        cls.question = Question.objects.create(exam=cls.exam, question_text='Why Britain?', question_type='essay')
+        texts = [
+            cls.ESSAY,
+            cls.ESSAY.replace('abundant coal', 'plentiful coal'),
+            "Britain had stable institutions, patent law and a banking system that financed new factories.",
+        ]
+        for i, text in enumerate(texts):
+            student = User.objects.create_user(f'student{i}', role='student')
+            attempt = ExamAttempt.objects.create(student=student, exam=cls.exam, is_submitted=True)
+            Answer.objects.create(attempt=attempt, question=cls.question, answer_text=text)
+
+    def test_near_duplicates_are_flagged_incrementally(self):
+        answers = Answer.objects.filter(question__exam=self.exam)
+        first_two = answers.order_by('id')[:2].values_list('id', flat=True)
+        self.assertEqual(index_essays(answers.filter(id__in=list(first_two))), (2, 1))
+        # The third essay is compared against the stored buckets only
+        self.assertEqual(index_essays(answers), (1, 0))
+        pair = SimilarEssayPair.objects.get()
+        self.assertEqual((pair.first_answer_id, pair.second_answer_id), tuple(first_two))
+        self.assertGreater(pair.similarity, 0.6)
+
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.get(f'/api/submissions/similarity/exams/{self.exam.id}/')
+        self.assertEqual(response.json()['results'][0]['second_student'], 'student1')
+
+    def test_copies_in_an_oversized_bucket_pair_with_the_first_only(self):
+        question = Question.objects.create(exam=self.exam, question_text='Why coal?', question_type='essay', order=1)
+        texts = [self.ESSAY] * (similarity.MAX_BUCKET_SIZE + 10) + ['Coal and iron.', 'Coal and iron.']
+        for i, text in enumerate(texts):
+            student = User.objects.create_user(f'copier{i}', role='student')
+            attempt = ExamAttempt.objects.create(student=student, exam=self.exam, is_submitted=True)
+            Answer.objects.create(attempt=attempt, question=question, answer_text=text)
+        self.assertEqual(index_essays(Answer.objects.filter(question=question)), (len(texts), len(texts) - 3))
+        first = Answer.objects.filter(question=question).order_by('id').first()
+        self.assertFalse(SimilarEssayPair.objects.exclude(first_answer=first).filter(question=question).exists())
+
+
+@skipUnless(collusion.np, 'NumPy is not installed')
+class CollusionDetectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Quiz', description='', creator=teacher, duration_minutes=30)
+        questions = [
+            Question.objects.create(exam=cls.exam, question_text=f'Q{i}', question_type='multiple_choice', order=i)
+            for i in range(8)
+        ]
+        # Independent students pick wrong answers at random; one copies student4
+        rng = random.Random(7)
+        patterns = {f'student{s}': [rng.choice('ABCD') for _ in range(8)] for s in range(6)}
+        patterns['student4'] = list('BCDBCDBA')
+        patterns['copier'] = list(patterns['student4'])
+        for username, responses in patterns.items():
+            student = User.objects.create_user(username, role='student')
+            attempt = ExamAttempt.objects.create(student=student, exam=cls.exam, is_submitted=True)
+            Answer.objects.bulk_create([
+                Answer(attempt=attempt, question=question, answer_text=response, is_correct=response == 'A')
+                for question, response in zip(questions, responses)
+            ])
+
+    def test_copied_wrong_answers_rank_first(self):
+        attempts, pairs = collusion.detect_collusion(self.exam.id, top_k=3, block_size=2)
+        self.assertEqual(attempts, 7)
+        top = SuspiciousPair.objects.filter(exam=self.exam).select_related(
+            'first_attempt__student', 'second_attempt__student').first()
+        self.assertEqual(
+            {top.first_attempt.student.username, top.second_attempt.student.username}, {'student4', 'copier'}
+        )
+        self.assertEqual(top.identical_wrong, top.both_wrong)
+        self.assertLessEqual(SuspiciousPair.objects.count(), 3)
+
+
+class SweeperTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Timed', description='', creator=teacher, duration_minutes=10)
+        questions = [
+            Question.objects.create(exam=cls.exam, question_text=f'Q{i}', question_type='short_answer', order=i)
+            for i in range(2)
+        ]
+        expired = timezone.now() - timedelta(hours=1)
+        cls.expired = ExamAttempt.objects.create(
+            student=User.objects.create_user('late', role='student'), exam=cls.exam, deadline=expired
+        )
+        Answer.objects.create(attempt=cls.expired, question=questions[0], answer_text='x', is_correct=True)
+        Answer.objects.create(attempt=cls.expired, question=questions[1], answer_text='y')
+        cls.running = ExamAttempt.objects.create(
+            student=User.objects.create_user('running', role='student'), exam=cls.exam,
+            deadline=timezone.now() + timedelta(minutes=5)
+        )
+        cls.registration = ExamRegistration.objects.create(
+            exam=cls.exam, student=User.objects.create_user('abandoned', role='student'),
+            started_at=expired - timedelta(minutes=10), deadline=expired
+        )
+
+    def test_expired_attempts_are_graded_from_saved_answers(self):
+        self.assertEqual(submit_expired_attempts(batch_size=1), 1)
+        self.expired.refresh_from_db()
+        self.running.refresh_from_db()
+        self.assertTrue(self.expired.is_submitted)
+        self.assertEqual(self.expired.end_time, self.expired.deadline)
+        self.assertEqual(self.expired.score, 50.0)
+        self.assertFalse(self.running.is_submitted)
+
+    def test_abandoned_registrations_are_closed(self):
+        self.assertEqual(close_expired_registrations(), 1)
+        self.assertEqual(close_expired_registrations(), 0)
+        self.registration.refresh_from_db()
+        self.assertEqual(self.registration.completed_at, self.registration.deadline)
+        self.assertEqual(ExamResultSummary.objects.get(exam=self.exam).attempt_count, 1)
+
+    def test_registrations_never_started_are_closed_once_the_exam_ends(self):
+        ended = timezone.now() - timedelta(hours=2)
+        exam = Exam.objects.create(
+            title='Ended', description='', creator=self.exam.creator, duration_minutes=10, end_time=ended
+        )
+        no_show = ExamRegistration.objects.create(exam=exam, student=User.objects.create_user('no-show', role='student'))
+        upcoming = ExamRegistration.objects.create(exam=self.exam, student=no_show.student)
+        self.assertEqual(close_expired_registrations(), 2)
+        no_show.refresh_from_db()
+        upcoming.refresh_from_db()
+        self.assertEqual((no_show.completed_at, no_show.score, no_show.is_passed), (ended, 0, False))
+        self.assertIsNone(upcoming.completed_at)
+        self.assertEqual(ExamResultSummary.objects.get(exam=exam).attempt_count, 1)
+
+
+class ResultSummaryTests(TestCase):
+    """Both ways of submitting fold the result into the same summaries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.exam = Exam.objects.create(title='Exam', description='', creator=teacher, duration_minutes=30, difficulty='hard')
+        cls.question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        cls.right = Option.objects.create(question=cls.question, option_text='Right', is_correct=True)
+        Option.objects.create(question=cls.question, option_text='Wrong', order=1)
+        cls.registered = User.objects.create_user('registered', role='student')
+        cls.attempting = User.objects.create_user('attempting', role='student')
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.registered)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def student_summaries(self, student):
+        return {
+            summary.difficulty: (summary.attempt_count, summary.passed_count, summary.mean_score)
+            for summary in StudentResultSummary.objects.filter(student=student)
+        }
+
+    def test_exam_submit_and_attempt_submit_update_the_summaries(self):
+        body = {'answers': [{'question_id': self.question.id, 'answer': str(self.right.id)}]}
+        self.client_for(self.registered).post(f'/api/exams/{self.exam.id}/submit/', body, format='json')
+        self.assertEqual(self.student_summaries(self.registered), {'all': (1, 1, 100.0), 'hard': (1, 1, 100.0)})
+
+        attempt = ExamAttempt.objects.create(exam=self.exam, student=self.attempting)
+        Answer.objects.create(attempt=attempt, question=self.question, answer_text='Wrong').check_answer()
+        response = self.client_for(self.attempting).post(f'/api/submissions/attempts/{attempt.id}/submit/')
+        self.assertEqual(response.json()['score'], 0.0)
+        self.assertEqual(self.student_summaries(self.attempting), {'all': (1, 0, 0.0), 'hard': (1, 0, 0.0)})
+
+        summary = ExamResultSummary.objects.get(exam=self.exam)
+        self.assertEqual(
+            (summary.attempt_count, summary.passed_count, summary.min_score, summary.max_score, summary.mean_score),
+            (2, 1, 0.0, 100.0, 50.0),
+        )
+        data = self.client_for(self.attempting).get('/api/submissions/results/summary/').json()
+        self.assertEqual((data['overall']['attempt_count'], data['by_difficulty']['hard']['pass_rate']), (1, 0.0))
+
+    def test_a_submission_is_one_result_after_a_rebuild(self):
+        body = {'answers': [{'question_id': self.question.id, 'answer': str(self.right.id)}]}
+        self.client_for(self.registered).post(f'/api/exams/{self.exam.id}/submit/', body, format='json')
+        call_command('rebuild_result_summaries', stdout=io.StringIO())
+        summary = ExamResultSummary.objects.get(exam=self.exam)
+        self.assertEqual((summary.attempt_count, summary.total_score), (1, 100.0))
+        self.assertEqual(self.student_summaries(self.registered), {'all': (1, 1, 100.0), 'hard': (1, 1, 100.0)})
+        cache.clear()
+        data = self.client_for(self.registered).get('/api/submissions/dashboard/').json()
+        self.assertEqual(len(data['recent_results']), 1)
+
+
+class StudentDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        now = timezone.now()
+        cls.exam = Exam.objects.create(
+            title='Open', description='', creator=teacher, duration_minutes=30, start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1)
+        )
+        question = Question.objects.create(exam=cls.exam, question_text='Q', question_type='multiple_choice')
+        cls.option = Option.objects.create(question=question, option_text='O', is_correct=True)
+        cls.question = question
+        Exam.objects.create(
+            title='Later', description='', creator=teacher, duration_minutes=30, start_time=now + timedelta(days=1)
+        )
+        ExamRegistration.objects.create(exam=cls.exam, student=cls.student)
+
+    def setUp(self):
+        cache.clear()
+        # Keep the submit's activity event out of the process-wide buffer
+        patcher = mock.patch.object(activity, 'buffer', activity.ActivityBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_dashboard_is_built_once_and_invalidated_by_grading(self):
+        with self.assertNumQueries(5):
+            data = self.client.get('/api/submissions/dashboard/').json()
+        self.assertEqual(data['profile']['username'], 'student')
+        self.assertEqual([exam['exam_title'] for exam in data['upcoming_exams']], ['Open'])
+        self.assertEqual([(exam['exam_title'], exam['is_registered']) for exam in data['open_exams']], [('Open', True)])
+        self.assertEqual(data['recent_results'], [])
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/submissions/dashboard/')
 
-# Create your tests here.
+        body = {'answers': [{'question_id': self.question.id, 'answer': str(self.option.id)}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/exams/{self.exam.id}/submit/', body, format='json')
+        data = self.client.get('/api/submissions/dashboard/').json()
+        self.assertEqual(data['upcoming_exams'], [])
+        self.assertEqual(data['recent_results'][0]['score'], 100.0)
+        self.assertEqual(data['summary']['attempt_count'], 1)
@@ -1,11 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ExamViewSet, ExamAttemptViewSet
+from .views import ExamViewSet, ExamAttemptViewSet, my_result_summary, exam_result_summary, student_dashboard
+from .views import review_queue, resolve_review, similar_essays, suspicious_pairs
 
 router = DefaultRouter()
 router.register(r'exams', ExamViewSet, basename='exam')
 router.register(r'attempts', ExamAttemptViewSet, basename='examattempt')
 
 urlpatterns = [
+    path('dashboard/', student_dashboard, name='student-dashboard'),
+    path('results/summary/', my_result_summary, name='my-result-summary'),
+    path('results/exams/<int:exam_id>/summary/', exam_result_summary, name='exam-result-summary'),
+    path('reviews/exams/<int:exam_id>/', review_queue, name='review-queue'),
+    path('reviews/<int:review_id>/resolve/', resolve_review, name='resolve-review'),
+    path('similarity/exams/<int:exam_id>/', similar_essays, name='similar-essays'),
+    path('collusion/exams/<int:exam_id>/', suspicious_pairs, name='suspicious-pairs'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,11 +1,27 @@
+from functools import partial
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import ExamAttempt, Answer
+from rest_framework.pagination import PageNumberPagination
+from .models import ExamAttempt, Answer, ManualReview, SimilarEssayPair, SuspiciousPair, StudentResultSummary, ExamResultSummary, record_graded_result, record_regraded_result
 from .serializers import ExamSerializer, ExamAttemptSerializer, QuestionSerializer  # Add ExamSerializer import
-from .permissions import IsStudent, IsTeacher, IsOwnerOrTeacher
+from .serializers import StudentResultSummarySerializer, ExamResultSummarySerializer
+from .serializers import ManualReviewSerializer, ReviewDecisionSerializer, SimilarEssayPairSerializer
+from .serializers import SuspiciousPairSerializer
+from .similarity import index_attempt_essays
+from .dashboard import get_dashboard
+from .idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from .permissions import IsStudent, IsTeacher, IsTeacherOrAdmin, IsOwnerOrTeacher
+from .fast_serializers import ATTEMPT_FIELDS, ATTEMPT_EXPANDABLE, attempt_rows, attempt_payloads
+from backend.fieldsets import parse_fieldset
+from drf_spectacular.utils import extend_schema
+from backend.renderers import FAST_RENDERER_CLASSES
 from exams.models import Exam
+from exams.deadlines import is_late
+from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
 
 class ExamViewSet(viewsets.ReadOnlyModelViewSet):
@@ -13,13 +29,28 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Exam.objects.all()
     
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = parse_fieldset(self.request, list(ExamSerializer().fields), ['questions'])
+        return self._fieldset
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fieldset'] = self.get_fieldset()
+        return context
+    
     def get_queryset(self):
         user = self.request.user
-        if user.user_type == 'student':
-            return Exam.objects.filter(is_active=True)
-        elif user.user_type == 'teacher':
-            return Exam.objects.filter(creator=user)
-        return Exam.objects.all()
+        if user.role == 'student':
+            queryset = Exam.objects.filter(is_active=True)
+        elif user.role == 'teacher':
+            queryset = Exam.objects.filter(creator=user)
+        else:
+            queryset = Exam.objects.all()
+        if self.action in ('list', 'retrieve') and 'questions' in self.get_fieldset():
+            queryset = queryset.prefetch_related('questions__options')
+        return queryset
     
     @action(detail=True, methods=['post'], permission_classes=[IsStudent])
     def start_attempt(self, request, pk=None):
@@ -42,13 +73,15 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
         # Create a new attempt
         attempt = ExamAttempt.objects.create(
             student=request.user,
-            exam=exam
+            exam=exam,
+            deadline=exam.deadline_for(timezone.now())
         )
         
         return Response({
             "attempt_id": attempt.id,
             "message": "Exam attempt started successfully.",
-            "start_time": attempt.start_time
+            "start_time": attempt.start_time,
+            "deadline": attempt.deadline
         })
     
     @action(detail=True, methods=['get'], permission_classes=[IsStudent])
@@ -61,21 +94,41 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
 class ExamAttemptViewSet(viewsets.ModelViewSet):
     serializer_class = ExamAttemptSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrTeacher]
+    renderer_classes = FAST_RENDERER_CLASSES
     queryset = ExamAttempt.objects.all()
     
     def get_queryset(self):
         user = self.request.user
-        if user.user_type == 'student':
+        if user.role == 'student':
             return ExamAttempt.objects.filter(student=user)
-        elif user.user_type == 'teacher':
+        elif user.role == 'teacher':
             # Teachers can see attempts for exams they created
             return ExamAttempt.objects.filter(exam__creator=user)
         return ExamAttempt.objects.all()
     
+    def get_fieldset(self):
+        return parse_fieldset(self.request, ATTEMPT_FIELDS, ATTEMPT_EXPANDABLE)
+    
+    def list(self, request, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-start_time', '-id')
+        page = self.paginate_queryset(attempt_rows(queryset, fieldset))
+        if page is not None:
+            return self.get_paginated_response(attempt_payloads(page, fieldset))
+        return Response(attempt_payloads(attempt_rows(queryset, fieldset), fieldset))
+    
+    def retrieve(self, request, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        attempt = self.get_object()
+        rows = attempt_rows(ExamAttempt.objects.filter(pk=attempt.pk), fieldset)
+        return Response(attempt_payloads(rows, fieldset)[0])
+    
     def perform_create(self, serializer):
         serializer.save(student=self.request.user)
     
+    @extend_schema(request=None, parameters=[IDEMPOTENCY_KEY_PARAMETER])
     @action(detail=True, methods=['post'], permission_classes=[IsStudent])
+    @idempotent('attempt-submit')
     def submit(self, request, pk=None):
         attempt = self.get_object()
         
@@ -91,16 +144,160 @@ class ExamAttemptViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update attempt as submitted
-        attempt.is_submitted = True
-        attempt.end_time = timezone.now()
-        attempt.save()
+        if is_late(attempt.deadline):
+            # The sweeper grades the answers saved before the deadline
+            return Response(
+                {"error": "The time limit for this attempt has passed."},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        # Calculate score
-        attempt.calculate_score()
+        with transaction.atomic():
+            # Mark submitted with a conditional update so only one concurrent submit grades
+            attempt.is_submitted = True
+            attempt.end_time = timezone.now()
+            submitted = ExamAttempt.objects.filter(pk=attempt.pk, is_submitted=False).update(
+                is_submitted=True, end_time=attempt.end_time
+            )
+            if not submitted:
+                return Response(
+                    {"error": "This attempt has already been submitted."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Calculate score
+            attempt.calculate_score()
+            record_graded_result(attempt.student, attempt.exam, attempt.score, attempt.passed)
+            transaction.on_commit(partial(index_attempt_essays, attempt.id))
         
         return Response({
             "message": "Exam submitted successfully.",
             "score": attempt.score,
             "passed": attempt.passed
-        })
\ No newline at end of file
+        })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def student_dashboard(request):
+    """Everything the student home page shows, cached per user until something on it changes."""
+    return Response(get_dashboard(request.user))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_result_summary(request):
+    """Overall and per-difficulty results for the current student, read from one table."""
+    summaries = StudentResultSummary.objects.filter(student=request.user)
+    data = {'overall': None, 'by_difficulty': {}}
+    for summary in summaries:
+        serialized = StudentResultSummarySerializer(summary).data
+        if summary.difficulty == StudentResultSummary.ALL:
+            data['overall'] = serialized
+        else:
+            data['by_difficulty'][summary.difficulty] = serialized
+    return Response(data)
+
+
+@api_view(['GET'])
+def exam_result_summary(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response(
+            {"error": "You don't have permission to view results for this exam."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    summary = ExamResultSummary.objects.filter(exam=exam).first()
+    if summary is None:
+        summary = ExamResultSummary(exam=exam)
+    return Response(ExamResultSummarySerializer(summary).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdmin])
+def review_queue(request, exam_id):
+    """Pending free-text answers of an exam that need a teacher's decision."""
+    exam = get_object_or_404(Exam, id=exam_id)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response(
+            {"error": "You don't have permission to review answers for this exam."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    reviews = (
+        ManualReview.objects
+        .filter(exam=exam, status=request.query_params.get('status', 'pending'))
+        .select_related('answer__question', 'answer__attempt__student')
+    )
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(reviews, request)
+    return paginator.get_paginated_response(ManualReviewSerializer(page, many=True).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def resolve_review(request, review_id):
+    """Accept or reject a queued answer and re-score its attempt."""
+    review = get_object_or_404(
+        ManualReview.objects.select_related('exam', 'answer__attempt__student'), id=review_id
+    )
+    if review.exam.creator != request.user and request.user.role != 'admin':
+        return Response(
+            {"error": "You don't have permission to review answers for this exam."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    decision = ReviewDecisionSerializer(data=request.data)
+    decision.is_valid(raise_exception=True)
+    is_correct = decision.validated_data['is_correct']
+    
+    with transaction.atomic():
+        answer = review.answer
+        answer.is_correct = is_correct
+        answer.save(update_fields=['is_correct'])
+        review.status = 'accepted' if is_correct else 'rejected'
+        review.reviewed_by = request.user
+        review.reviewed_at = timezone.now()
+        review.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+        attempt = answer.attempt
+        if attempt.is_submitted:
+            old_score, old_passed = attempt.score, attempt.passed
+            attempt.calculate_score()
+            record_regraded_result(attempt.student, review.exam, old_score, old_passed, attempt.score, attempt.passed)
+    
+    return Response(ManualReviewSerializer(review).data)
+
+
+@api_view(['GET'])
+def similar_essays(request, exam_id):
+    """Essay answers of an exam flagged as near-duplicates, most similar first."""
+    exam = get_object_or_404(Exam, id=exam_id)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response(
+            {"error": "You don't have permission to view similarity reports for this exam."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    pairs = (
+        SimilarEssayPair.objects
+        .filter(exam=exam)
+        .select_related('first_answer__attempt__student', 'second_answer__attempt__student')
+    )
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(pairs, request)
+    return paginator.get_paginated_response(SimilarEssayPairSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+def suspicious_pairs(request, exam_id):
+    """Attempts with unusually many identical wrong answers, highest z-score first."""
+    exam = get_object_or_404(Exam, id=exam_id)
+    if exam.creator != request.user and request.user.role != 'admin':
+        return Response(
+            {"error": "You don't have permission to view collusion reports for this exam."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    pairs = (
+        SuspiciousPair.objects
+        .filter(exam=exam)
+        .select_related('first_attempt__student', 'second_attempt__student')
+    )
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(pairs, request)
+    return paginator.get_paginated_response(SuspiciousPairSerializer(page, many=True).data)
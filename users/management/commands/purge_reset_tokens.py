@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from users.models import PasswordResetToken
+
+class Command(BaseCommand):
+    help = 'Delete expired and already used password reset tokens'
+    
+    def handle(self, *args, **options):
+        deleted = PasswordResetToken.purge_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f"Purged {deleted} password reset token(s)")
+        )
@@ -1,5 +1,10 @@
+import hashlib
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -9,8 +14,73 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
     
-    password_reset_token = models.CharField(max_length=100, blank=True, null=True)
-    password_reset_expires = models.DateTimeField(blank=True, null=True)
-    
     def __str__(self):
-        return f"{self.username} ({self.role})"
\ No newline at end of file
+        return f"{self.username} ({self.role})"
+
+
+class PasswordResetToken(models.Model):
+    """
+    Single-use password reset token. Only a SHA-256 digest of the token is
+    stored, so lookups go through a unique index instead of scanning users
+    and a leaked table does not leak usable tokens.
+    """
+    TOKEN_LENGTH = 50
+    LIFETIME = timedelta(hours=1)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    used_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Reset token for {self.user.username}"
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, lifetime=None):
+        """Create a new token for ``user`` and return the raw token string."""
+        # Any older outstanding token for this user stops working
+        cls.objects.filter(user=user, used_at__isnull=True).delete()
+        token = get_random_string(cls.TOKEN_LENGTH)
+        cls.objects.create(
+            user=user,
+            token_hash=cls.hash_token(token),
+            expires_at=timezone.now() + (lifetime or cls.LIFETIME),
+        )
+        return token
+
+    @classmethod
+    def consume(cls, token):
+        """
+        Return the user the token belongs to and mark it used, or ``None`` if
+        the token is unknown, expired or already used. The conditional update
+        guarantees only one concurrent caller can consume a given token.
+        """
+        now = timezone.now()
+        try:
+            reset_token = cls.objects.select_related('user').get(
+                token_hash=cls.hash_token(token),
+                used_at__isnull=True,
+                expires_at__gt=now,
+            )
+        except cls.DoesNotExist:
+            return None
+        claimed = cls.objects.filter(pk=reset_token.pk, used_at__isnull=True).update(used_at=now)
+        if not claimed:
+            return None
+        return reset_token.user
+
+    @classmethod
+    def purge_expired(cls):
+        """Delete expired and used tokens. Returns the number of rows removed."""
+        deleted, _ = cls.objects.filter(
+            models.Q(expires_at__lte=timezone.now()) | models.Q(used_at__isnull=False)
+        ).delete()
+        return deleted
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Reader for the file-based email backend's output directory.
+
+The directory listing is cached keyed on the directory's mtime, so it is only
+rebuilt when a new log file appears. Log files are memory-mapped and split into
+messages lazily; only the headers are parsed for filtering and each message
+body is capped, so memory stays bounded regardless of how large the log is.
+"""
+import json
+import mmap
+import os
+from email import policy
+from email.parser import BytesParser
+
+from django.core.cache import cache
+
+# Separator written by django.core.mail.backends.filebased.EmailBackend
+MESSAGE_SEPARATOR = b'\n' + b'-' * 79 + b'\n'
+MAX_BODY_BYTES = 64 * 1024
+INDEX_CACHE_TIMEOUT = 60 * 60
+
+_header_parser = BytesParser(policy=policy.default)
+
+
+def get_log_index(email_dir):
+    """Return ``[(filename, mtime, size), ...]`` for ``.log`` files, newest first."""
+    try:
+        dir_mtime = os.stat(email_dir).st_mtime_ns
+    except FileNotFoundError:
+        return []
+
+    cache_key = f"sent_emails_index:{email_dir}:{dir_mtime}"
+    index = cache.get(cache_key)
+    if index is None:
+        index = []
+        with os.scandir(email_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.log') and entry.is_file():
+                    stat = entry.stat()
+                    index.append((entry.name, stat.st_mtime, stat.st_size))
+        index.sort(key=lambda item: (item[1], item[0]), reverse=True)
+        cache.set(cache_key, index, INDEX_CACHE_TIMEOUT)
+    return index
+
+
+def _iter_file_messages(path):
+    """
+    Yield ``(offset, headers, body, truncated)`` for each message in a log
+    file, newest first. Only the header block and at most ``MAX_BODY_BYTES``
+    of the body are copied out of the mapping.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Messages are appended, so walk the separators backwards
+            end = len(mm)
+            if mm[end - len(MESSAGE_SEPARATOR):end] == MESSAGE_SEPARATOR:
+                end -= len(MESSAGE_SEPARATOR)
+            while end > 0:
+                sep = mm.rfind(MESSAGE_SEPARATOR, 0, end)
+                start = sep + len(MESSAGE_SEPARATOR) if sep != -1 else 0
+
+                header_end = mm.find(b'\n\n', start, min(end, start + MAX_BODY_BYTES))
+                if header_end == -1:
+                    header_end = min(end, start + MAX_BODY_BYTES)
+                headers = _header_parser.parsebytes(mm[start:header_end], headersonly=True)
+                body_start = min(header_end + 2, end)
+                body_end = min(end, body_start + MAX_BODY_BYTES)
+                yield start, headers, mm[body_start:body_end], body_end < end
+
+                if sep == -1:
+                    break
+                end = sep
+
+
+def iter_sent_emails(email_dir, recipient=None, subject=None):
+    """Yield parsed messages from ``email_dir``, newest first, matching the filters."""
+    recipient = recipient.lower() if recipient else None
+    subject = subject.lower() if subject else None
+
+    for filename, _mtime, _size in get_log_index(email_dir):
+        path = os.path.join(email_dir, filename)
+        try:
+            for offset, headers, body, truncated in _iter_file_messages(path):
+                to = ', '.join(filter(None, [headers.get('To', ''), headers.get('Cc', '')]))
+                msg_subject = headers.get('Subject', '') or ''
+                if recipient and recipient not in to.lower():
+                    continue
+                if subject and subject not in msg_subject.lower():
+                    continue
+                yield {
+                    'filename': filename,
+                    'offset': offset,
+                    'from': headers.get('From', ''),
+                    'to': to,
+                    'subject': msg_subject,
+                    'date': headers.get('Date', ''),
+                    'content': body.decode('utf-8', errors='replace'),
+                    'truncated': truncated,
+                }
+        except (FileNotFoundError, ValueError):
+            # File rotated away or truncated while we were reading it
+            continue
+
+
+def stream_sent_emails_page(email_dir, page, page_size, recipient=None, subject=None):
+    """Yield a JSON document for one page of messages, one message at a time."""
+    skip = (page - 1) * page_size
+    yield f'{{"page": {page}, "page_size": {page_size}, "emails": ['
+    emitted = 0
+    has_more = False
+    for index, message in enumerate(iter_sent_emails(email_dir, recipient, subject)):
+        if index < skip:
+            continue
+        if emitted == page_size:
+            has_more = True
+            break
+        yield (', ' if emitted else '') + json.dumps(message)
+        emitted += 1
+    yield f'], "has_more": {json.dumps(has_more)}}}'
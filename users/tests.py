@@ -1,3 +1,79 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import PasswordResetToken, User
+
+
+class PasswordResetTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'old-password', role='student')
+
+    def test_token_is_single_use_and_only_its_hash_is_stored(self):
+        token = PasswordResetToken.issue(self.user)
+        self.assertFalse(PasswordResetToken.objects.filter(token_hash=token).exists())
+        self.assertEqual(PasswordResetToken.consume(token), self.user)
+        self.assertIsNone(PasswordResetToken.consume(token))
+
+    def test_expired_and_unknown_tokens_are_rejected(self):
+        token = PasswordResetToken.issue(self.user, lifetime=timedelta(minutes=5))
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=6)):
+            self.assertIsNone(PasswordResetToken.consume(token))
+        self.assertIsNone(PasswordResetToken.consume('not-a-token'))
+
+    def test_issuing_a_new_token_revokes_the_old_one(self):
+        old = PasswordResetToken.issue(self.user)
+        new = PasswordResetToken.issue(self.user)
+        self.assertIsNone(PasswordResetToken.consume(old))
+        self.assertEqual(PasswordResetToken.consume(new), self.user)
+
+    def test_reset_through_the_api(self):
+        client = APIClient()
+        client.post('/api/users/password-reset/', {'email': self.user.email}, format='json')
+        token = mail.outbox[0].body.rstrip('/').rsplit('/', 1)[1]
+        url = f'/api/users/password-reset-confirm/{token}/'
+        self.assertEqual(client.post(url, {'new_password': 'new-password'}, format='json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+        # Reused
+        self.assertEqual(client.post(url, {'new_password': 'other-password'}, format='json').status_code, 400)
+
+
+class SentEmailLogTests(TestCase):
+    def setUp(self):
+        self.email_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.email_dir)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass', role='admin')
+
+    def test_log_is_paginated_newest_first(self):
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend', EMAIL_FILE_PATH=self.email_dir,
+        ):
+            with mail.get_connection() as connection:
+                connection.send_messages([
+                    mail.EmailMessage(f'Message {i}', f'Body {i}', 'noreply@example.com', [f'user{i % 2}@example.com'])
+                    for i in range(5)
+                ])
+            client = APIClient()
+            client.force_authenticate(self.admin)
+
+            def page(**params):
+                response = client.get('/api/users/sent-emails/', params)
+                return json.loads(b''.join(response.streaming_content))
+
+            first = page(page=1, page_size=2)
+            self.assertEqual([email['subject'] for email in first['emails']], ['Message 4', 'Message 3'])
+            self.assertTrue(first['has_more'])
+            last = page(page=3, page_size=2)
+            self.assertEqual([email['subject'] for email in last['emails']], ['Message 0'])
+            self.assertFalse(last['has_more'])
+            filtered = page(recipient='user1@example.com')
+            self.assertEqual([email['subject'] for email in filtered['emails']], ['Message 3', 'Message 1'])
@@ -2,6 +2,7 @@
 from rest_framework import generics, permissions
 from django.contrib.auth import get_user_model
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer
+from .models import PasswordResetToken
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -9,9 +10,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
 from django.core.mail import send_mail
 from django.conf import settings
-from django.utils.crypto import get_random_string
-from django.utils import timezone
-from datetime import timedelta
+from django.db import transaction
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
@@ -90,10 +89,7 @@ def password_reset_request(request):
     try:
         user = User.objects.get(email=email)
         # Generate reset token
-        reset_token = get_random_string(50)
-        user.password_reset_token = reset_token
-        user.password_reset_expires = timezone.now() + timedelta(hours=1)
-        user.save()
+        reset_token = PasswordResetToken.issue(user)
         
         # Send email (in production, use Celery for async)
         reset_url = f"{settings.FRONTEND_URL}/reset-password/{reset_token}/"
@@ -115,41 +111,52 @@ def password_reset_request(request):
 @permission_classes([permissions.AllowAny])
 def password_reset_confirm(request, token):
     new_password = request.data.get('new_password')
-    try:
-        user = User.objects.get(
-            password_reset_token=token,
-            password_reset_expires__gt=timezone.now()
-        )
-        user.set_password(new_password)
-        user.password_reset_token = None
-        user.password_reset_expires = None
-        user.save()
-        return Response({"detail": "Password reset successful."}, status=status.HTTP_200_OK)
-    except User.DoesNotExist:
-        return Response({"error": "Invalid or expired reset token."}, 
+    if not new_password:
+        return Response({"error": "new_password is required."},
                        status=status.HTTP_400_BAD_REQUEST)
+    with transaction.atomic():
+        user = PasswordResetToken.consume(token)
+        if user is None:
+            return Response({"error": "Invalid or expired reset token."}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        user.set_password(new_password)
+        user.save(update_fields=['password'])
+    return Response({"detail": "Password reset successful."}, status=status.HTTP_200_OK)
         
 
 # In users/views.py
-import os
-from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.response import Response
+from django.http import StreamingHttpResponse
+from .sent_emails import stream_sent_emails_page
 
+SENT_EMAILS_MAX_PAGE_SIZE = 100
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='page', description='Page number (newest first)', required=False, type=int),
+        OpenApiParameter(name='page_size', description='Messages per page (max 100)', required=False, type=int),
+        OpenApiParameter(name='recipient', description='Filter by recipient address', required=False, type=str),
+        OpenApiParameter(name='subject', description='Filter by subject', required=False, type=str),
+    ]
+)
 @api_view(['GET'])
 @permission_classes([permissions.IsAdminUser])
 def view_sent_emails(request):
-    if hasattr(settings, 'EMAIL_FILE_PATH'):
-        email_dir = settings.EMAIL_FILE_PATH
-        emails = []
-        if os.path.exists(email_dir):
-            for filename in os.listdir(email_dir):
-                if filename.endswith('.log'):
-                    with open(os.path.join(email_dir, filename), 'r') as f:
-                        content = f.read()
-                        emails.append({
-                            'filename': filename,
-                            'content': content
-                        })
-        return Response({'emails': emails})
-    return Response({'error': 'File email backend not configured'})
\ No newline at end of file
+    email_dir = getattr(settings, 'EMAIL_FILE_PATH', None)
+    if not email_dir:
+        return Response({'error': 'File email backend not configured'})
+
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = int(request.query_params.get('page_size', 20))
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = min(max(page_size, 1), SENT_EMAILS_MAX_PAGE_SIZE)
+
+    return StreamingHttpResponse(
+        stream_sent_emails_page(
+            str(email_dir), page, page_size,
+            recipient=request.query_params.get('recipient'),
+            subject=request.query_params.get('subject'),
+        ),
+        content_type='application/json',
+    )